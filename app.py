@@ -1,5 +1,17 @@
 import streamlit as st
 from auth import try_login, try_signup
+from db import rate_movie, get_rating, record_watch, add_to_watchlist, remove_from_watchlist, get_watchlist
+from refresher import start_refresher
+import autocomplete
+import catalog
+import credit_index
+import facets
+import feed
+import metrics
+from recommend import similar_movies
+from paging import PAGE_SIZE, cached_pager
+import posters
+from cards import render_movie_list, render_paged_list
 from tmdb import (
     trending,
     search_movies,
@@ -8,13 +20,13 @@ from tmdb import (
     genres,
     discover_by_genre,
     movie_details,
-    movie_videos,
+    pick_trailer,
     poster_url,
 )
-import textwrap
 import base64
 from pathlib import Path
 import os
+import time
 
 st.set_page_config(page_title="Movie Explorer", page_icon="🎬", layout="wide")
 
@@ -66,6 +78,7 @@ def set_background(image_source: str):
 
 # Map UI modes to background image sources. Empty strings mean no image.
 MODE_BACKGROUNDS = {
+    "For You": "",
     "Trending": "",
     "Search": "",
     "Actor": "",
@@ -460,6 +473,7 @@ def login_signup_ui():
                 ok, res = try_login(email, password)
                 if ok:
                     set_logged_in(res)
+                    feed.refresh_async(res["id"])
                     st.rerun()
                 else:
                     st.error(res)
@@ -476,7 +490,10 @@ def login_signup_ui():
             if submitted2:
                 ok, res = try_signup(email2, name, password2, confirm)
                 if ok:
-                    set_logged_in({"name": name, "email": email2})
+                    # Log straight in so the session carries the new user's id
+                    _, user = try_login(email2, password2)
+                    set_logged_in(user)
+                    feed.refresh_async(user["id"])
                     st.rerun()
                 else:
                     st.error(res)
@@ -487,6 +504,7 @@ def login_signup_ui():
         st.markdown("You can browse movies as a guest user.")
         if st.button("Continue as Guest", use_container_width=True):
             set_logged_in({"id": 0, "name": "Guest", "email": "guest@local"})
+            feed.refresh_async(feed.GUEST_ID)
             st.rerun()
 
     # Close card + wrapper
@@ -498,47 +516,26 @@ def login_signup_ui():
 
 
 # -------------- Browse UI & helpers (unchanged) -------------------
-def movie_card(movie, key_prefix=""):
-    mtitle = movie.get("title") or movie.get("original_title") or "Untitled"
-    poster = poster_url(movie.get("poster_path"))
-    col1, col2 = st.columns([1, 3])
-    with col1:
-        if poster:
-            # Try to find a YouTube trailer for this movie. If found, make the poster a clickable
-            # link that opens the trailer (so tapping the poster plays the trailer).
-            try:
-                vids = movie_videos(movie.get("id"))
-                yt = next((v for v in vids if v.get("site") == "YouTube" and v.get("type") in ("Trailer", "Teaser")), None)
-            except Exception:
-                yt = None
-
-            if yt and yt.get("key"):
-                url = f"https://www.youtube.com/watch?v={yt.get('key')}"
-                # Render the poster as a linked image that opens in a new tab/window.
-                st.markdown(f'<a href="{url}" target="_blank"><img src="{poster}" style="width:100%;border-radius:4px;"/></a>', unsafe_allow_html=True)
-            else:
-                st.image(poster, use_column_width=True)
-    with col2:
-        # Render right-side information with classes so CSS can style it
-        rating = movie.get("vote_average", 0.0)
-        count = movie.get("vote_count", 0)
-        rel = movie.get("release_date", "—")
-        overview = movie.get("overview") or "No overview available."
-
-        st.markdown(f"<div class='card-right'>\n  <h3 class='card-title'>{mtitle}</h3>\n  <div class='card-meta'><strong>Rating:</strong> {rating:.1f} ({count} votes) &nbsp; | &nbsp; <strong>Release:</strong> {rel}</div>\n  <div class='card-overview'>{textwrap.shorten(overview, width=400, placeholder='…')}</div>\n</div>", unsafe_allow_html=True)
+def session_pager(key, fetch_page):
+    # One Pager per result list (query, genre, period), kept across reruns so
+    # loaded pages and the prefetched next page survive; oldest dropped first.
+    return cached_pager(st.session_state.setdefault("pagers", {}), key, fetch_page)
 
-        if st.button("View details & trailer", key=f"btn_{key_prefix}{movie.get('id')}"):
-            st.session_state["selected_movie"] = movie.get("id")
+@st.cache_data(ttl=30, show_spinner=False)
+def catalog_ready():
+    # Rechecked at most every 30s rather than on every rerun
+    return catalog.has_movies()
 
 def render_movie_details(movie_id):
-    det = movie_details(movie_id)
+    # credits + recommendations ride along so "Similar movies" needs no extra round-trip
+    det = movie_details(movie_id, append=["videos", "credits", "recommendations"])
     st.markdown("---")
     # container for styled movie details
     st.markdown('<div class="movie-details">', unsafe_allow_html=True)
     st.markdown(f"<h2>{det.get('title')}</h2>", unsafe_allow_html=True)
     cols = st.columns([1, 2])
     with cols[0]:
-        p = poster_url(det.get("poster_path"))
+        p = posters.poster_within(det.get("poster_path"), width=500) or poster_url(det.get("poster_path"))
         if p:
             st.image(p, use_column_width=True)
     with cols[1]:
@@ -546,18 +543,201 @@ def render_movie_details(movie_id):
         st.markdown(f"<div class='meta'><span class='label'>Release</span><span class='value'>{det.get('release_date','—')}</span></div>", unsafe_allow_html=True)
         st.markdown(f"<div class='meta'><span class='label'>Runtime</span><span class='value'>{det.get('runtime','—')} min</span></div>", unsafe_allow_html=True)
         st.markdown(f"<p class='overview'>{det.get('overview') or 'No overview available.'}</p>", unsafe_allow_html=True)
-    vids = movie_videos(movie_id)
-    yt = next((v for v in vids if v.get("site") == "YouTube" and v.get("type") in ("Trailer", "Teaser")), None)
+    yt = pick_trailer((det.get("videos") or {}).get("results", []))
     if yt:
         st.subheader("Trailer")
         st.video(f"https://www.youtube.com/watch?v={yt.get('key')}")
     else:
         st.info("No trailer found.")
     st.markdown('</div>', unsafe_allow_html=True)
+    render_user_actions(movie_id)
+    render_similar_movies(movie_id, det)
+
+def render_user_actions(movie_id):
+    # Ratings, watchlist and watch history feed the personalized recommendations.
+    # Guests (id 0) have nowhere to store them.
+    uid = (st.session_state.get("user") or {}).get("id")
+    if not uid:
+        return
+    cols = st.columns(3)
+    with cols[0]:
+        current = get_rating(uid, movie_id)
+        stars = st.select_slider("Your rating", options=[i / 2 for i in range(1, 11)], value=current or 3.0, key=f"rating_{movie_id}")
+        if st.button("Save rating", key=f"save_rating_{movie_id}"):
+            rate_movie(uid, movie_id, stars)
+            feed.note_interaction(uid, movie_id)
+            st.success("Rating saved.")
+    with cols[1]:
+        if movie_id in get_watchlist(uid):
+            if st.button("Remove from watchlist", key=f"unlist_{movie_id}"):
+                remove_from_watchlist(uid, movie_id)
+                feed.note_interaction(uid, movie_id)
+                st.rerun()
+        elif st.button("Add to watchlist", key=f"list_{movie_id}"):
+            add_to_watchlist(uid, movie_id)
+            feed.note_interaction(uid, movie_id)
+            st.rerun()
+    with cols[2]:
+        if st.button("Mark as watched", key=f"watched_{movie_id}"):
+            record_watch(uid, movie_id)
+            feed.note_interaction(uid, movie_id)
+            st.success("Added to your watch history.")
+
+def render_similar_movies(movie_id, det, per_row=5):
+    similar = similar_movies(movie_id, details=det, k=10)
+    if not similar:
+        return
+    st.subheader("Similar movies")
+    thumbs = posters.prefetch_posters([m.get("poster_path") for m in similar])
+    for start in range(0, len(similar), per_row):
+        cols = st.columns(per_row)
+        for col, m in zip(cols, similar[start:start + per_row]):
+            with col:
+                p = thumbs.get(m.get("poster_path")) or poster_url(m.get("poster_path"))
+                if p:
+                    st.image(p, use_column_width=True)
+                st.caption(m.get("title") or m.get("original_title") or "Untitled")
+                if st.button("Open", key=f"similar_{movie_id}_{m.get('id')}"):
+                    st.session_state["selected_movie"] = m.get("id")
+                    st.rerun()
+
+ACTOR_RESULT_LIMIT = 500
+
+def render_credit_query(index, person):
+    # Several people and genre/year filters, answered by the local credit index.
+    pinned = st.session_state.setdefault("actor_pinned", {})
+    if person and person.get("id") not in pinned:
+        if st.button(f"📌 Pin {person.get('name')} and add someone else"):
+            pinned[person["id"]] = person.get("name")
+            st.rerun()
+    if pinned:
+        keep = st.multiselect("Together with", list(pinned), default=list(pinned),
+                              format_func=lambda pid: pinned.get(pid, str(pid)))
+        for pid in set(pinned) - set(keep):
+            pinned.pop(pid)
+    names = dict(pinned)
+    if person:
+        names[person["id"]] = person.get("name")
+    if not names:
+        return
+    people = list(names)
+
+    genre_names = {g["id"]: g["name"] for g in genres()}
+    counts = index.genre_counts(people)
+    cols = st.columns(2)
+    with cols[0]:
+        picked = st.multiselect("Genres", sorted(counts, key=lambda g: -counts[g]),
+                                format_func=lambda g: f"{genre_names.get(g, g)} ({counts[g]})")
+    years = index.year_range(people)
+    year_min = year_max = None
+    with cols[1]:
+        if years and years[0] < years[1]:
+            year_min, year_max = st.slider("Released", years[0], years[1], years)
+            if (year_min, year_max) == years:
+                year_min = year_max = None  # the full range also keeps undated credits
+
+    ids = index.query(people, picked, year_min, year_max, limit=ACTOR_RESULT_LIMIT)
+    movies = catalog.get_movies(ids)
+    st.subheader("Movies with " + " & ".join(names.values()))
+    if not movies:
+        st.info("No movies match.")
+        return
+    key = "_".join(map(str, people + ["g"] + picked + ["y", year_min, year_max]))
+    render_movie_list(movies, key_prefix=f"actor_{key}_")
+
+FACET_SORTS = {"Most popular": "popularity", "Top rated": "rating", "Most votes": "votes",
+               "Newest": "newest", "Oldest": "oldest"}
+MIN_VOTES = [0, 10, 50, 100, 500, 1000, 5000]
+
+def _top_counts(counts, names=None, limit=6):
+    # "Comedy 185 · Thriller 168 · ..." for a facet, most matches first
+    top = sorted(counts.items(), key=lambda kv: -kv[1])[:limit]
+    return " · ".join(f"{(names or {}).get(v, v)} {n:,}" for v, n in top)
+
+def render_genre_facets(index, genre_id, name, genre_names):
+    # Genre browsing over the whole local catalog with combined filters, from facets.py.
+    years = index.year_range() or (1900, 2030)
+    cols = st.columns(3)
+    with cols[0]:
+        sort = FACET_SORTS[st.selectbox("Sort by", list(FACET_SORTS), key="facet_sort")]
+        year = st.slider("Released", years[0], years[1], years, key="facet_year")
+    with cols[1]:
+        rating = st.slider("Minimum rating", 0.0, 10.0, 0.0, step=0.5, key="facet_rating")
+        votes = st.select_slider("Minimum votes", MIN_VOTES, value=0, key="facet_votes")
+    with cols[2]:
+        runtime = st.slider("Runtime (minutes)", 0, 240, (0, 240), step=10, key="facet_runtime")
+
+    # The full range of a slider means "no filter", which also keeps movies missing that field
+    filters = {
+        "genres": [genre_id] + st.session_state.get(f"facet_genres_{genre_id}", []),
+        "year": (None, None) if year == years else year,
+        "rating": (rating or None, None),
+        "votes": (votes or None, None),
+        "runtime": (runtime[0] or None, runtime[1] if runtime[1] < 240 else None),
+        "languages": st.session_state.get("facet_languages", []),
+    }
+    counts = index.counts(**filters)
+    # Options and labels stay fixed (changing them would reset the widgets); counts go underneath
+    with cols[1]:
+        others = [int(g) for g in index.genre_ids if g != genre_id and g in genre_names]
+        st.multiselect("Also in genre", others, key=f"facet_genres_{genre_id}", format_func=genre_names.get)
+        st.caption(_top_counts({g: n for g, n in counts["genres"].items() if g != genre_id}, genre_names))
+    with cols[2]:
+        st.multiselect("Original language", [str(lang) for lang in index.languages if lang], key="facet_languages")
+        st.caption(_top_counts(counts["languages"]))
+
+    key = f"facets:{sort}:{sorted(filters.items())}"
+    pager = session_pager(key, lambda page: catalog.get_movies(
+        index.search(sort, offset=(page - 1) * PAGE_SIZE, limit=PAGE_SIZE, **filters)[1]))
+    st.subheader(f"{name} movies")
+    st.caption(f"{counts['total']:,} in the catalog")
+    if not pager.movies:
+        st.info("No movies match these filters.")
+    render_paged_list(pager, key_prefix=f"genre_{abs(hash(key))}_")
+
+FEED_SOURCES = {
+    "als": "based on people with similar taste",
+    "content": "similar to movies you liked",
+    "popular": "popular right now",
+}
+
+def render_home_feed(uid):
+    # Precomputed by feed.py; this only reads the stored row.
+    home = feed.get_feed(uid)
+    st.subheader("Popular right now" if uid == feed.GUEST_ID else "Picked for you")
+    if home is None:
+        st.info("Your feed is being prepared, check back in a moment.")
+        return
+    minutes = max(0, int((time.time() - home["computed_at"]) // 60))
+    age = "just now" if minutes < 1 else f"{minutes} min ago" if minutes < 120 else f"{minutes // 60} h ago"
+    st.caption(f"{FEED_SOURCES.get(home['source'], home['source']).capitalize()} · updated {age}")
+    render_movie_list(home["items"], key_prefix=f"feed_{uid}_")
+
+SUGGESTIONS = 6
+
+def _fill_query(key, text):
+    st.session_state[key] = text
+
+def render_suggestions(kind, key):
+    # Typeahead from autocomplete.py's in-memory index, no TMDB call: the best
+    # matches for what is in the box, a click puts one in it
+    q = st.session_state.get(key) or ""
+    hits = autocomplete.suggest(q, kind, k=SUGGESTIONS) if q.strip() else []
+    if not hits or autocomplete.normalize(hits[0]["label"]) == autocomplete.normalize(q):
+        return
+    cols = st.columns(3)
+    for i, hit in enumerate(hits):
+        label = f"{hit['label']} ({hit['year']})" if hit["year"] else hit["label"]
+        cols[i % 3].button(label, key=f"suggest_{key}_{hit['id']}", on_click=_fill_query, args=(key, hit["label"]),
+                           use_container_width=True)
 
 def browse_ui():
+    # Keep trending/genre landing data warm so this page never waits on TMDB
+    start_refresher()
+    metrics.start_server()
+    autocomplete.start_server()
     st.title("🎬 Movie Explorer")
-    st.caption("Trending • Search • Actor • Genre")
+    st.caption("For You • Trending • Search • Actor • Genre")
 
     # Inject CSS to make sidebar radio options (Trending/Search/Actor/Genre) equal size
     st.markdown(
@@ -608,7 +788,11 @@ def browse_ui():
             st.rerun()
         st.markdown("---")
         st.markdown("<div class='sidebar-title'>Browse</div>", unsafe_allow_html=True)
-        mode = st.radio("Choose a section:", ["Trending", "Search", "Actor", "Genre"], index=0)
+        mode = st.radio("Choose a section:", ["For You", "Trending", "Search", "Actor", "Genre"], index=0)
+        # Search/Actor can run entirely against the local catalog once it has been ingested
+        use_catalog = False
+        if catalog_ready():
+            use_catalog = st.checkbox("Search local catalog (offline)", value=True, key="use_catalog")
 
     set_background(MODE_BACKGROUNDS.get(mode, ""))
 
@@ -617,59 +801,93 @@ def browse_ui():
             st.session_state.pop("selected_movie")
             st.rerun()
         render_movie_details(st.session_state["selected_movie"])
-        return
+        return "details"
 
-    if mode == "Trending":
+    if mode == "For You":
+        render_home_feed(st.session_state["user"]["id"])
+    elif mode == "Trending":
         period = st.radio("Period", ["day", "week"], index=0, horizontal=True)
-        movies = trending(period=period or "day")
+        period = period or "day"
+        pager = session_pager(f"trending:{period}", lambda page: trending(period=period, page=page))
         st.subheader(f"Trending this {period}")
-        for m in movies:
-            st.container()
-            movie_card(m, key_prefix=f"tr_{period}_")
+        render_paged_list(pager, key_prefix=f"tr_{period}_")
     elif mode == "Search":
-        q = st.text_input("Search for a movie title")
+        q = st.text_input("Search for a movie title", key="search_query")
+        render_suggestions("movie", "search_query")
         if q:
-            movies = search_movies(q)
+            if use_catalog:
+                pager = session_pager(f"catalog:{q}", lambda page: catalog.search_movies(q, page=page))
+            else:
+                pager = session_pager(f"search:{q}", lambda page: search_movies(q, page=page))
             st.subheader(f"Results for “{q}”")
-            if not movies:
+            if not pager.movies:
                 st.info("No results.")
-            for m in movies:
-                st.container()
-                movie_card(m, key_prefix="search_")
+            render_paged_list(pager, key_prefix=f"search_{use_catalog}_{q}_")
         else:
             st.info("Type to search titles.")
     elif mode == "Actor":
-        q = st.text_input("Search for an actor / person")
+        q = st.text_input("Search for an actor / person", key="actor_query")
+        render_suggestions("person", "actor_query")
+        index = credit_index.get_index() if use_catalog else None
+        person = None
         if q:
-            people = search_person(q)
+            people = catalog.search_person(q) if use_catalog else search_person(q)
             if not people:
                 st.info("No people found.")
             else:
                 # Present only the person's name to the user (no id shown).
-                options = [p.get("name") for p in people]
-                choice = st.selectbox("", options)
-                if choice:
-                    # Find the first matching person and use their id to fetch credits.
-                    pid = next((p.get("id") for p in people if p.get("name") == choice), None)
-                    if pid:
-                        movies = person_movie_credits(pid)
-                        st.subheader(f"Movies for {choice}")
-                        for m in movies:
-                            st.container()
-                            movie_card(m, key_prefix="actor_")
-        else:
-            # Intentionally show nothing when the actor search field is empty.
-            pass
+                person = st.selectbox("", people, format_func=lambda p: p.get("name") or "")
+        if index is not None:
+            render_credit_query(index, person)
+        elif person:
+            pid = person.get("id")
+            movies = catalog.person_movie_credits(pid) if use_catalog else person_movie_credits(pid)
+            st.subheader(f"Movies for {person.get('name')}")
+            render_movie_list(movies, key_prefix=f"actor_{pid}_")
     elif mode == "Genre":
         gens = genres()
         name_to_id = {g["name"]: g["id"] for g in gens}
         name = st.selectbox("Pick a genre", list(name_to_id.keys()) if name_to_id else [])
         if name:
-            movies = discover_by_genre(name_to_id[name])
-            st.subheader(f"{name} movies")
-            for m in movies:
-                st.container()
-                movie_card(m, key_prefix="genre_")
+            genre_id = name_to_id[name]
+            index = facets.get_facets() if use_catalog else None
+            if index is not None:
+                render_genre_facets(index, genre_id, name, {g["id"]: g["name"] for g in gens})
+            else:
+                pager = session_pager(f"genre:{genre_id}", lambda page: discover_by_genre(genre_id, page=page))
+                st.subheader(f"{name} movies")
+                render_paged_list(pager, key_prefix=f"genre_{genre_id}_")
+    return mode
+
+def render_metrics_panel():
+    # Admin view of metrics.py, this process only; METRICS_PANEL=1 turns it on
+    def table(histogram, columns):
+        return [dict(zip(columns, labels), calls=n, mean_ms=round(mean * 1000, 1),
+                     p50_ms=round(p50 * 1000, 1), p95_ms=round(p95 * 1000, 1))
+                for labels, n, mean, p50, p95 in metrics.summary(histogram)]
+
+    with st.sidebar.expander("Metrics"):
+        if not metrics.METRICS_ENABLED:
+            st.caption("Metrics are off (METRICS=0).")
+            return
+        st.markdown("**Renders**")
+        st.dataframe(table(metrics.RENDER_SECONDS, ["view"]), hide_index=True)
+        st.markdown("**TMDB requests**")
+        st.dataframe(table(metrics.TMDB_REQUEST_SECONDS, ["endpoint", "status"]), hide_index=True)
+        outcomes = {}
+        for (endpoint, outcome), n in metrics.TMDB_CACHE.values().items():
+            outcomes.setdefault(endpoint, {"endpoint": endpoint})[outcome] = n
+        st.markdown("**TMDB cache**")
+        st.dataframe(sorted(outcomes.values(), key=lambda r: r["endpoint"]), hide_index=True)
+        retries = metrics.TMDB_RETRIES.values()
+        errors = metrics.TMDB_ERRORS.values()
+        if retries or errors:
+            st.markdown("**TMDB retries / errors**")
+            st.dataframe([{"endpoint": e, "kind": f"retry {r}", "count": n} for (e, r), n in retries.items()]
+                         + [{"endpoint": e, "kind": f"error {s}", "count": n} for (e, s), n in errors.items()],
+                         hide_index=True)
+        st.markdown("**SQLite queries**")
+        st.dataframe(table(metrics.DB_QUERY_SECONDS, ["query"]), hide_index=True)
 
 # ---------------- MAIN ----------------
 # Check if user is logged in, if not show login page
@@ -677,5 +895,9 @@ if not is_logged_in():
     login_signup_ui()
 else:
     # User is logged in, show the browse homepage
-    browse_ui()
+    started = time.perf_counter()
+    view = browse_ui()
+    metrics.RENDER_SECONDS.observe(time.perf_counter() - started, view)
+    if metrics.METRICS_PANEL:
+        render_metrics_panel()
 
@@ -1,7 +1,7 @@
 import os
 import hashlib
 import re
-from db import get_user_by_email, create_user, init_db
+from db import get_user_by_email, create_user
 
 EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 
@@ -19,7 +19,6 @@ def hash_password(password: str, salt: str) -> str:
     return sha256_hex(salt + password)
 
 def try_signup(email: str, name: str, password: str, confirm_password: str):
-    init_db()
     if not is_valid_email(email):
         return False, "Please enter a valid email."
 
@@ -44,7 +43,6 @@ def try_signup(email: str, name: str, password: str, confirm_password: str):
         return False, f"Signup failed: {e}"
 
 def try_login(email: str, password: str):
-    init_db()
     row = get_user_by_email(email)
     if not row:
         return False, "No account found with that email."
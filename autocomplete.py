@@ -0,0 +1,315 @@
+"""Search-as-you-type suggestions from an in-memory prefix index.
+
+Per kind (movie titles, person names) the index is one sorted fixed-width
+byte array of normalized keys, searched with np.searchsorted:
+
+    keys        "matrix reloaded", "reloaded", "the matrix reloaded", ...
+                every word start of the title (and original title), so
+                "matr" finds "The Matrix"; truncated to KEY_BYTES
+    key_rows    key -> entry row
+    entries     id, popularity, year, the display label and the full normalized
+                names (UTF-8 blobs + offsets)
+
+A prefix is the key range [searchsorted(p), searchsorted(p + b"\\xff")), and
+its suggestions are the most popular entries in it. Ranges up to SCAN_LIMIT
+keys are ranked on the spot; the few prefixes with more ("t", "the", "jo")
+have their top TOP_K precomputed at build time, so every lookup touches at
+most SCAN_LIMIT keys and answers in tens of microseconds.
+
+Built from the local catalog and published through vecstore, like the other
+indexes:
+
+    python autocomplete.py build
+
+suggest() serves the Search and Actor boxes in-process; AUTOCOMPLETE_PORT
+also exposes it as GET /suggest?q=matr&kind=movie&k=8 (JSON) from a daemon
+thread, for clients outside Streamlit.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import catalog
+import vecstore
+
+SUGGEST_STORE = "suggest"  # models/suggest/, see vecstore.py
+KINDS = ("movie", "person")
+KEY_BYTES = 24
+MAX_WORD_STARTS = 4  # keys per name: from its first few words on
+MAX_KEYS = 2 * MAX_WORD_STARTS  # keys per entry: its label and one alias
+FORMAT = 2
+SCAN_LIMIT = 2048
+TOP_K = 10
+AUTOCOMPLETE_HOST = os.getenv("AUTOCOMPLETE_HOST", "127.0.0.1")
+AUTOCOMPLETE_PORT = int(os.getenv("AUTOCOMPLETE_PORT", "0"))  # 0: no endpoint
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text):
+    # "Amélie  (2001)" -> "amelie 2001": case- and accent-folded words
+    text = unicodedata.normalize("NFKD", text or "").casefold()
+    return " ".join(_WORD_RE.findall("".join(c for c in text if not unicodedata.combining(c))))
+
+
+def _word_starts(name):
+    words = normalize(name).split()
+    return [" ".join(words[i:]).encode()[:KEY_BYTES] for i in range(min(len(words), MAX_WORD_STARTS))]
+
+
+class PrefixIndex:
+    def __init__(self, keys, key_rows, ids, popularity, years, label_blob, label_offsets, name_blob, name_offsets,
+                 heavy_keys, heavy_rows):
+        self.keys = keys                    # sorted S{KEY_BYTES}
+        self.key_rows = key_rows            # int32, entry row per key
+        self.ids = ids
+        self.popularity = popularity
+        self.years = years                  # 0 when unknown, and for people
+        self.label_blob = label_blob        # uint8, UTF-8 labels back to back
+        self.label_offsets = label_offsets  # int64, len(ids) + 1
+        self.name_blob = name_blob          # uint8, " label\n alias" normalized, for keys cut at KEY_BYTES
+        self.name_offsets = name_offsets    # int64, len(ids) + 1
+        self.heavy_keys = heavy_keys        # sorted prefixes with more than SCAN_LIMIT keys
+        self.heavy_rows = heavy_rows        # (len(heavy_keys), TOP_K) int32 entry rows, -1 padded
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, labels, popularity, years=None, aliases=None):
+        # One entry per id; aliases are extra names it should be found by (e.g. original titles)
+        key_list, key_rows, full_names = [], array("i"), []
+        for row, label in enumerate(labels):
+            names = [label] + ([aliases[row]] if aliases and aliases[row] and aliases[row] != label else [])
+            for key in dict.fromkeys(k for name in names for k in _word_starts(name)):
+                key_list.append(key)
+                key_rows.append(row)
+            full_names.append("\n".join(dict.fromkeys(f" {normalize(name)}" for name in names)))
+        keys = np.asarray(key_list, dtype=f"S{KEY_BYTES}")
+        order = np.argsort(keys, kind="stable")
+        label_blob, label_offsets = _blob(labels)
+        name_blob, name_offsets = _blob(full_names)
+        index = cls(
+            keys[order], np.frombuffer(key_rows, dtype=np.int32)[order] if key_rows else np.zeros(0, np.int32),
+            np.asarray(ids, dtype=np.int64), np.asarray(popularity, dtype=np.float32),
+            np.asarray(years if years is not None else np.zeros(len(labels)), dtype=np.int16),
+            label_blob, label_offsets, name_blob, name_offsets,
+            np.zeros(0, dtype=f"S{KEY_BYTES}"), np.zeros((0, TOP_K), dtype=np.int32),
+        )
+        index._precompute_heavy()
+        return index
+
+    def _precompute_heavy(self):
+        # Walk prefix lengths 1, 2, ... ; keys sharing their first L bytes are a
+        # contiguous run, and runs longer than SCAN_LIMIT get their top entries
+        # stored. Runs only shrink as L grows, so this stops early.
+        n = len(self.keys)
+        if n <= SCAN_LIMIT:
+            return
+        raw = self.keys.view(np.uint8).reshape(n, KEY_BYTES)
+        boundary = np.zeros(n, dtype=bool)
+        boundary[0] = True
+        prefixes, rows = [], []
+        for length in range(1, KEY_BYTES + 1):
+            boundary[1:] |= raw[1:, length - 1] != raw[:-1, length - 1]
+            starts = np.flatnonzero(boundary)
+            ends = np.append(starts[1:], n)
+            big = np.flatnonzero(ends - starts > SCAN_LIMIT)
+            if not len(big):
+                break
+            for lo, hi in zip(starts[big], ends[big]):
+                prefix = raw[lo, :length].tobytes()
+                if b"\0" in prefix:
+                    continue  # keys shorter than this prefix; no query ends in padding
+                top = self._top(lo, hi, TOP_K)
+                prefixes.append(prefix)
+                rows.append(np.pad(top, (0, TOP_K - len(top)), constant_values=-1))
+        order = np.argsort(np.asarray(prefixes, dtype=f"S{KEY_BYTES}"), kind="stable")
+        self.heavy_keys = np.asarray(prefixes, dtype=f"S{KEY_BYTES}")[order]
+        self.heavy_rows = np.asarray(rows, dtype=np.int32).reshape(-1, TOP_K)[order]
+
+    def _top(self, lo, hi, k):
+        # The k most popular distinct entries among keys[lo:hi]. An entry has
+        # at most MAX_KEYS keys, so that many times k candidates holds k.
+        rows = self.key_rows[lo:hi]
+        want = min(len(rows), k * MAX_KEYS)
+        pop = self.popularity[rows]
+        if want < len(rows):
+            pick = np.argpartition(-pop, want - 1)[:want]
+            rows, pop = rows[pick], pop[pick]
+        rows = rows[np.argsort(-pop, kind="stable")]
+        return np.asarray(list(dict.fromkeys(rows.tolist()))[:k], dtype=np.int32)
+
+    def label(self, row):
+        return self.label_blob[self.label_offsets[row]:self.label_offsets[row + 1]].tobytes().decode()
+
+    def names(self, row):
+        return self.name_blob[self.name_offsets[row]:self.name_offsets[row + 1]].tobytes().decode()
+
+    def suggest(self, text, k=TOP_K):
+        # [{"id", "label", "year", "popularity"}], most popular first, for names
+        # with a word starting with `text`
+        query = normalize(text)
+        if not query:
+            return []
+        prefix = query.encode()[:KEY_BYTES]
+        i = np.searchsorted(self.heavy_keys, prefix)
+        if i < len(self.heavy_keys) and self.heavy_keys[i] == prefix and k <= TOP_K:
+            rows = self.heavy_rows[i]
+            rows = rows[rows >= 0]
+        else:
+            lo = np.searchsorted(self.keys, prefix, side="left")
+            if len(prefix) < KEY_BYTES:
+                hi = np.searchsorted(self.keys, prefix + b"\xff", side="left")
+            else:  # keys are cut at KEY_BYTES, so every match equals the prefix
+                hi = np.searchsorted(self.keys, prefix, side="right")
+            rows = self._top(lo, hi, k if len(prefix) == len(query.encode()) else k * MAX_KEYS)
+        out = []
+        for row in rows.tolist():
+            if len(prefix) < len(query.encode()) and f" {query}" not in self.names(row):
+                continue  # matched on the truncated key only
+            out.append({"id": int(self.ids[row]), "label": self.label(row), "year": int(self.years[row]),
+                        "popularity": float(self.popularity[row])})
+            if len(out) == k:
+                break
+        return out
+
+    # ---- storage ----
+    FIELDS = ("keys", "key_rows", "ids", "popularity", "years", "label_blob", "label_offsets", "name_blob",
+              "name_offsets", "heavy_keys", "heavy_rows")
+
+    def arrays(self, prefix):
+        return {f"{prefix}_{name}": getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def load(cls, version, prefix):
+        return cls(*(version.array(f"{prefix}_{name}") for name in cls.FIELDS))
+
+
+def _blob(strings):
+    # (uint8 UTF-8 bytes back to back, int64 offsets with one more entry than strings)
+    encoded = [s.encode() for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def save(indexes, root=None):
+    arrays = {}
+    for kind, index in indexes.items():
+        arrays.update(index.arrays(kind))
+    meta = {kind: {"entries": len(index), "keys": len(index.keys)} for kind, index in indexes.items()}
+    return vecstore.publish(SUGGEST_STORE, {}, arrays=arrays, meta={**meta, "format": FORMAT}, root=root)
+
+
+def load(version):
+    # None for a version written by an older build; suggestions stay off until the next one
+    if version.meta.get("format") != FORMAT:
+        return None
+    return {kind: PrefixIndex.load(version, kind) for kind in KINDS}
+
+
+def _year(release_date):
+    try:
+        return int(release_date[:4])
+    except (TypeError, ValueError):
+        return 0
+
+
+def build_from_catalog(conn=None):
+    # Adult titles are left out, as search_movies leaves them out upstream
+    conn = conn or catalog.get_conn()
+    rows = conn.execute("SELECT id, title, original_title, popularity, release_date FROM movies "
+                        "WHERE adult = 0 AND title != ''").fetchall()
+    movies = PrefixIndex.build([r[0] for r in rows], [r[1] for r in rows], [r[3] or 0.0 for r in rows],
+                               years=[_year(r[4]) for r in rows], aliases=[r[2] for r in rows])
+    rows = conn.execute("SELECT id, name, popularity FROM people WHERE name != ''").fetchall()
+    people = PrefixIndex.build([r[0] for r in rows], [r[1] for r in rows], [r[2] or 0.0 for r in rows])
+    return {"movie": movies, "person": people}
+
+
+_store = vecstore.Reloader(SUGGEST_STORE, load)
+
+def get_index():
+    # {kind: PrefixIndex}, or None until `python autocomplete.py build` has been run
+    return _store.get()
+
+
+def suggest(text, kind="movie", k=8):
+    indexes = get_index()
+    if indexes is None or kind not in indexes:
+        return []
+    return indexes[kind].suggest(text, k)
+
+
+# ---------------- /suggest endpoint ----------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/suggest":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        try:
+            k = min(int(query.get("k", ["8"])[0]), TOP_K)
+        except ValueError:
+            self.send_error(400, "k must be an integer")
+            return
+        kind = query.get("kind", ["movie"])[0]
+        if kind not in KINDS:
+            self.send_error(400, f"kind must be one of {', '.join(KINDS)}")
+            return
+        body = json.dumps(suggest(query.get("q", [""])[0], kind, k)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=60")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port=None, host=None):
+    # Safe to call on every Streamlit rerun; only the first call binds the port.
+    global _server
+    port = AUTOCOMPLETE_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host or AUTOCOMPLETE_HOST, port), _Handler)
+            except OSError:
+                # Port taken, e.g. by another app process on this host: carry on without it
+                _server = False
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="autocomplete", daemon=True).start()
+    return _server or None
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("usage: python autocomplete.py build")
+    started = time.time()
+    indexes = build_from_catalog()
+    version = save(indexes)
+    print(f"Indexed {len(indexes['movie'])} titles ({len(indexes['movie'].keys)} keys) and "
+          f"{len(indexes['person'])} people ({len(indexes['person'].keys)} keys) in {time.time() - started:.1f}s")
+    print(f"Published {version.path}")
@@ -0,0 +1,191 @@
+"""Page views of the Streamlit app, end to end, against a local fake TMDB.
+
+    python benchmarks/bench_e2e.py --repeat 3 --latency 80 --jitter 40
+    python benchmarks/bench_e2e.py --flows trending,details --error-rate 0.05 --out e2e.json
+
+Starts benchmarks/fake_tmdb.py in-process, points tmdb.TMDB_API_BASE and
+TMDB_IMAGE_BASE at it, and drives app.py headlessly with Streamlit's AppTest
+as a guest. Each flow gets to its page unmeasured, then times one rerun: the
+page view. Cold views clear the TMDB, poster and card caches just before it;
+warm views repeat the flow in a new session with the caches as the cold one
+left them, i.e. the next user to open that page. The home view shows the
+stored guest feed, built during setup.
+
+Per view it reports wall time of the rerun, the upstream API calls and image
+downloads it made, and the bytes of both. Calls made by background work the
+view started (poster prefetch, revalidation, the home feed build) are counted
+too: the run waits for the fake server to go idle before reading its counters.
+Medians over --repeat runs.
+
+The app's databases and caches live in a temp directory; nothing in the
+checkout is touched. The hot-key refresher is off unless --refresher is given,
+so its schedule doesn't land in the numbers.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from fake_tmdb import FakeTMDB, Fixtures  # noqa: E402
+
+# Run as this script, so the app sees the same (already configured) modules
+APP_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+import refresher
+if not {refresher!r}:
+    refresher.start_refresher = lambda: None
+exec(compile(open({app!r}).read(), "app.py", "exec"))
+"""
+
+
+def _search_word(fixtures):
+    # The most common title word longer than three letters, so searches find plenty
+    counts = {}
+    for m in fixtures.movies.values():
+        for w in m["title"].lower().split():
+            if len(w) > 3:
+                counts[w] = counts.get(w, 0) + 1
+    return max(counts, key=counts.get)
+
+
+def _views(at):
+    return [b for b in at.button if b.label.startswith("View details")]
+
+
+# Each flow: (setup, view), both taking the AppTest; only view is measured.
+def flows(fixtures):
+    word = _search_word(fixtures)
+    star = max(fixtures.people.values(), key=lambda p: p["popularity"])["name"]
+
+    def goto(mode):
+        return lambda at: at.sidebar.radio[0].set_value(mode).run()
+
+    return {
+        "home": (lambda at: at.run(), lambda at: at.run()),
+        "trending": (lambda at: at.run(), goto("Trending")),
+        "search": (lambda at: goto("Search")(at.run()), lambda at: at.text_input[0].set_value(word).run()),
+        "actor": (lambda at: goto("Actor")(at.run()), lambda at: at.text_input[0].set_value(star).run()),
+        "genre": (lambda at: goto("Genre")(at.run()), lambda at: at.selectbox[0].select_index(1).run()),
+        "details": (lambda at: goto("Trending")(at.run()), lambda at: _views(at)[0].click().run()),
+    }
+
+
+def cold_caches(tmp):
+    import cards
+    import posters
+    import tmdb
+
+    tmdb.invalidate_cache("")
+    root = tempfile.mkdtemp(dir=tmp, prefix="posters-")
+    posters._cache = posters.PosterCache(root=root)
+    cards._card_html.cache_clear()
+    cards._card_text.cache_clear()
+
+
+def settle(server):
+    import feed
+
+    while True:
+        server.wait_idle()
+        if not feed.is_pending(feed.GUEST_ID):
+            return
+        time.sleep(0.05)
+
+
+def view(server, setup, action, from_string, tmp, cold):
+    at = from_string()
+    at.session_state["user"] = {"id": 0, "name": "Guest", "email": "guest@local"}
+    setup(at)
+    settle(server)
+    if cold:
+        cold_caches(tmp)
+    server.reset()
+    started = time.perf_counter()
+    action(at)
+    wall = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    settle(server)
+    stats = server.stats()
+    return {
+        "wall_ms": wall * 1000,
+        "api_calls": stats["api_calls"],
+        "image_calls": stats["image_calls"],
+        "api_kb": stats["api_bytes"] / 1024,
+        "image_kb": stats["image_bytes"] / 1024,
+        "errors": sum(v for k, v in stats["statuses"].items() if k != "200"),
+    }
+
+
+def median_of(runs):
+    return {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flows", default="home,trending,search,actor,genre,details")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=50.0, help="ms per fake TMDB API response")
+    parser.add_argument("--jitter", type=float, default=25.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="fake_tmdb.py --dump output; generated when omitted")
+    parser.add_argument("--refresher", action="store_true", help="leave the hot-key refresher running")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    fixtures = Fixtures.load(args.fixtures) if args.fixtures else Fixtures.generate()
+    server = FakeTMDB(fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate).start()
+    tmp = tempfile.mkdtemp(prefix="bench-e2e-")
+    # Before anything imports tmdb: these are read at import time
+    os.environ.update(
+        TMDB_API_BASE=server.api_base, TMDB_IMAGE_BASE=server.image_base, TMDB_API_KEY="fake",
+        TMDB_CACHE_DISK="0", APP_DB_PATH=os.path.join(tmp, "app.db"),
+        CATALOG_DB_PATH=os.path.join(tmp, "catalog.db"), POSTER_CACHE_DIR=os.path.join(tmp, "posters"),
+    )
+    from streamlit.testing.v1 import AppTest
+
+    script = APP_SCRIPT.format(root=ROOT, app=os.path.join(ROOT, "app.py"), refresher=args.refresher)
+
+    def from_string():
+        return AppTest.from_string(script, default_timeout=120)
+
+    table = flows(fixtures)
+    results = {}
+    try:
+        for name in args.flows.split(","):
+            setup, action = table[name]
+            cold, warm = [], []
+            for _ in range(args.repeat):
+                cold.append(view(server, setup, action, from_string, tmp, cold=True))
+                warm.append(view(server, setup, action, from_string, tmp, cold=False))
+            results[name] = {"cold": median_of(cold), "warm": median_of(warm)}
+            for kind in ("cold", "warm"):
+                r = results[name][kind]
+                print(f"{name:9s} {kind}  {r['wall_ms']:8.1f} ms  {r['api_calls']:4.0f} API calls "
+                      f"{r['api_kb']:8.1f} KiB  {r['image_calls']:4.0f} images {r['image_kb']:8.1f} KiB"
+                      + (f"  {r['errors']:.0f} errors" if r["errors"] else ""), flush=True)
+    finally:
+        server.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "out"}, "results": results},
+                      f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
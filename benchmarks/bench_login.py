@@ -0,0 +1,101 @@
+"""Login throughput against app.db's users table, old connection handling vs new.
+
+    python benchmarks/bench_login.py --threads 8 --seconds 5 --users 10000
+
+"before" replays what auth.try_login used to do per attempt: open a fresh
+connection, run init_db (CREATE TABLE + commit), look the user up, close.
+"after" is the current auth.try_login on db.py's pooled per-thread connections.
+Both run against a throwaway database in a temp directory.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth  # noqa: E402
+import db  # noqa: E402
+
+PASSWORD = "hunter22"
+
+
+def legacy_login(path, email, password):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT UNIQUE NOT NULL, "
+        "name TEXT NOT NULL, salt TEXT NOT NULL, password_hash TEXT NOT NULL, created_at TEXT NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM users WHERE email = ?", (email.lower().strip(),)).fetchone()
+    conn.close()
+    return row is not None and auth.hash_password(password, row["salt"]) == row["password_hash"]
+
+
+def seed(path, n_users):
+    conn = db.get_conn(path, migrate=True)
+    salt = auth.make_salt()
+    pwhash = auth.hash_password(PASSWORD, salt)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (email, name, salt, password_hash, created_at) VALUES (?, ?, ?, ?, '')",
+            ((f"user{i}@example.com", f"User {i}", salt, pwhash) for i in range(n_users)),
+        )
+
+
+def run(login, threads, seconds, n_users):
+    counts = [0] * threads
+    errors = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(slot):
+        rng = random.Random(slot)
+        while time.perf_counter() < deadline:
+            try:
+                ok = login(f"user{rng.randrange(n_users)}@example.com", PASSWORD)
+                counts[slot] += 1
+                errors[slot] += not ok
+            except sqlite3.OperationalError:
+                errors[slot] += 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db.DB_PATH = path
+        seed(path, args.users)
+
+        before, before_err = run(lambda e, p: legacy_login(path, e, p), args.threads, args.seconds, args.users)
+        after, after_err = run(lambda e, p: auth.try_login(e, p)[0], args.threads, args.seconds, args.users)
+
+    print(f"threads={args.threads} users={args.users}")
+    print(f"before: {before:9.0f} logins/s  ({before_err} failed)")
+    print(f"after:  {after:9.0f} logins/s  ({after_err} failed)")
+    print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
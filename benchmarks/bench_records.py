@@ -0,0 +1,121 @@
+"""Memory held by N movies as TMDB dicts vs records.Movie vs records.MovieBatch.
+
+    python benchmarks/bench_records.py --movies 1000000
+
+Movies are synthetic TMDB list results (the fields /discover and /search
+return, ~250 character overviews), decoded page by page with json.loads the
+way tmdb._get produces them. Each form is built in its own subprocess and
+measured with tracemalloc once only that form is still referenced, so the
+numbers are what a cache, catalog result or pager would keep alive. Build
+times include tracemalloc's overhead and only compare with each other.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import Movie, MovieBatch  # noqa: E402
+
+WORDS = ("the a of and to in his her an young old city war love secret family night last world life man woman "
+         "story journey must find lost town house dark friends father mother return truth past future killer "
+         "detective ship island dream power escape").split()
+GENRES = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37]
+LANGUAGES = ["en"] * 12 + ["fr", "ja", "es", "de", "ko", "it", "hi", "zh"]
+PAGE = 20
+
+
+def pages(n, seed=0):
+    # JSON text of TMDB-style result pages, generated up front so only decoding is measured
+    rng = random.Random(seed)
+    bodies = []
+    for start in range(0, n, PAGE):
+        results = []
+        for i in range(start, min(start + PAGE, n)):
+            title = " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+            results.append({
+                "adult": False,
+                "backdrop_path": f"/{i:09x}b{rng.getrandbits(64):016x}.jpg",
+                "genre_ids": rng.sample(GENRES, rng.randint(1, 3)),
+                "id": i + 1,
+                "original_language": rng.choice(LANGUAGES),
+                "original_title": title,
+                "overview": " ".join(rng.choices(WORDS, k=45)).capitalize() + ".",
+                "popularity": round(rng.random() * 200, 3),
+                "poster_path": f"/{i:09x}p{rng.getrandbits(64):016x}.jpg",
+                "release_date": f"{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "title": title,
+                "video": False,
+                "vote_average": round(rng.random() * 10, 3),
+                "vote_count": rng.randint(0, 30000),
+            })
+        bodies.append(json.dumps({"page": start // PAGE + 1, "results": results}))
+    return bodies
+
+
+def build(form, bodies):
+    if form == "dicts":
+        held = []
+        for body in bodies:
+            held.extend(json.loads(body)["results"])
+    elif form == "records":
+        held = []
+        for body in bodies:
+            held.extend(Movie.from_tmdb(m) for m in json.loads(body)["results"])
+    else:
+        held = MovieBatch()
+        for body in bodies:
+            held.extend(json.loads(body)["results"])
+    return held
+
+
+def measure(form, n):
+    bodies = pages(n)
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    held = build(form, bodies)
+    seconds = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del bodies
+
+    # Reading a 20-movie window back, as a result list does per rerun
+    started = time.perf_counter()
+    for offset in range(0, min(n, 20000), 20):
+        for m in held[offset:offset + 20]:
+            m.get("title"), m.get("vote_average"), m.get("poster_path")
+    window_us = (time.perf_counter() - started) / (min(n, 20000) / 20) * 1e6
+    return {"form": form, "bytes": current, "build_s": seconds, "window_us": window_us}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=1_000_000)
+    parser.add_argument("--form", choices=("dicts", "records", "batch"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.form:
+        print(json.dumps(measure(args.form, args.movies)))
+        return
+    results = []
+    for form in ("dicts", "records", "batch"):
+        out = subprocess.run([sys.executable, __file__, "--movies", str(args.movies), "--form", form],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out))
+    base = results[0]["bytes"]
+    print(f"{args.movies:,} movies")
+    for r in results:
+        print(f"{r['form']:8s} {r['bytes'] / 2**20:9.1f} MiB  {r['bytes'] / args.movies:7.0f} B/movie  "
+              f"{base / r['bytes']:5.1f}x smaller  build {r['build_s']:6.1f} s  20-movie window {r['window_us']:6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Script run time for an actor page with 500 credits, old list renderer vs cards.py.
+
+    python benchmarks/bench_render.py --credits 500 --runs 5
+
+"before" is the previous movie_card loop: st.columns, markdown and a button for
+every credit on every rerun. "after" is cards.render_movie_list: one memoized
+HTML block plus a button for the 20 cards in the current window. Each script is
+run through streamlit's AppTest, first cold and then as reruns (what a click
+triggers). Credits carry no poster_path so no network is touched.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+SETUP = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+import streamlit as st
+movies = [{{"id": i, "title": f"Movie {{i}}", "vote_average": 6.5, "vote_count": 1200 + i,
+           "release_date": "2001-05-04", "overview": "A long-running franchise entry. " * 12}}
+          for i in range({{credits}})]
+"""
+
+BEFORE = """
+import textwrap
+for movie in movies:
+    st.container()
+    col1, col2 = st.columns([1, 3])
+    with col2:
+        overview = movie.get("overview") or "No overview available."
+        st.markdown(f"<div class='card-right'>\\n  <h3 class='card-title'>{movie['title']}</h3>\\n"
+                    f"  <div class='card-meta'><strong>Rating:</strong> {movie['vote_average']:.1f} "
+                    f"({movie['vote_count']} votes) &nbsp; | &nbsp; <strong>Release:</strong> {movie['release_date']}</div>\\n"
+                    f"  <div class='card-overview'>{textwrap.shorten(overview, width=400, placeholder='…')}</div>\\n</div>",
+                    unsafe_allow_html=True)
+        st.button("View details & trailer", key=f"btn_actor_{movie['id']}")
+"""
+
+AFTER = """
+from cards import render_movie_list
+render_movie_list(movies, key_prefix="actor_")
+"""
+
+
+def measure(script, runs):
+    at = AppTest.from_string(script, default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - started
+    if at.exception:
+        raise SystemExit(f"script failed: {at.exception}")
+    warm = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        at.run()
+        warm.append(time.perf_counter() - started)
+    return cold, statistics.median(warm), len(at.button)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--credits", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    setup = SETUP.replace("{credits}", str(args.credits))
+    before = measure(setup + BEFORE, args.runs)
+    after = measure(setup + AFTER, args.runs)
+    print(f"{args.credits} credits, median of {args.runs} reruns")
+    for name, (cold, warm, buttons) in (("before", before), ("after", after)):
+        print(f"{name:7s} first run {cold * 1000:8.1f} ms   rerun {warm * 1000:8.1f} ms   buttons {buttons}")
+    print(f"rerun speedup: {before[1] / after[1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Offline quality and speed of the recommenders on a time-based split.
+
+    python benchmarks/eval_recommenders.py --ratings ml-25m/ratings.csv --out eval.json
+    python benchmarks/eval_recommenders.py --synthetic 20000x5000x1000000 --baseline eval.json
+
+Ratings come from a MovieLens file (ratings.csv with a userId,movieId,rating,
+timestamp header, or the older "::"-separated ratings.dat) or from
+collab.synthetic_interactions. They are split by time: either one global
+cutoff, so the model never sees the future (--split global), or the latest
+fraction of each user's history (--split user).
+
+Training uses what the app trains on: ratings of 2.5 stars and up, with the
+rating as the implicit strength. A test item is relevant when it is rated
+--relevant stars or more and the training data knows it (nothing can
+recommend an item it has never seen). Each recommender is fitted once, then
+queried one user at a time, as the app does, for:
+
+    precision@k, recall@k, ndcg@k   averaged over the evaluated users
+    coverage                        distinct recommended items / training items
+    train_seconds, qps, p50_ms, p99_ms
+
+Results are written as JSON with stable keys; --baseline prints the change
+against an earlier run's file.
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ann  # noqa: E402
+import collab  # noqa: E402
+
+LIKED = 2.5  # as db.iter_interactions
+
+
+def load_movielens(path):
+    # (user_ids, item_ids, ratings, timestamps)
+    import pandas as pd  # comes with streamlit
+
+    if path.endswith(".dat"):
+        frame = pd.read_csv(path, sep="::", engine="python", header=None,
+                            names=["userId", "movieId", "rating", "timestamp"])
+    else:
+        frame = pd.read_csv(path, dtype={"userId": np.int64, "movieId": np.int64, "rating": np.float32,
+                                         "timestamp": np.int64})
+    return (frame["userId"].to_numpy(np.int64), frame["movieId"].to_numpy(np.int64),
+            frame["rating"].to_numpy(np.float32), frame["timestamp"].to_numpy(np.int64))
+
+
+def time_split(users, timestamps, test_fraction, mode):
+    # Boolean mask of test rows
+    if mode == "global":
+        cutoff = np.quantile(timestamps, 1.0 - test_fraction)
+        return timestamps > cutoff
+    order = np.lexsort((timestamps, users))
+    sorted_users = users[order]
+    starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    counts = np.diff(np.r_[starts, len(users)])
+    rank = np.arange(len(users)) - np.repeat(starts, counts)
+    keep = np.repeat(np.ceil(counts * (1.0 - test_fraction)).astype(np.int64), counts)
+    test = np.zeros(len(users), dtype=bool)
+    test[order] = rank >= keep
+    return test
+
+
+def test_sets(users, items, ratings, relevant, known_items):
+    # {user_id: set of relevant test items}
+    keep = (ratings >= relevant) & np.isin(items, known_items)
+    users, items = users[keep], items[keep]
+    order = np.argsort(users, kind="stable")
+    users, items = users[order], items[order]
+    bounds = np.flatnonzero(np.r_[True, users[1:] != users[:-1], True])
+    return {int(users[a]): set(items[a:b].tolist()) for a, b in zip(bounds[:-1], bounds[1:])}
+
+
+# ---- recommenders: fit(Interactions) then recommend(user_id, k) -> [movie_id, ...] ----
+class Popular:
+    def __init__(self, args):
+        self.order = self.seen = self.users = None
+
+    def fit(self, data):
+        indptr, indices, _ = data.user_csr
+        counts = np.bincount(indices, minlength=data.shape[1])
+        self.order = data.item_ids[np.argsort(-counts, kind="stable")]
+        self.seen = (indptr, data.item_ids[indices])
+        self.users = data.user_ids
+
+    def recommend(self, user_id, k):
+        row = np.searchsorted(self.users, user_id)
+        indptr, seen_ids = self.seen
+        seen = set(seen_ids[indptr[row]:indptr[row + 1]].tolist())
+        out = []
+        for mid in self.order:
+            if mid not in seen:
+                out.append(int(mid))
+                if len(out) == k:
+                    break
+        return out
+
+
+_fitted = {}  # the ALS variants share one set of factors per run
+
+
+class ALS:
+    def __init__(self, args):
+        self.model = collab.ALSModel(factors=args.factors, iterations=args.iterations, workers=args.workers)
+        self.shared_seconds = 0.0  # training time of reused factors, still reported as this one's
+
+    def fit(self, data):
+        fitted = _fitted.get(id(data))
+        if fitted is None:
+            fitted = _fitted[id(data)] = self.model.fit(data)
+        else:
+            self.shared_seconds = fitted.train_seconds
+        self.model = copy.copy(fitted)
+
+    def recommend(self, user_id, k):
+        return [mid for mid, _ in self.model.recommend(user_id, n=k)]
+
+
+class ALSIndexed(ALS):
+    # ALS served from an IVF index over the item factors, as after `python ann.py build als`
+    def fit(self, data):
+        super().fit(data)
+        self.model.index = ann.IVFIndex.build(self.model.item_factors, self.model.item_ids)
+
+
+class ALSFoldIn(ALS):
+    # The app's path: the user vector is folded in from their interactions per query
+    def fit(self, data):
+        super().fit(data)
+        indptr, indices, values = data.user_csr
+        self.history = (indptr, data.item_ids[indices], values)
+
+    def recommend(self, user_id, k):
+        row = self.model._user_row(user_id)
+        indptr, ids, values = self.history
+        seen = ids[indptr[row]:indptr[row + 1]]
+        vector = self.model.fold_in(seen, values[indptr[row]:indptr[row + 1]])
+        return [mid for mid, _ in self.model.recommend_vector(vector, k, set(seen.tolist()))]
+
+
+RECOMMENDERS = {"popular": Popular, "als": ALS, "als-ivf": ALSIndexed, "als-foldin": ALSFoldIn}
+
+
+def evaluate(recommender, truth, users, k, known_items):
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    precision = recall = ndcg = 0.0
+    latencies = np.empty(len(users))
+    recommended = set()
+    for i, uid in enumerate(users):
+        started = time.perf_counter()
+        recs = recommender.recommend(uid, k)
+        latencies[i] = time.perf_counter() - started
+        relevant = truth[uid]
+        hits = np.fromiter((mid in relevant for mid in recs), dtype=bool, count=len(recs))
+        precision += hits.sum() / k
+        recall += hits.sum() / len(relevant)
+        ndcg += discounts[:len(recs)][hits].sum() / discounts[:min(len(relevant), k)].sum()
+        recommended.update(recs)
+    n = len(users)
+    return {
+        f"precision@{k}": precision / n,
+        f"recall@{k}": recall / n,
+        f"ndcg@{k}": ndcg / n,
+        "coverage": len(recommended) / len(known_items),
+        "qps": n / latencies.sum(),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def print_table(results, baseline=None):
+    for name, metrics in results.items():
+        before = (baseline or {}).get(name, {})
+        cells = []
+        for key, value in metrics.items():
+            cell = f"{key} {value:.4g}"
+            if isinstance(before.get(key), (int, float)) and before[key]:
+                cell += f" ({(value - before[key]) / abs(before[key]) * 100:+.1f}%)"
+            cells.append(cell)
+        print(f"{name:11s} " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ratings", help="MovieLens ratings.csv or ratings.dat")
+    source.add_argument("--synthetic", metavar="USERSxITEMSxRATINGS", help="e.g. 20000x5000x1000000")
+    parser.add_argument("--split", choices=("global", "user"), default="global")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--relevant", type=float, default=4.0, help="stars for a test rating to count as a hit")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--users", type=int, default=5000, help="test users sampled for the metrics")
+    parser.add_argument("--recommenders", default=",".join(RECOMMENDERS))
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.ratings:
+        users, items, ratings, timestamps = load_movielens(args.ratings)
+    else:
+        n_users, n_items, n_ratings = (int(x) for x in args.synthetic.lower().split("x"))
+        users, items, ratings, timestamps = collab.synthetic_interactions(n_users, n_items, n_ratings, seed=args.seed)
+    load_seconds = time.perf_counter() - started
+
+    test = time_split(users, timestamps, args.test_fraction, args.split)
+    liked = ~test & (ratings >= LIKED)
+    train = collab.Interactions(users[liked], items[liked], ratings[liked])
+    truth = test_sets(users[test], items[test], ratings[test], args.relevant, train.item_ids)
+    candidates = np.asarray(sorted(u for u in truth if u in set(train.user_ids.tolist())), dtype=np.int64)
+    rng = np.random.default_rng(args.seed)
+    if len(candidates) > args.users:
+        candidates = np.sort(rng.choice(candidates, args.users, replace=False))
+    eval_users = candidates.tolist()
+    if not eval_users:
+        raise SystemExit("No user has both training and relevant test ratings; try a larger test fraction.")
+    print(f"{len(ratings):,} ratings loaded in {load_seconds:.1f}s; training on {train.nnz:,} "
+          f"({train.shape[0]:,} users x {train.shape[1]:,} items), evaluating {len(eval_users):,} users", flush=True)
+
+    results = {}
+    for name in args.recommenders.split(","):
+        recommender = RECOMMENDERS[name](args)
+        started = time.perf_counter()
+        recommender.fit(train)
+        train_seconds = time.perf_counter() - started + getattr(recommender, "shared_seconds", 0.0)
+        results[name] = {"train_seconds": train_seconds, **evaluate(recommender, truth, eval_users, args.k,
+                                                                     train.item_ids)}
+        print_table({name: results[name]})
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "baseline")},
+        "data": {"ratings": int(len(ratings)), "train": int(train.nnz), "train_users": int(train.shape[0]),
+                 "train_items": int(train.shape[1]), "eval_users": len(eval_users)},
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(f"\nagainst {args.baseline}:")
+            print_table(results, json.load(f).get("results"))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
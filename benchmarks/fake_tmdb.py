@@ -0,0 +1,423 @@
+"""Local stand-in for the TMDB API and image CDN, for benchmarks and offline runs.
+
+    python benchmarks/fake_tmdb.py --port 8765 --latency 80 --jitter 40 --error-rate 0.01
+    TMDB_API_BASE=http://127.0.0.1:8765/3 TMDB_IMAGE_BASE=http://127.0.0.1:8765/t/p \\
+        TMDB_API_KEY=fake streamlit run app.py
+
+Serves the endpoints the app calls (trending, search, person credits, genres,
+discover, movie details with append_to_response, videos) from a fixture set:
+a generated catalog of movies, people and credits (--movies, --people,
+--seed), or a JSON file written earlier with --dump and read with --fixtures.
+Images under /t/p/<size>/ are small generated JPEGs of the requested width.
+
+Faults apply to API requests: every response waits --latency ms plus up to
+--jitter ms; --error-rate of them fail with --error-status; --throttle-rate
+of them, and everything over --rps per second, get a 429 with Retry-After.
+
+Counters (requests, bytes, statuses, per endpoint) are at /__stats and are
+cleared by /__reset; in-process users call FakeTMDB.stats() and reset().
+"""
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GENRES = [
+    (28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"), (99, "Documentary"),
+    (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"), (27, "Horror"), (10402, "Music"),
+    (9648, "Mystery"), (10749, "Romance"), (878, "Science Fiction"), (10770, "TV Movie"), (53, "Thriller"),
+    (10752, "War"), (37, "Western"),
+]
+WORDS = ("the a of and to in his her an young old city war love secret family night last world life man woman "
+         "story journey must find lost town house dark friends father mother return truth past future killer "
+         "detective ship island dream power escape").split()
+FIRST = ("Alex Sam Jordan Taylor Morgan Casey Riley Jamie Avery Quinn Harper Rowan Emery Parker Reese Dana "
+         "Robin Kai Noor Ira").split()
+LAST = ("Stone Rivera Chen Okafor Novak Larsen Moreau Tanaka Silva Brennan Haddad Kowalski Ibarra Lindqvist "
+        "Mensah Petrov Achterberg Nakamura Delgado Fontaine").split()
+PAGE_SIZE = 20
+CAST_PER_MOVIE = 8
+
+
+class Fixtures:
+    """Everything the server answers from: movies, people and who was in what."""
+
+    def __init__(self, movies, people, credits):
+        self.movies = {m["id"]: m for m in movies}          # id -> details payload
+        self.people = {p["id"]: p for p in people}
+        self.credits = credits                              # movie id -> {"cast": [...], "crew": [...]}
+        self.by_popularity = sorted(self.movies.values(), key=lambda m: -m["popularity"])
+        self.person_movies = {}
+        for mid, c in credits.items():
+            for entry in c["cast"]:
+                self.person_movies.setdefault(entry["id"], []).append((mid, "cast", entry["character"]))
+            for entry in c["crew"]:
+                self.person_movies.setdefault(entry["id"], []).append((mid, "crew", entry["job"]))
+
+    @classmethod
+    def generate(cls, n_movies=2000, n_people=5000, seed=0):
+        rng = random.Random(seed)
+        people = []
+        for i in range(n_people):
+            pid = 10_000 + i
+            people.append({
+                "id": pid, "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                "popularity": round(100.0 / (1 + i) ** 0.7, 3), "profile_path": f"/pr{pid:x}.jpg",
+                "known_for_department": "Acting" if rng.random() < 0.8 else "Directing",
+            })
+        weights = [1.0 / (1 + i) ** 0.5 for i in range(n_people)]  # the best-known few in ~100 films each
+        movies, credits = [], {}
+        for i in range(n_movies):
+            mid = 100 + i
+            title = " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+            genres = rng.sample(GENRES, rng.randint(1, 3))
+            movies.append({
+                "id": mid, "title": title, "original_title": title, "adult": False, "video": False,
+                "overview": " ".join(rng.choices(WORDS, k=rng.randint(25, 60))).capitalize() + ".",
+                "release_date": f"{rng.randint(1950, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "poster_path": f"/p{mid:x}.jpg", "backdrop_path": f"/b{mid:x}.jpg",
+                "popularity": round(500.0 / (1 + i) ** 0.8 * rng.uniform(0.8, 1.2), 3),
+                "vote_average": round(rng.uniform(3.0, 9.0), 3), "vote_count": rng.randint(0, 25_000),
+                "original_language": rng.choice(["en"] * 8 + ["fr", "ja", "ko", "es"]),
+                "genres": [{"id": g, "name": n} for g, n in genres], "runtime": rng.randint(75, 180),
+                "videos": [{"key": f"yt{mid:x}{k}", "site": "YouTube", "type": "Trailer", "official": k == 0,
+                            "name": f"Trailer {k + 1}"} for k in range(rng.randint(0, 2))],
+            })
+            cast = []
+            for order, pid in enumerate(dict.fromkeys(
+                    p["id"] for p in rng.choices(people, weights=weights, k=CAST_PER_MOVIE))):
+                cast.append({"id": pid, "character": f"{rng.choice(WORDS).title()} {rng.choice(LAST)}",
+                             "order": order})
+            crew = [{"id": rng.choice(people)["id"], "job": job} for job in ("Director", "Screenplay")]
+            credits[mid] = {"cast": cast, "crew": crew}
+        return cls(movies, people, credits)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["movies"], data["people"], {int(k): v for k, v in data["credits"].items()})
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"movies": list(self.movies.values()), "people": list(self.people.values()),
+                       "credits": {str(k): v for k, v in self.credits.items()}}, f)
+
+    # ---- payloads, shaped like TMDB's ----
+    @staticmethod
+    def list_item(m):
+        item = {k: v for k, v in m.items() if k not in ("genres", "runtime", "videos")}
+        item["genre_ids"] = [g["id"] for g in m["genres"]]
+        return item
+
+    def page(self, movies, page):
+        start = (page - 1) * PAGE_SIZE
+        return {
+            "page": page, "results": [self.list_item(m) for m in movies[start:start + PAGE_SIZE]],
+            "total_pages": max(1, -(-len(movies) // PAGE_SIZE)), "total_results": len(movies),
+        }
+
+    def trending(self, period, page):
+        if period == "week":
+            return self.page(self.by_popularity, page)
+        # "Today" reshuffles the popular list a little, the same way all day
+        rng = random.Random(time.strftime("%Y%m%d"))
+        day = sorted(self.by_popularity, key=lambda m: -m["popularity"] * rng.uniform(0.5, 1.5))
+        return self.page(day, page)
+
+    def search_movies(self, query, page):
+        q = query.lower()
+        return self.page([m for m in self.by_popularity if q in m["title"].lower()], page)
+
+    def search_people(self, query, page):
+        q = query.lower()
+        people = sorted((p for p in self.people.values() if q in p["name"].lower()), key=lambda p: -p["popularity"])
+        start = (page - 1) * PAGE_SIZE
+        return {"page": page, "results": people[start:start + PAGE_SIZE],
+                "total_pages": max(1, -(-len(people) // PAGE_SIZE)), "total_results": len(people)}
+
+    def discover(self, with_genres, page):
+        wanted = {int(g) for g in re.split(r"[,|]", with_genres) if g} if with_genres else set()
+        movies = [m for m in self.by_popularity if wanted <= {g["id"] for g in m["genres"]}]
+        return self.page(movies, page)
+
+    def person_credits(self, person_id):
+        if person_id not in self.people:
+            return None
+        out = {"id": person_id, "cast": [], "crew": []}
+        for mid, role, detail in self.person_movies.get(person_id, []):
+            item = self.list_item(self.movies[mid])
+            if role == "cast":
+                out["cast"].append({**item, "character": detail})
+            else:
+                out["crew"].append({**item, "job": detail})
+        return out
+
+    def details(self, movie_id, append):
+        m = self.movies.get(movie_id)
+        if m is None:
+            return None
+        out = {k: v for k, v in m.items() if k != "videos"}
+        if "videos" in append:
+            out["videos"] = {"results": m["videos"]}
+        if "credits" in append:
+            c = self.credits[movie_id]
+            out["credits"] = {
+                "cast": [{**self.people[e["id"]], **e} for e in c["cast"]],
+                "crew": [{**self.people[e["id"]], **e} for e in c["crew"]],
+            }
+        if "recommendations" in append:
+            genre = m["genres"][0]["id"]
+            similar = [x for x in self.by_popularity if x["id"] != movie_id and genre in {g["id"] for g in x["genres"]}]
+            out["recommendations"] = self.page(similar, 1)
+        return out
+
+
+@lru_cache(maxsize=4096)
+def _image(size, name):
+    # A flat JPEG in a colour derived from the file name, 2:3 like a poster
+    from PIL import Image
+
+    width = int(size[1:]) if size[1:].isdigit() else 500
+    digest = hashlib.md5(name.encode()).digest()
+    buf = io.BytesIO()
+    Image.new("RGB", (width, width * 3 // 2), tuple(digest[:3])).save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+class FakeTMDB(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fixtures=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, throttle_rate=0.0, rps=0.0, seed=0):
+        super().__init__((host, port), _Handler)
+        self.fixtures = fixtures or Fixtures.generate(seed=seed)
+        self.latency = latency / 1000.0
+        self.jitter = jitter / 1000.0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.rps = rps
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0, 0)  # (second, requests in it) for the rps limit
+        self.reset()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    @property
+    def api_base(self):
+        return f"{self.url}/3"
+
+    @property
+    def image_base(self):
+        return f"{self.url}/t/p"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-tmdb", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # ---- counters ----
+    def reset(self):
+        with self._lock:
+            self._requests = Counter()   # endpoint -> requests
+            self._bytes = Counter()      # endpoint -> response bytes
+            self._statuses = Counter()
+            self._in_flight = 0
+            self._last = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            api = {k: v for k, v in self._requests.items() if k != "image"}
+            return {
+                "api_calls": sum(api.values()),
+                "image_calls": self._requests["image"],
+                "api_bytes": sum(v for k, v in self._bytes.items() if k != "image"),
+                "image_bytes": self._bytes["image"],
+                "by_endpoint": dict(self._requests),
+                "statuses": {str(k): v for k, v in self._statuses.items()},
+                "in_flight": self._in_flight,
+            }
+
+    def wait_idle(self, quiet=0.25, timeout=30.0):
+        # Until nothing has been in flight for `quiet` seconds, e.g. after a
+        # page view whose prefetches and revalidations run in the background
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                idle = self._in_flight == 0 and time.monotonic() - self._last >= quiet
+            if idle:
+                return True
+            time.sleep(quiet / 5)
+        return False
+
+    def _begin(self):
+        with self._lock:
+            self._in_flight += 1
+            self._last = time.monotonic()
+
+    def _end(self, endpoint, status, nbytes):
+        with self._lock:
+            self._in_flight -= 1
+            self._last = time.monotonic()
+            self._requests[endpoint] += 1
+            self._bytes[endpoint] += nbytes
+            self._statuses[status] += 1
+
+    def _fault(self):
+        # None, or the status this API request should fail with
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.latency + self._rng.random() * self.jitter
+            if self.rps:
+                second = int(time.monotonic())
+                start, count = self._window
+                count = count + 1 if start == second else 1
+                self._window = (second, count)
+                if count > self.rps:
+                    return delay, 429
+        if roll < self.throttle_rate:
+            return delay, 429
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, self.error_status
+        return delay, None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/__stats":
+            self._send(200, json.dumps(server.stats()).encode())
+            return
+        if url.path == "/__reset":
+            server.reset()
+            self._send(200, b"{}")
+            return
+        server._begin()
+        endpoint, status, nbytes = "unknown", 500, 0
+        try:
+            if url.path.startswith("/t/p/"):
+                endpoint = "image"
+                parts = url.path.split("/")
+                if server.latency:
+                    time.sleep(server.latency)
+                status = 200 if len(parts) == 5 else 404
+                nbytes = self._send(status, _image(parts[3], parts[4]) if status == 200 else b"", "image/jpeg")
+                return
+            endpoint, payload = route(server.fixtures, url.path, {k: v[0] for k, v in parse_qs(url.query).items()})
+            delay, fault = server._fault()
+            if delay:
+                time.sleep(delay)
+            if fault == 429:
+                status = 429
+                body = b'{"status_code":25,"status_message":"Your request count is over the allowed limit."}'
+                nbytes = self._send(429, body, headers=[("Retry-After", "1")])
+            elif fault:
+                status = fault
+                nbytes = self._send(fault, b'{"status_code":11,"status_message":"Internal error."}')
+            elif payload is None:
+                status = 404
+                nbytes = self._send(404, b'{"status_code":34,"status_message":"The resource could not be found."}')
+            else:
+                status = 200
+                nbytes = self._send(200, json.dumps(payload, separators=(",", ":")).encode())
+        finally:
+            server._end(endpoint, status, nbytes)
+
+
+def route(fixtures, path, query):
+    # (endpoint name, payload or None) for an API path under /3
+    page = int(query.get("page", 1))
+    parts = path.strip("/").split("/")[1:]  # drop the "3"
+    if parts[:2] == ["trending", "movie"] and len(parts) == 3:
+        return "trending", fixtures.trending(parts[2], page)
+    if parts == ["search", "movie"]:
+        return "search_movie", fixtures.search_movies(query.get("query", ""), page)
+    if parts == ["search", "person"]:
+        return "search_person", fixtures.search_people(query.get("query", ""), page)
+    if parts == ["genre", "movie", "list"]:
+        return "genres", {"genres": [{"id": g, "name": n} for g, n in GENRES]}
+    if parts == ["discover", "movie"]:
+        return "discover", fixtures.discover(query.get("with_genres", ""), page)
+    if len(parts) == 3 and parts[0] == "person" and parts[2] == "movie_credits" and parts[1].isdigit():
+        return "person_credits", fixtures.person_credits(int(parts[1]))
+    if len(parts) >= 2 and parts[0] == "movie" and parts[1].isdigit():
+        movie_id = int(parts[1])
+        if parts[2:] == ["videos"]:
+            m = fixtures.movies.get(movie_id)
+            return "videos", {"id": movie_id, "results": m["videos"]} if m else None
+        if not parts[2:]:
+            append = set(filter(None, query.get("append_to_response", "").split(",")))
+            return "details", fixtures.details(movie_id, append)
+    return "unknown", None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", help="JSON written by --dump; generated when omitted")
+    parser.add_argument("--dump", metavar="PATH", help="write the generated fixtures here and exit")
+    parser.add_argument("--movies", type=int, default=2000)
+    parser.add_argument("--people", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more ms, uniformly")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction answered 429")
+    parser.add_argument("--rps", type=float, default=0.0, help="answer 429 past this many requests a second")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = Fixtures.load(args.fixtures)
+    else:
+        fixtures = Fixtures.generate(args.movies, args.people, args.seed)
+    if args.dump:
+        fixtures.save(args.dump)
+        print(f"Wrote {len(fixtures.movies)} movies and {len(fixtures.people)} people to {args.dump}")
+        return
+    server = FakeTMDB(fixtures, args.host, args.port, args.latency, args.jitter, args.error_rate,
+                      args.error_status, args.throttle_rate, args.rps, args.seed)
+    print(f"Fake TMDB on {server.url}: TMDB_API_BASE={server.api_base} TMDB_IMAGE_BASE={server.image_base}",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
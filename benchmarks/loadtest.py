@@ -0,0 +1,432 @@
+"""How many simultaneous sessions one app process holds before latency collapses.
+
+    python benchmarks/loadtest.py --levels 1,2,4,8,16,32 --seconds 30 --think 1.0
+    python benchmarks/loadtest.py --levels 4,8 --latency 120 --error-rate 0.02 --out load.json
+
+Starts benchmarks/fake_tmdb.py in this process and app.py under `streamlit
+run` in a child process pointed at it, then plays browsers against the
+server: each virtual user is a websocket session speaking Streamlit's own
+protocol (BackMsg rerun requests carrying widget states, ForwardMsg deltas
+back), all of them on one asyncio loop here. A virtual user opens the app,
+logs in through the login form (auth.try_login against seeded accounts),
+then clicks around for --actions steps with exponential think time between
+them before leaving; a new user takes its place until the level ends. A step
+is one rerun, chosen from what is on screen:
+
+    nav       switch the sidebar section (For You, Trending, Search, Actor, Genre)
+    period    flip Trending between day and week
+    search    type a title word into Search
+    actor     type a person's name into Actor
+    genre     pick a genre
+    details   open a movie's details, then "back" to the list
+
+A step's latency runs from sending the rerun to the server's script_finished
+for it, so it includes the server's queueing, the script and shipping the
+page. Concurrency ramps through --levels; each level runs for --seconds after
+a --warmup whose steps aren't counted. Per level it reports steps per second,
+latency percentiles (overall and per step), the error rate (an exception
+shown on the page, or a step that failed or timed out) and the server's RSS,
+peak and at the end. The ramp stops early once p95 passes --max-p95 ms or
+errors pass --max-errors.
+
+The server keeps its caches across levels, as a long-running process does.
+Its databases live in a temp directory; the hot-key refresher is off unless
+--refresher is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from bench_e2e import APP_SCRIPT  # noqa: E402
+from fake_tmdb import FakeTMDB, Fixtures  # noqa: E402
+
+PASSWORD = "loadtest"
+MODES = ["For You", "Trending", "Search", "Actor", "Genre"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+        return int(out.strip() or 0) * 1024
+
+
+def seed_users(n):
+    import auth
+    import db
+
+    conn = db.get_conn()
+    salt = auth.make_salt()
+    pwhash = auth.hash_password(PASSWORD, salt)
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (email, name, salt, password_hash, created_at) VALUES (?, ?, ?, ?, '')",
+            ((f"load{i}@example.com", f"Load {i}", salt, pwhash) for i in range(n)),
+        )
+
+
+def start_app(tmp, port, refresher, log):
+    script = os.path.join(tmp, "loadtest_app.py")
+    with open(script, "w") as f:
+        f.write(APP_SCRIPT.format(root=ROOT, app=os.path.join(ROOT, "app.py"), refresher=refresher))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", script, "--server.headless", "true",
+         "--server.address", "127.0.0.1", "--server.port", str(port), "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"streamlit exited with {proc.returncode}; see {log.name}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("streamlit did not come up within 60s")
+
+
+def state(widget_id, **value):
+    return {widget_id: WidgetState(id=widget_id, **value)}
+
+
+class Session:
+    """One browser tab: a websocket to the app and the widget values it holds."""
+
+    def __init__(self, base, timeout):
+        self.base = base
+        self.timeout = timeout
+        self.ws = None
+        self.states = {}  # widget id -> WidgetState, resent with every rerun as the browser does
+        self.elements = {}  # delta path -> Element, for the last finished run
+        self.messages = {}  # hash -> ForwardMsg, to resolve ref_hash messages
+        self.page_hash = ""
+
+    async def connect(self):
+        self.ws = await websocket_connect(f"ws://{self.base}/_stcore/stream", subprotocols=["streamlit"],
+                                          max_message_size=200 * 2 ** 20)
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def _forward_msg(self):
+        data = await self.ws.read_message()
+        if data is None:
+            raise ConnectionError("server closed the session")
+        msg = ForwardMsg()
+        msg.ParseFromString(data)
+        if msg.WhichOneof("type") == "ref_hash":
+            # A message this tab was sent before; the browser keeps those by hash
+            metadata, ref = msg.metadata, msg.ref_hash
+            msg = self.messages.get(ref) or await self._fetch_message(ref)
+            msg.metadata.CopyFrom(metadata)
+        elif msg.hash:
+            self.messages[msg.hash] = msg
+        return msg
+
+    async def _fetch_message(self, ref):
+        response = await AsyncHTTPClient().fetch(f"http://{self.base}/_stcore/message?hash={ref}")
+        msg = ForwardMsg()
+        msg.ParseFromString(response.body)
+        self.messages[ref] = msg
+        return msg
+
+    async def rerun(self, trigger=None, **values):
+        # Send the widget states (plus a button press) and wait for the page;
+        # True unless the run failed or shows an exception
+        self.states.update(values)
+        back = BackMsg()
+        back.rerun_script.query_string = ""
+        back.rerun_script.page_script_hash = self.page_hash
+        back.rerun_script.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            back.rerun_script.widget_states.widgets.add(id=trigger, trigger_value=True)
+        await self.ws.write_message(back.SerializeToString(), binary=True)
+        return await asyncio.wait_for(self._until_finished(), self.timeout)
+
+    async def _until_finished(self):
+        elements = {}
+        while True:
+            msg = await self._forward_msg()
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                elements = {}  # a run starts over; st.rerun() makes a second one
+                self.page_hash = msg.new_session.page_script_hash
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elements[tuple(msg.metadata.delta_path)] = msg.delta.new_element
+            elif kind == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                self.elements = elements
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    return False
+                return not any(e.WhichOneof("type") == "exception" for e in elements.values())
+
+    def widgets(self, kind, label=None, prefix=None):
+        found = []
+        for path in sorted(self.elements):
+            element = self.elements[path]
+            if element.WhichOneof("type") != kind:
+                continue
+            widget = getattr(element, kind)
+            if (label is None or widget.label == label) and (prefix is None or widget.label.startswith(prefix)):
+                found.append(widget)
+        return found
+
+
+class VirtualUser:
+    """Opens the app, logs in, then picks each next click from what is on screen."""
+
+    def __init__(self, session, rng, words, names, n_users):
+        self.s = session
+        self.rng = rng
+        self.words = words
+        self.names = names
+        self.n_users = n_users
+        self.mode = None
+
+    async def open(self):
+        await self.s.connect()
+        return await self.s.rerun()
+
+    async def login(self):
+        email = self.s.widgets("text_input", label="Email")[0]
+        password = self.s.widgets("text_input", label="Password")[0]
+        submit = self.s.widgets("button", label="Log in")[0]
+        ok = await self.s.rerun(
+            trigger=submit.id,
+            **state(email.id, string_value=f"load{self.rng.randrange(self.n_users)}@example.com"),
+            **state(password.id, string_value=PASSWORD),
+        )
+        self.mode = MODES[0]
+        return ok and bool(self.s.widgets("radio", label="Choose a section:"))
+
+    def next_step(self):
+        # (name, coroutine function) for the next click
+        s = self.s
+        back = s.widgets("button", label="⬅ Back to list")
+        if back:
+            return "back", lambda: s.rerun(trigger=back[0].id)
+        choices = [("nav", self.nav, 3)]
+        details = s.widgets("button", prefix="View details")
+        if details:
+            choices.append(("details", lambda: s.rerun(trigger=self.rng.choice(details).id), 3))
+        period = s.widgets("radio", label="Period")
+        search = s.widgets("text_input", label="Search for a movie title")
+        actor = s.widgets("text_input", label="Search for an actor / person")
+        genre = s.widgets("selectbox", label="Pick a genre")
+        if period:
+            choices.append(("period", lambda: s.rerun(**state(period[0].id, int_value=self.rng.randrange(2))), 1))
+        if search:
+            choices.append(("search", lambda: s.rerun(
+                **state(search[0].id, string_value=self.rng.choice(self.words))), 4))
+        if actor:
+            choices.append(("actor", lambda: s.rerun(
+                **state(actor[0].id, string_value=self.rng.choice(self.names))), 3))
+        if genre:
+            choices.append(("genre", lambda: s.rerun(
+                **state(genre[0].id, int_value=self.rng.randrange(len(genre[0].options)))), 4))
+        name, action, _ = self.rng.choices(choices, weights=[w for _, _, w in choices])[0]
+        return name, action
+
+    async def nav(self):
+        radio = self.s.widgets("radio", label="Choose a section:")[0]
+        self.mode = self.rng.choice([m for m in MODES if m != self.mode])
+        return await self.s.rerun(**state(radio.id, int_value=list(radio.options).index(self.mode)))
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = []  # (step, seconds, ok)
+        self.counting = False
+
+    def add(self, step, seconds, ok):
+        if self.counting:
+            self.samples.append((step, seconds, ok))
+
+
+async def timed_step(recorder, name, action):
+    started = time.perf_counter()
+    try:
+        ok = await action()
+    except (asyncio.TimeoutError, ConnectionError, IndexError, OSError):
+        ok = False  # timed out, dropped, or the page lacked the widget to click
+    recorder.add(name, time.perf_counter() - started, ok)
+    return ok
+
+
+async def run_user(stop, recorder, base, slot, args, words, names):
+    rng = random.Random(f"{args.seed}:{slot}")
+    while not stop.is_set():
+        session = Session(base, args.timeout)
+        vu = VirtualUser(session, rng, words, names, args.users)
+        try:
+            if not (await timed_step(recorder, "open", vu.open) and await timed_step(recorder, "login", vu.login)):
+                continue
+            for _ in range(args.actions):
+                try:
+                    await asyncio.wait_for(stop.wait(), rng.expovariate(1.0 / args.think) if args.think > 0 else 0)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                name, action = vu.next_step()
+                if not await timed_step(recorder, name, action):
+                    break  # the page is in an unknown state; this user leaves
+        finally:
+            session.close()
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+    def at(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+    return {"p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99)}
+
+
+async def run_level(concurrency, base, pid, args, words, names):
+    recorder = Recorder()
+    stop = asyncio.Event()
+    rss = [rss_bytes(pid)]
+    users = [asyncio.ensure_future(run_user(stop, recorder, base, i, args, words, names))
+             for i in range(concurrency)]
+    await asyncio.sleep(args.warmup)
+    recorder.counting = True
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.seconds:
+        await asyncio.sleep(0.25)
+        rss.append(rss_bytes(pid))
+    recorder.counting = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.wait(users, timeout=args.timeout)
+
+    samples = recorder.samples
+    errors = sum(not ok for _, _, ok in samples)
+    by_step = {}
+    for step, seconds, _ in samples:
+        by_step.setdefault(step, []).append(seconds)
+    return {
+        "concurrency": concurrency,
+        "steps": len(samples),
+        "steps_per_second": len(samples) / elapsed,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        **percentiles([s for _, s, _ in samples]),
+        "mean_ms": statistics.fmean(s for _, s, _ in samples) * 1000 if samples else None,
+        "rss_peak_mb": max(rss) / 2 ** 20,
+        "rss_end_mb": rss[-1] / 2 ** 20,
+        "per_step": {step: {"count": len(v), **percentiles(v)} for step, v in sorted(by_step.items())},
+    }
+
+
+async def ramp(base, pid, server, args, words, names):
+    results = []
+    for level in (int(x) for x in args.levels.split(",")):
+        server.reset()
+        r = await run_level(level, base, pid, args, words, names)
+        r["tmdb_api_calls"] = server.stats()["api_calls"]
+        results.append(r)
+        print(f"{level:4d} sessions  {r['steps_per_second']:7.2f} steps/s  "
+              f"p50 {r['p50_ms'] or 0:8.1f}  p95 {r['p95_ms'] or 0:8.1f}  p99 {r['p99_ms'] or 0:8.1f} ms  "
+              f"errors {r['error_rate'] * 100:5.1f}%  RSS {r['rss_peak_mb']:7.1f} MiB peak "
+              f"{r['rss_end_mb']:7.1f} end  {r['tmdb_api_calls']} TMDB calls", flush=True)
+        if args.max_p95 is not None and (r["p95_ms"] or 0) > args.max_p95:
+            print(f"p95 over {args.max_p95:.0f} ms at {level} sessions; stopping")
+            break
+        if r["error_rate"] > args.max_errors:
+            print(f"error rate over {args.max_errors:.0%} at {level} sessions; stopping")
+            break
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8,16", help="concurrent sessions per level")
+    parser.add_argument("--seconds", type=float, default=20.0, help="measured time per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured time at the start of each level")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a user's steps")
+    parser.add_argument("--actions", type=int, default=10, help="steps per user after logging in")
+    parser.add_argument("--users", type=int, default=1000, help="accounts seeded for logins")
+    parser.add_argument("--max-p95", type=float, default=None, help="stop ramping once p95 passes this (ms)")
+    parser.add_argument("--max-errors", type=float, default=0.5, help="stop ramping past this error rate")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds one step may take")
+    parser.add_argument("--latency", type=float, default=50.0, help="ms per fake TMDB API response")
+    parser.add_argument("--jitter", type=float, default=25.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rps", type=float, default=0.0, help="fake TMDB's per-second limit, 429 above it")
+    parser.add_argument("--fixtures", help="fake_tmdb.py --dump output; generated when omitted")
+    parser.add_argument("--refresher", action="store_true", help="leave the hot-key refresher running")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+
+    fixtures = Fixtures.load(args.fixtures) if args.fixtures else Fixtures.generate(seed=args.seed)
+    server = FakeTMDB(fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate, rps=args.rps).start()
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    # Read by db here, for seeding, and by the app server, which inherits them
+    os.environ.update(
+        TMDB_API_BASE=server.api_base, TMDB_IMAGE_BASE=server.image_base, TMDB_API_KEY="fake",
+        TMDB_CACHE_DISK="0", APP_DB_PATH=os.path.join(tmp, "app.db"),
+        CATALOG_DB_PATH=os.path.join(tmp, "catalog.db"), POSTER_CACHE_DIR=os.path.join(tmp, "posters"),
+    )
+    seed_users(args.users)
+    # What users type: title words and names of the better-known movies and people
+    words = sorted({w for m in fixtures.by_popularity[:200] for w in m["title"].lower().split() if len(w) > 3})
+    names = [p["name"] for p in sorted(fixtures.people.values(), key=lambda p: -p["popularity"])[:200]]
+
+    port = free_port()
+    log = open(os.path.join(tmp, "streamlit.log"), "w")
+    app = start_app(tmp, port, args.refresher, log)
+    try:
+        results = asyncio.run(ramp(f"127.0.0.1:{port}", app.pid, server, args, words, names))
+    finally:
+        app.terminate()
+        app.wait(10)
+        log.close()
+        server.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "out"}, "results": results},
+                      f, indent=2, sort_keys=True)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import html
+import os
+import textwrap
+from functools import lru_cache
+
+import streamlit as st
+
+import posters
+from tmdb import poster_url
+from tmdb_async import trailers_for
+
+CARD_WINDOW = int(os.getenv("CARD_WINDOW", "20"))  # cards drawn per screen
+
+
+@lru_cache(maxsize=512)
+def _card_text(title, rating, count, release, overview):
+    return (
+        f"<h3 class='card-title'>{html.escape(title)}</h3>"
+        f"<div class='card-meta'><strong>Rating:</strong> {rating:.1f} ({count} votes) &nbsp; | &nbsp; "
+        f"<strong>Release:</strong> {html.escape(release)}</div>"
+        f"<div class='card-overview'>{html.escape(textwrap.shorten(overview, width=400, placeholder='…'))}</div>"
+    )
+
+def _trailer_url(trailer):
+    return f"https://www.youtube.com/watch?v={trailer}"
+
+@lru_cache(maxsize=512)
+def _card_html(text, poster, trailer):
+    img = f'<img src="{poster}" style="width:100%;border-radius:4px;"/>' if poster else ""
+    if img and trailer:
+        # Tapping the poster plays the trailer in a new tab
+        img = f'<a href="{_trailer_url(trailer)}" target="_blank">{img}</a>'
+    return (
+        "<div style='display:flex;gap:1.5rem;align-items:flex-start;'>"
+        f"<div style='flex:1;min-width:0;'>{img}</div>"
+        f"<div class='card-right' style='flex:3;min-width:0;'>{text}</div>"
+        "</div>"
+    )
+
+def card_text(movie):
+    return _card_text(
+        movie.get("title") or movie.get("original_title") or "Untitled",
+        float(movie.get("vote_average") or 0.0),
+        int(movie.get("vote_count") or 0),
+        movie.get("release_date") or "—",
+        movie.get("overview") or "No overview available.",
+    )
+
+def card_html(movie, trailer=None):
+    # One HTML block per card with the remote poster, memoized on everything it
+    # shows, so a rerun re-emits a cached string instead of rebuilding columns.
+    return _card_html(card_text(movie), poster_url(movie.get("poster_path")), trailer)
+
+def render_card(movie, key_prefix="", trailer=None, thumb=None):
+    if thumb and os.path.exists(thumb):
+        # Local thumbnails go through st.image: served by URL and cached by the
+        # browser rather than inlined into every rerun. st.image can't be wrapped
+        # in a link, so the trailer gets one of its own under the poster.
+        img_col, text_col = st.columns([1, 3])
+        img_col.image(thumb, use_column_width=True)
+        if trailer:
+            img_col.markdown(f'<a href="{_trailer_url(trailer)}" target="_blank">▶ Play trailer</a>',
+                             unsafe_allow_html=True)
+        text_col.markdown(f"<div class='card-right'>{card_text(movie)}</div>", unsafe_allow_html=True)
+    else:
+        st.markdown(card_html(movie, trailer=trailer), unsafe_allow_html=True)
+    if st.button("View details & trailer", key=f"btn_{key_prefix}{movie.get('id')}"):
+        st.session_state["selected_movie"] = movie.get("id")
+        # The details view replaces the list, so this one needs the whole page
+        st.rerun()
+
+
+def _shift(state_key, delta):
+    st.session_state[state_key] = max(st.session_state.get(state_key, 0) + delta, 0)
+
+def _render_window(movies, key_prefix, window, pager=None):
+    state_key = f"window_{key_prefix}"
+    offset = st.session_state.get(state_key, 0)
+    # Fill a short window from the pager first (pages shrink after de-duplication)
+    while pager is not None and pager.has_more and offset + window > len(movies):
+        if not pager.load_more() and pager.error:
+            break
+    total = len(movies)
+    offset = min(offset, max(total - 1, 0) // window * window)
+    shown = movies[offset:offset + window]
+
+    # Only the cards on screen get their trailers and thumbnails resolved; a
+    # thumbnail not ready in time leaves its card on the remote poster.
+    pending = posters.prefetch_posters_async([m.get("poster_path") for m in shown])
+    trailers = trailers_for([m.get("id") for m in shown if m.get("poster_path")])
+    thumbs = posters.collect(pending)
+    for m in shown:
+        render_card(m, key_prefix=key_prefix, trailer=trailers.get(m.get("id")), thumb=thumbs.get(m.get("poster_path")))
+
+    if pager is not None and pager.error:
+        st.warning("Couldn't load more results right now.")
+    more = offset + window < total or (pager is not None and pager.has_more)
+    if offset == 0 and not more:
+        return
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("◀ Previous", key=f"prev_{key_prefix}", disabled=offset == 0, use_container_width=True,
+                  on_click=_shift, args=(state_key, -window))
+    with info_col:
+        suffix = "+" if pager is not None and pager.has_more else ""
+        st.caption(f"Showing {offset + 1}–{offset + len(shown)} of {total}{suffix}")
+    with next_col:
+        st.button("Next ▶", key=f"next_{key_prefix}", disabled=not more, use_container_width=True,
+                  on_click=_shift, args=(state_key, window))
+
+@st.fragment
+def render_movie_list(movies, key_prefix="", window=CARD_WINDOW):
+    # Windowed list: paging through it reruns only this fragment, not the page.
+    _render_window(movies, key_prefix, window)
+
+@st.fragment
+def render_paged_list(pager, key_prefix="", window=CARD_WINDOW):
+    # Same, over a paging.Pager; "Next" past the loaded results pulls the next page.
+    _render_window(pager.movies, key_prefix, window, pager=pager)
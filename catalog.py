@@ -0,0 +1,362 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from records import Movie
+
+CATALOG_PATH = os.getenv("CATALOG_DB_PATH", os.path.join(os.path.dirname(__file__), "catalog.db"))
+
+MOVIE_FIELDS = (
+    "id", "title", "original_title", "overview", "release_date", "poster_path", "backdrop_path",
+    "vote_average", "vote_count", "popularity", "original_language", "genre_ids", "adult", "runtime",
+)
+PERSON_FIELDS = ("id", "name", "popularity", "profile_path", "known_for_department")
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS movies (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL DEFAULT '',
+        original_title TEXT NOT NULL DEFAULT '',
+        overview TEXT NOT NULL DEFAULT '',
+        release_date TEXT,
+        poster_path TEXT,
+        backdrop_path TEXT,
+        vote_average REAL NOT NULL DEFAULT 0,
+        vote_count INTEGER NOT NULL DEFAULT 0,
+        popularity REAL NOT NULL DEFAULT 0,
+        original_language TEXT,
+        genre_ids TEXT NOT NULL DEFAULT '',
+        adult INTEGER NOT NULL DEFAULT 0,
+        runtime INTEGER,
+        updated_at TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS people (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        popularity REAL NOT NULL DEFAULT 0,
+        profile_path TEXT,
+        known_for_department TEXT,
+        updated_at TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS credits (
+        person_id INTEGER NOT NULL,
+        movie_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        job TEXT NOT NULL DEFAULT '',
+        character TEXT,
+        ord INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (person_id, movie_id, kind, job)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_credits_movie ON credits (movie_id)",
+    # External-content FTS tables: the text lives once in movies/people and the
+    # triggers below keep the index in step with every insert/update/delete.
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+        title, original_title, overview,
+        content='movies', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS people_fts USING fts5(
+        name,
+        content='people', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS movies_ai AFTER INSERT ON movies BEGIN
+        INSERT INTO movies_fts (rowid, title, original_title, overview)
+        VALUES (new.id, new.title, new.original_title, new.overview);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS movies_ad AFTER DELETE ON movies BEGIN
+        INSERT INTO movies_fts (movies_fts, rowid, title, original_title, overview)
+        VALUES ('delete', old.id, old.title, old.original_title, old.overview);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS movies_au AFTER UPDATE OF title, original_title, overview ON movies BEGIN
+        INSERT INTO movies_fts (movies_fts, rowid, title, original_title, overview)
+        VALUES ('delete', old.id, old.title, old.original_title, old.overview);
+        INSERT INTO movies_fts (rowid, title, original_title, overview)
+        VALUES (new.id, new.title, new.original_title, new.overview);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS people_ai AFTER INSERT ON people BEGIN
+        INSERT INTO people_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS people_ad AFTER DELETE ON people BEGIN
+        INSERT INTO people_fts (people_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS people_au AFTER UPDATE OF name ON people BEGIN
+        INSERT INTO people_fts (people_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO people_fts (rowid, name) VALUES (new.id, new.name);
+    END
+    ''',
+]
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+def get_conn(path=None):
+    path = path or CATALOG_PATH
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-32000")
+        conns[path] = conn
+    if path not in _initialized:
+        init_catalog(conn, path)
+    return conn
+
+def init_catalog(conn, path):
+    with _init_lock:
+        if path in _initialized:
+            return
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        conn.commit()
+        _initialized.add(path)
+
+# ---------------- Ingest ----------------
+def _now():
+    return datetime.utcnow().isoformat()
+
+def _genre_ids(movie):
+    ids = movie.get("genre_ids")
+    if ids is None:
+        # Detail responses carry full genre objects instead of ids
+        ids = [g.get("id") for g in movie.get("genres") or []]
+    return ",".join(str(g) for g in ids if g is not None)
+
+def _movie_row(m, now):
+    return (
+        m["id"], m.get("title") or "", m.get("original_title") or "", m.get("overview") or "",
+        m.get("release_date") or None, m.get("poster_path"), m.get("backdrop_path"),
+        m.get("vote_average") or 0.0, m.get("vote_count") or 0, m.get("popularity") or 0.0,
+        m.get("original_language"), _genre_ids(m), int(bool(m.get("adult"))), m.get("runtime"), now,
+    )
+
+def _person_row(p, now):
+    return (p["id"], p.get("name") or "", p.get("popularity") or 0.0, p.get("profile_path"),
+            p.get("known_for_department"), now)
+
+_UPSERT_MOVIE = '''
+    INSERT INTO movies (id, title, original_title, overview, release_date, poster_path, backdrop_path,
+                        vote_average, vote_count, popularity, original_language, genre_ids, adult, runtime, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        title = excluded.title, original_title = excluded.original_title, overview = excluded.overview,
+        release_date = excluded.release_date, poster_path = excluded.poster_path,
+        backdrop_path = excluded.backdrop_path, vote_average = excluded.vote_average,
+        vote_count = excluded.vote_count, popularity = excluded.popularity,
+        original_language = excluded.original_language, genre_ids = excluded.genre_ids,
+        adult = excluded.adult, runtime = COALESCE(excluded.runtime, movies.runtime),
+        updated_at = excluded.updated_at
+'''
+
+_UPSERT_PERSON = '''
+    INSERT INTO people (id, name, popularity, profile_path, known_for_department, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        name = excluded.name, popularity = excluded.popularity, profile_path = excluded.profile_path,
+        known_for_department = excluded.known_for_department, updated_at = excluded.updated_at
+'''
+
+_UPSERT_CREDIT = '''
+    INSERT OR REPLACE INTO credits (person_id, movie_id, kind, job, character, ord)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def upsert_movies(movies, conn=None, commit=True):
+    conn = conn or get_conn()
+    now = _now()
+    conn.executemany(_UPSERT_MOVIE, [_movie_row(m, now) for m in movies if m.get("id") is not None])
+    if commit:
+        conn.commit()
+
+def upsert_people(people, conn=None, commit=True):
+    conn = conn or get_conn()
+    now = _now()
+    conn.executemany(_UPSERT_PERSON, [_person_row(p, now) for p in people if p.get("id") is not None])
+    if commit:
+        conn.commit()
+
+def credit_rows(movie_id, credits):
+    # (person, credit row) pairs from a /movie/{id}/credits style payload
+    rows = []
+    for i, c in enumerate(credits.get("cast") or []):
+        rows.append((c, (c["id"], movie_id, "cast", "", c.get("character"), c.get("order", i))))
+    for i, c in enumerate(credits.get("crew") or []):
+        rows.append((c, (c["id"], movie_id, "crew", c.get("job") or "", None, i)))
+    return rows
+
+def upsert_movie_details(details, conn=None, commit=True):
+    # A /movie/{id}?append_to_response=credits payload: the movie, everyone in it and their credits.
+    conn = conn or get_conn()
+    upsert_movies([details], conn=conn, commit=False)
+    rows = credit_rows(details["id"], details.get("credits") or {})
+    if rows:
+        people = {p["id"]: p for p, _ in rows}
+        upsert_people(people.values(), conn=conn, commit=False)
+        conn.executemany(_UPSERT_CREDIT, [r for _, r in rows])
+    if commit:
+        conn.commit()
+
+def upsert_person_credits(person, credits, conn=None, commit=True):
+    # A /person/{id}/movie_credits payload for one person.
+    conn = conn or get_conn()
+    upsert_people([person], conn=conn, commit=False)
+    movies = (credits.get("cast") or []) + (credits.get("crew") or [])
+    upsert_movies({m["id"]: m for m in movies}.values(), conn=conn, commit=False)
+    rows = [(person["id"], m["id"], "cast", "", m.get("character"), m.get("order", i))
+            for i, m in enumerate(credits.get("cast") or [])]
+    rows += [(person["id"], m["id"], "crew", m.get("job") or "", None, i)
+             for i, m in enumerate(credits.get("crew") or [])]
+    conn.executemany(_UPSERT_CREDIT, rows)
+    if commit:
+        conn.commit()
+
+def delete_movies(movie_ids, conn=None, commit=True):
+    conn = conn or get_conn()
+    ids = [(i,) for i in movie_ids]
+    conn.executemany("DELETE FROM credits WHERE movie_id = ?", ids)
+    conn.executemany("DELETE FROM movies WHERE id = ?", ids)
+    if commit:
+        conn.commit()
+
+def existing_movie_ids(movie_ids, conn=None):
+    ids = list(movie_ids)
+    if not ids:
+        return set()
+    conn = conn or get_conn()
+    found = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        found.update(r[0] for r in conn.execute(f"SELECT id FROM movies WHERE id IN ({marks})", chunk))
+    return found
+
+# ---------------- Queries ----------------
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def fts_query(text):
+    # Every word must match, the last one as a prefix ("star wa" -> "star" AND "wa"*).
+    # Tokens are quoted so FTS5 operators typed by users are treated as text.
+    tokens = _TOKEN_RE.findall(text or "")
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def movie_record(row):
+    # A records.Movie, which reads like the TMDB dict at a fraction of its size
+    d = {k: row[k] for k in MOVIE_FIELDS}
+    d["genre_ids"] = [int(g) for g in d["genre_ids"].split(",") if g] if d["genre_ids"] else ()
+    d["adult"] = bool(d["adult"])
+    return Movie(**d)
+
+def person_dict(row):
+    return {k: row[k] for k in PERSON_FIELDS}
+
+_MOVIE_COLUMNS = ", ".join(f"m.{f}" for f in MOVIE_FIELDS)
+
+def search_movies(query, page=1, page_size=20, include_overview=False, conn=None):
+    # Same result shape as tmdb.search_movies. Ranked by BM25 (titles weigh most)
+    # nudged by popularity so the well-known film wins among equal text matches.
+    match = fts_query(query)
+    if match is None:
+        return []
+    if not include_overview:
+        match = "{title original_title} : (" + match + ")"
+    conn = conn or get_conn()
+    rows = conn.execute(
+        f'''
+        SELECT {_MOVIE_COLUMNS}
+        FROM movies_fts f JOIN movies m ON m.id = f.rowid
+        WHERE movies_fts MATCH ?
+        ORDER BY bm25(movies_fts, 10.0, 5.0, 1.0) * (1.0 + m.popularity / (m.popularity + 20.0))
+        LIMIT ? OFFSET ?
+        ''',
+        (match, page_size, (max(page, 1) - 1) * page_size),
+    ).fetchall()
+    return [movie_record(r) for r in rows]
+
+def search_person(query, limit=20, conn=None):
+    match = fts_query(query)
+    if match is None:
+        return []
+    conn = conn or get_conn()
+    rows = conn.execute(
+        '''
+        SELECT p.id, p.name, p.popularity, p.profile_path, p.known_for_department
+        FROM people_fts f JOIN people p ON p.id = f.rowid
+        WHERE people_fts MATCH ?
+        ORDER BY bm25(people_fts) * (1.0 + p.popularity / (p.popularity + 5.0))
+        LIMIT ?
+        ''',
+        (match, limit),
+    ).fetchall()
+    return [person_dict(r) for r in rows]
+
+def person_movie_credits(person_id, conn=None):
+    # Same shape as tmdb.person_movie_credits: acting credits first, unique by movie.
+    conn = conn or get_conn()
+    rows = conn.execute(
+        f'''
+        SELECT {_MOVIE_COLUMNS}, MIN(c.kind = 'crew') AS crew_only
+        FROM credits c JOIN movies m ON m.id = c.movie_id
+        WHERE c.person_id = ?
+        GROUP BY m.id
+        ORDER BY crew_only, m.popularity DESC
+        ''',
+        (person_id,),
+    ).fetchall()
+    return [movie_record(r) for r in rows]
+
+def get_movies(movie_ids, conn=None):
+    # Movies for the given ids, in the given order; unknown ids are skipped.
+    ids = list(movie_ids)
+    if not ids:
+        return []
+    conn = conn or get_conn()
+    found = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        for r in conn.execute(f"SELECT {_MOVIE_COLUMNS} FROM movies m WHERE m.id IN ({marks})", chunk):
+            found[r["id"]] = movie_record(r)
+    return [found[i] for i in ids if i in found]
+
+def movie_count(conn=None):
+    conn = conn or get_conn()
+    return conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+def has_movies(conn=None):
+    # Whether anything has been ingested; doesn't create catalog.db on a fresh checkout.
+    if conn is None:
+        if not os.path.exists(CATALOG_PATH):
+            return False
+        conn = get_conn()
+    return conn.execute("SELECT 1 FROM movies LIMIT 1").fetchone() is not None
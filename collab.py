@@ -0,0 +1,354 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import ann
+import db
+import vecstore
+
+ALS_STORE = "als"  # models/als/, see vecstore.py
+
+
+class Interactions:
+    """User x item strengths in CSR form, with the id <-> index maps."""
+
+    def __init__(self, user_ids, item_ids, values):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.user_ids, users = np.unique(user_ids, return_inverse=True)
+        self.item_ids, items = np.unique(item_ids, return_inverse=True)
+        values = np.asarray(values, dtype=np.float32)
+        self.user_csr = _csr(users, items, values, len(self.user_ids))
+        self.item_csr = _csr(items, users, values, len(self.item_ids))
+
+    @property
+    def shape(self):
+        return len(self.user_ids), len(self.item_ids)
+
+    @property
+    def nnz(self):
+        return len(self.user_csr[1])
+
+    @classmethod
+    def from_db(cls):
+        rows = list(db.iter_interactions())
+        if not rows:
+            return cls([], [], [])
+        users, items, values = zip(*rows)
+        return cls(users, items, values)
+
+
+def _csr(rows, cols, values, n_rows):
+    # (indptr, indices, data) with each row's entries contiguous
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), values[order]
+
+
+def _blocks(indptr, max_nnz):
+    # Split rows into contiguous ranges of roughly max_nnz entries each
+    bounds = [0]
+    n = len(indptr) - 1
+    while bounds[-1] < n:
+        lo = bounds[-1]
+        hi = int(np.searchsorted(indptr, indptr[lo] + max_nnz, side="right")) - 1
+        bounds.append(min(max(hi, lo + 1), n))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class ALSModel:
+    """Implicit-feedback ALS (Hu, Koren & Volinsky 2008) solved with batched conjugate gradient.
+
+    Every row of a half-sweep is solved at once: the per-row systems
+    (YtY + Yu^T (Cu - I) Yu + reg*I) x = Yu^T cu are never formed; CG only needs
+    their product with a vector, which is a gather, a row-wise dot and a
+    segment sum over the CSR entries. Row blocks run on a thread pool (NumPy
+    releases the GIL inside each op).
+    """
+
+    def __init__(self, factors=64, regularization=0.05, alpha=10.0, iterations=12, cg_steps=3,
+                 workers=None, block_nnz=250_000, seed=0):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.block_nnz = block_nnz
+        self.seed = seed
+        self.user_factors = None
+        self.item_factors = None
+        self.user_ids = None
+        self.item_ids = None
+        self.seen = None
+        self.index = None  # optional ann.IVFIndex over item_factors
+        self.index_path = None
+        self.train_seconds = 0.0
+        self._yty = None  # item Gram matrix for fold_in, computed on first use
+
+    def fit(self, interactions, progress=None):
+        started = time.time()
+        n_users, n_items = interactions.shape
+        rng = np.random.default_rng(self.seed)
+        scale = 0.01
+        X = (rng.standard_normal((n_users, self.factors)) * scale).astype(np.float32)
+        Y = (rng.standard_normal((n_items, self.factors)) * scale).astype(np.float32)
+        user_csr = interactions.user_csr
+        item_csr = interactions.item_csr
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="als") as pool:
+            for it in range(self.iterations):
+                self._sweep(pool, X, Y, user_csr)
+                self._sweep(pool, Y, X, item_csr)
+                if progress:
+                    progress(it + 1, time.time() - started)
+        self.user_factors, self.item_factors = X, Y
+        self.user_ids, self.item_ids = interactions.user_ids, interactions.item_ids
+        self.seen = user_csr[:2]
+        self._yty = None
+        self.train_seconds = time.time() - started
+        return self
+
+    def _sweep(self, pool, X, Y, csr):
+        indptr, indices, data = csr
+        YtY = Y.T @ Y
+        # Factor-major copy: gathers and segment sums then walk contiguous memory,
+        # which is ~3x faster than the row-major equivalent.
+        YT = np.ascontiguousarray(Y.T)
+        futures = [
+            pool.submit(self._solve_block, X, YT, YtY, indptr, indices, data, lo, hi)
+            for lo, hi in _blocks(indptr, self.block_nnz)
+        ]
+        for f in futures:
+            f.result()
+
+    def _solve_block(self, X, YT, YtY, indptr, indices, data, lo, hi):
+        # Everything below is (factors, rows) / (factors, entries) shaped.
+        start, end = indptr[lo], indptr[hi]
+        counts = np.diff(indptr[lo:hi + 1])
+        nonempty = counts > 0
+        seg = (indptr[lo:hi] - start)[nonempty]
+        owner = np.repeat(np.arange(hi - lo), counts)
+        # np.take keeps the result C-contiguous (fancy indexing on axis 1 does not,
+        # and reduceat over a strided array is several times slower)
+        YiT = np.take(YT, indices[start:end], axis=1)
+        conf = 1.0 + self.alpha * data[start:end]
+        reg = np.float32(self.regularization)
+
+        def segment_sum(cols):
+            out = np.zeros((self.factors, hi - lo), dtype=np.float32)
+            if cols.shape[1]:
+                out[:, nonempty] = np.add.reduceat(cols, seg, axis=1)
+            return out
+
+        def matvec(v):
+            dots = np.einsum("ij,ij->j", YiT, np.take(v, owner, axis=1))
+            return YtY @ v + reg * v + segment_sum(YiT * ((conf - 1.0) * dots))
+
+        def coldot(a, b):
+            return np.einsum("ij,ij->j", a, b)
+
+        x = np.ascontiguousarray(X[lo:hi].T)
+        r = segment_sum(YiT * conf) - matvec(x)
+        p = r.copy()
+        rs_old = coldot(r, r)
+        for _ in range(self.cg_steps):
+            Ap = matvec(p)
+            denom = coldot(p, Ap)
+            step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 1e-12)
+            x += step * p
+            r -= step * Ap
+            rs_new = coldot(r, r)
+            if rs_new.max() < 1e-10:
+                break
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 1e-12)
+            p = r + beta * p
+            rs_old = rs_new
+        X[lo:hi] = x.T
+
+    def _user_row(self, user_id):
+        pos = np.searchsorted(self.user_ids, user_id)
+        if pos < len(self.user_ids) and self.user_ids[pos] == user_id:
+            return int(pos)
+        return None
+
+    def recommend(self, user_id, n=10, exclude=()):
+        # [(movie_id, score), ...], skipping everything the user interacted with
+        # in training plus any extra ids in `exclude`.
+        row = self._user_row(user_id)
+        if row is None:
+            return []
+        indptr, indices = self.seen
+        skip = set(self.item_ids[indices[indptr[row]:indptr[row + 1]]].tolist())
+        skip.update(exclude)
+        return self.recommend_vector(self.user_factors[row], n, skip)
+
+    def fold_in(self, item_ids, strengths):
+        # A user vector for interactions the model was not trained on: the exact
+        # least-squares solve one ALS sweep would do for that user, against the
+        # fixed item factors. Items unknown to the model are ignored; None when
+        # none are known.
+        ids = np.asarray(item_ids, dtype=np.int64)
+        if not len(ids) or self.item_ids is None or not len(self.item_ids):
+            return None
+        pos = np.minimum(np.searchsorted(self.item_ids, ids), len(self.item_ids) - 1)
+        known = self.item_ids[pos] == ids
+        if not known.any():
+            return None
+        Yu = np.asarray(self.item_factors[pos[known]], dtype=np.float64)
+        conf = 1.0 + self.alpha * np.asarray(strengths, dtype=np.float64)[known]
+        if self._yty is None:
+            Y = np.asarray(self.item_factors, dtype=np.float64)
+            self._yty = Y.T @ Y
+        A = self._yty + (Yu.T * (conf - 1.0)) @ Yu + self.regularization * np.eye(self.factors)
+        return np.linalg.solve(A, Yu.T @ conf).astype(np.float32)
+
+    def recommend_vector(self, vector, n=10, exclude=()):
+        # Top-n items for a user vector, e.g. from fold_in, skipping ids in `exclude`.
+        if self.index is not None:
+            return self._recommend_index(vector, n, exclude)
+        scores = self.item_factors @ vector
+        if exclude:
+            ex = np.asarray(list(exclude), dtype=np.int64)
+            pos = np.minimum(np.searchsorted(self.item_ids, ex), len(self.item_ids) - 1)
+            scores[pos[self.item_ids[pos] == ex]] = -np.inf
+        n = min(n, len(scores))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.item_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def _recommend_index(self, vector, n, exclude):
+        skip = set(exclude)
+        ids, scores = self.index.search(vector, k=n + len(skip), nprobe=ann.ANN_NPROBE,
+                                        vectors=(self.item_ids, self.item_factors))
+        hits = [(int(mid), float(sc)) for mid, sc in zip(ids[0], scores[0]) if mid >= 0 and int(mid) not in skip]
+        return hits[:n]
+
+    def save(self, root=None, index=None):
+        # `index`: an ann.IVFIndex over item_factors to publish alongside them
+        return vecstore.publish(
+            ALS_STORE,
+            {"users": (self.user_ids, self.user_factors), "items": (self.item_ids, self.item_factors)},
+            arrays={"seen_indptr": self.seen[0], "seen_indices": self.seen[1]},
+            meta={"factors": self.factors, "regularization": self.regularization, "alpha": self.alpha,
+                  "iterations": self.iterations, "train_seconds": self.train_seconds},
+            root=root,
+            files={"ivf.npz": index.save} if index is not None else None,
+        )
+
+    @classmethod
+    def load(cls, version):
+        # Factors and the seen-items CSR stay memory-mapped; nothing is read up front.
+        meta = version.meta
+        model = cls(factors=meta["factors"], regularization=meta["regularization"], alpha=meta["alpha"],
+                    iterations=meta["iterations"])
+        model.user_ids, model.user_factors = version.matrix("users")
+        model.item_ids, model.item_factors = version.matrix("items")
+        model.seen = (version.array("seen_indptr"), version.array("seen_indices"))
+        model.train_seconds = meta.get("train_seconds", 0.0)
+        model.index_path = version.file("ivf.npz")
+        model.index = ann.load_index(model.index_path, len(model.item_ids))
+        return model
+
+
+def synthetic_interactions(n_users=162_000, n_items=59_000, n_ratings=25_000_000, n_clusters=40, seed=0):
+    # MovieLens-shaped data with learnable structure: long-tailed user activity
+    # and item popularity, and users who mostly rate inside a taste cluster.
+    # Returns (user_ids, item_ids, ratings, timestamps) with unique user/item pairs.
+    rng = np.random.default_rng(seed)
+    activity = rng.lognormal(0.0, 1.0, n_users)
+    activity /= activity.sum()
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 0.9
+    rng.shuffle(popularity)
+    user_cluster = rng.integers(0, n_clusters, n_users)
+    item_cluster = rng.integers(0, n_clusters, n_items)
+
+    item_p = popularity / popularity.sum()
+    members = [np.flatnonzero(item_cluster == c) for c in range(n_clusters)]
+    member_p = [popularity[m] / popularity[m].sum() if len(m) else None for m in members]
+
+    def draw(k):
+        users = rng.choice(n_users, size=k, p=activity).astype(np.int64)
+        in_cluster = rng.random(k) < 0.75
+        items = np.empty(k, dtype=np.int64)
+        items[~in_cluster] = rng.choice(n_items, size=int((~in_cluster).sum()), p=item_p)
+        for c in range(n_clusters):
+            pick = in_cluster & (user_cluster[users] == c)
+            if member_p[c] is None:
+                items[pick] = rng.choice(n_items, size=int(pick.sum()), p=item_p)
+            else:
+                items[pick] = members[c][rng.choice(len(members[c]), size=int(pick.sum()), p=member_p[c])]
+        return users * n_items + items
+
+    # Repeat pairs are dropped, so keep drawing until there are enough distinct ones.
+    keys = np.empty(0, dtype=np.int64)
+    for _ in range(8):
+        missing = n_ratings - len(keys)
+        if missing <= 0:
+            break
+        keys = np.concatenate([keys, draw(int(missing * 1.3) + 1)])
+        _, first = np.unique(keys, return_index=True)
+        keys = keys[np.sort(first)]
+    keys = keys[:n_ratings]
+    users, items = keys // n_items, keys % n_items
+    liked = item_cluster[items] == user_cluster[users]
+    ratings = np.clip(np.round((rng.normal(3.2, 1.0, len(users)) + liked * 0.8) * 2) / 2, 0.5, 5.0)
+    timestamps = np.sort(rng.integers(1_000_000_000, 1_700_000_000, len(users)))
+    return users + 1, items + 1, ratings.astype(np.float32), timestamps
+
+
+_store = vecstore.Reloader(ALS_STORE, ALSModel.load)
+
+def get_model():
+    # Memory-mapped from the current published version; None until `python collab.py train` has been run.
+    return _store.get()
+
+def recommend_for_user(user_id, n=10):
+    # Folds the user's current interactions in rather than reading their trained
+    # row, so ratings made since the last training run count straight away.
+    model = get_model()
+    if model is None:
+        return []
+    interactions = db.user_interactions(user_id)
+    vector = model.fold_in(*zip(*interactions)) if interactions else None
+    if vector is None:
+        return model.recommend(user_id, n=n, exclude=db.seen_movie_ids(user_id))
+    seen = db.seen_movie_ids(user_id)
+    seen.update(mid for mid, _ in interactions)
+    return model.recommend_vector(vector, n, seen)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the collaborative filtering model.")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--synthetic", metavar="USERSxITEMSxRATINGS",
+                        help="train on generated data instead of app.db, e.g. 162000x59000x25000000")
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        n_users, n_items, n_ratings = (int(x) for x in args.synthetic.lower().split("x"))
+        t = time.time()
+        users, items, ratings, _ = synthetic_interactions(n_users, n_items, n_ratings)
+        data = Interactions(users, items, ratings)
+        print(f"Generated {data.nnz} ratings in {time.time() - t:.1f}s")
+    else:
+        db.init_db()
+        data = Interactions.from_db()
+    if not data.nnz:
+        raise SystemExit("No interactions to train on.")
+
+    model = ALSModel(factors=args.factors, iterations=args.iterations, workers=args.workers)
+    model.fit(data, progress=lambda it, secs: print(f"iteration {it}: {secs:.1f}s", flush=True))
+    print(f"Trained on {data.shape[0]} users x {data.shape[1]} items ({data.nnz} entries) "
+          f"in {model.train_seconds:.1f}s")
+    if not args.synthetic:
+        print(f"Published {model.save().path}")
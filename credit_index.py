@@ -0,0 +1,249 @@
+"""Inverted credit index over the local catalog.
+
+    person id -> sorted array of movie rows (CSR: indptr + postings)
+    genre id  -> bitmap over movie rows
+    movie row -> id, release year, popularity
+
+Movie rows are positions in the sorted movie id array, so every posting list is
+sorted and "movies with both X and Y" is an intersection of two sorted arrays,
+"X in Horror after 2010" a bitmap probe and a year compare on X's rows. Nothing
+touches SQLite or TMDB at query time.
+
+It holds the same credits catalog.person_movie_credits returns (cast and crew,
+one entry per movie) and is published through vecstore like the models, so
+every process maps one copy:
+
+    python credit_index.py build
+"""
+from array import array
+
+import numpy as np
+
+import catalog
+import vecstore
+
+CREDIT_STORE = "credits"  # models/credits/, see vecstore.py
+GALLOP_RATIO = 16  # past this length ratio, binary-search the short list into the long one
+
+
+def _year(release_date):
+    try:
+        return int(release_date[:4])
+    except (TypeError, ValueError):
+        return 0
+
+
+def _intersect(a, b):
+    # Both sorted and unique
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    if len(b) > GALLOP_RATIO * len(a):
+        pos = np.searchsorted(b, a)
+        hit = pos < len(b)
+        hit[hit] = b[pos[hit]] == a[hit]
+        return a[hit]
+    return np.intersect1d(a, b, assume_unique=True)
+
+
+class CreditIndex:
+    def __init__(self, movie_ids, years, popularity, person_ids, indptr, postings, genre_ids, genre_bits):
+        self.movie_ids = movie_ids
+        self.years = years
+        self.popularity = popularity
+        self.person_ids = person_ids
+        self.indptr = indptr
+        self.postings = postings
+        self.genre_ids = genre_ids
+        self.genre_bits = genre_bits  # (genres, ceil(movies / 8)) uint8, little bit order
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    @classmethod
+    def build(cls, movie_ids, years, popularity, genre_movies, genre_ids, credit_people, credit_movies):
+        # Parallel arrays: one entry per movie, per (movie, genre) and per
+        # credit. Credits for movies not listed are dropped, as the catalog's
+        # join does, and repeats (cast and crew on one film) collapse.
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        order = np.argsort(movie_ids, kind="stable")
+        movie_ids = movie_ids[order]
+        years = np.asarray(years, dtype=np.int16)[order]
+        popularity = np.asarray(popularity, dtype=np.float32)[order]
+        n = len(movie_ids)
+
+        def rows_of(ids):
+            ids = np.asarray(ids, dtype=np.int64)
+            rows = np.searchsorted(movie_ids, ids)
+            known = rows < n
+            known[known] = movie_ids[rows[known]] == ids[known]
+            return rows, known
+
+        rows, known = rows_of(credit_movies)
+        people = np.asarray(credit_people, dtype=np.int64)[known]
+        rows = rows[known].astype(np.int32)
+        order = np.lexsort((rows, people))
+        people, rows = people[order], rows[order]
+        if len(rows):
+            keep = np.ones(len(rows), dtype=bool)
+            keep[1:] = (people[1:] != people[:-1]) | (rows[1:] != rows[:-1])
+            people, rows = people[keep], rows[keep]
+        person_ids, starts = np.unique(people, return_index=True)
+        indptr = np.append(starts, len(rows)).astype(np.int64)
+
+        grows, known = rows_of(genre_movies)
+        gids = np.asarray(genre_ids, dtype=np.int64)[known]
+        grows = grows[known]
+        genre_list, gcols = np.unique(gids, return_inverse=True)
+        dense = np.zeros((len(genre_list), n), dtype=bool)
+        dense[gcols, grows] = True
+        genre_bits = np.packbits(dense, axis=1, bitorder="little")
+        return cls(movie_ids, years, popularity, person_ids, indptr, rows, genre_list, genre_bits)
+
+    @classmethod
+    def from_person_credits(cls, credits):
+        # {person_id: person_movie_credits(person_id)}, e.g. from tmdb_async.person_credits_many
+        movies = {}
+        credit_people, credit_movies = array("q"), array("q")
+        for pid, entries in credits.items():
+            for m in entries:
+                movies[m["id"]] = m
+                credit_people.append(pid)
+                credit_movies.append(m["id"])
+        genre_movies, genre_ids = array("q"), array("q")
+        for mid, m in movies.items():
+            for g in m.get("genre_ids") or [g.get("id") for g in m.get("genres") or []]:
+                genre_movies.append(mid)
+                genre_ids.append(g)
+        return cls.build(
+            list(movies), [_year(m.get("release_date")) for m in movies.values()],
+            [m.get("popularity") or 0.0 for m in movies.values()],
+            genre_movies, genre_ids, credit_people, credit_movies,
+        )
+
+    # ---- queries ----
+    def person_rows(self, person_id):
+        i = np.searchsorted(self.person_ids, person_id)
+        if i == len(self.person_ids) or self.person_ids[i] != person_id:
+            return self.postings[:0]
+        return self.postings[self.indptr[i]:self.indptr[i + 1]]
+
+    def genre_mask(self, genre_id):
+        i = np.searchsorted(self.genre_ids, genre_id)
+        if i == len(self.genre_ids) or self.genre_ids[i] != genre_id:
+            return None
+        return self.genre_bits[i]
+
+    def rows(self, people=(), genres=(), year_min=None, year_max=None):
+        # Sorted movie rows credited to every person and tagged with every genre.
+        masks = [self.genre_mask(g) for g in genres]
+        if any(m is None for m in masks):
+            return self.postings[:0]
+        if people:
+            lists = sorted((self.person_rows(p) for p in people), key=len)
+            rows = lists[0]
+            for other in lists[1:]:
+                if not len(rows):
+                    break
+                rows = _intersect(rows, other)
+            for bits in masks:
+                rows = rows[(bits[rows >> 3] >> (rows & 7).astype(np.uint8)) & 1 == 1]
+        elif masks:
+            bits = masks[0]
+            for other in masks[1:]:
+                bits = bits & other
+            rows = np.flatnonzero(np.unpackbits(bits, count=len(self), bitorder="little")).astype(np.int32)
+        else:
+            rows = np.arange(len(self), dtype=np.int32)
+        if year_min is not None or year_max is not None:
+            years = self.years[rows]
+            keep = years > 0
+            if year_min is not None:
+                keep &= years >= year_min
+            if year_max is not None:
+                keep &= years <= year_max
+            rows = rows[keep]
+        return rows
+
+    def query(self, people=(), genres=(), year_min=None, year_max=None, limit=None):
+        # Matching movie ids, most popular first.
+        rows = self.rows(people, genres, year_min, year_max)
+        if limit is not None and len(rows) > limit:
+            rows = rows[np.argpartition(-self.popularity[rows], limit)[:limit]]
+        rows = rows[np.argsort(-self.popularity[rows], kind="stable")]
+        return self.movie_ids[rows[:limit]].tolist()
+
+    def genre_counts(self, people=(), year_min=None, year_max=None):
+        # {genre_id: matching movies}; what a genre filter would leave for these people.
+        rows = self.rows(people, (), year_min, year_max)
+        hits = (self.genre_bits[:, rows >> 3] >> (rows & 7).astype(np.uint8)) & 1
+        return {int(g): int(c) for g, c in zip(self.genre_ids, hits.sum(axis=1)) if c}
+
+    def year_range(self, people=()):
+        years = self.years[self.rows(people)]
+        years = years[years > 0]
+        return (int(years.min()), int(years.max())) if len(years) else None
+
+    # ---- storage ----
+    def save(self, root=None):
+        return vecstore.publish(
+            CREDIT_STORE, {},
+            arrays={
+                "movie_ids": self.movie_ids, "years": self.years, "popularity": self.popularity,
+                "person_ids": self.person_ids, "indptr": self.indptr, "postings": self.postings,
+                "genre_ids": self.genre_ids, "genre_bits": self.genre_bits,
+            },
+            meta={"movies": len(self), "people": len(self.person_ids), "credits": len(self.postings)},
+            root=root,
+        )
+
+    @classmethod
+    def load(cls, version):
+        return cls(*(version.array(name) for name in (
+            "movie_ids", "years", "popularity", "person_ids", "indptr", "postings", "genre_ids", "genre_bits",
+        )))
+
+
+def build_from_catalog(conn=None):
+    conn = conn or catalog.get_conn()
+    movie_ids, years, popularity = array("q"), array("h"), array("f")
+    genre_movies, genre_ids = array("q"), array("q")
+    for movie_id, release_date, pop, gids in conn.execute("SELECT id, release_date, popularity, genre_ids FROM movies"):
+        movie_ids.append(movie_id)
+        years.append(_year(release_date))
+        popularity.append(pop or 0.0)
+        for g in gids.split(",") if gids else ():
+            genre_movies.append(movie_id)
+            genre_ids.append(int(g))
+    credit_people, credit_movies = array("q"), array("q")
+    for person_id, movie_id in conn.execute("SELECT person_id, movie_id FROM credits"):
+        credit_people.append(person_id)
+        credit_movies.append(movie_id)
+    return CreditIndex.build(
+        np.frombuffer(movie_ids, dtype=np.int64), np.frombuffer(years, dtype=np.int16),
+        np.frombuffer(popularity, dtype=np.float32),
+        np.frombuffer(genre_movies, dtype=np.int64), np.frombuffer(genre_ids, dtype=np.int64),
+        np.frombuffer(credit_people, dtype=np.int64), np.frombuffer(credit_movies, dtype=np.int64),
+    )
+
+
+_store = vecstore.Reloader(CREDIT_STORE, CreditIndex.load)
+
+def get_index():
+    # None until `python credit_index.py build` has been run
+    return _store.get()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("usage: python credit_index.py build")
+    started = time.time()
+    index = build_from_catalog()
+    version = index.save()
+    print(f"Indexed {len(index.postings)} credits for {len(index.person_ids)} people over {len(index)} movies "
+          f"in {time.time() - started:.1f}s")
+    print(f"Published {version.path}")
@@ -1,18 +1,21 @@
 import sqlite3
 import os
+import threading
 from datetime import datetime
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "app.db")
+import metrics
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+DB_PATH = os.getenv("APP_DB_PATH", os.path.join(os.path.dirname(__file__), "app.db"))
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+_timed = metrics.timed(metrics.DB_QUERY_SECONDS)  # per-accessor query timings
+
+# Applied in order, once per database; the highest applied version is recorded in
+# schema_migrations. Never edit a shipped migration, append a new one.
+MIGRATIONS = [
+    (1, [
         '''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,25 +25,241 @@ def init_db():
             password_hash TEXT NOT NULL,
             created_at TEXT NOT NULL
         )
+        ''',
+    ]),
+    (2, [
         '''
-    )
-    conn.commit()
-    conn.close()
+        CREATE TABLE IF NOT EXISTS ratings (
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            rating REAL NOT NULL,
+            rated_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, movie_id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_ratings_movie ON ratings (movie_id)",
+        '''
+        CREATE TABLE IF NOT EXISTS watch_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            watched_at TEXT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_watch_user ON watch_history (user_id, watched_at)",
+        "CREATE INDEX IF NOT EXISTS idx_watch_movie ON watch_history (movie_id)",
+        '''
+        CREATE TABLE IF NOT EXISTS watchlist (
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            added_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, movie_id)
+        )
+        ''',
+    ]),
+    (3, [
+        # Materialized home feeds, see feed.py; user_id 0 is the shared guest feed.
+        '''
+        CREATE TABLE IF NOT EXISTS feeds (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            model_version TEXT NOT NULL DEFAULT '',
+            items TEXT NOT NULL,
+            computed_at REAL NOT NULL,
+            stale INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ]),
+]
 
+def get_conn(path=None, migrate=None):
+    # One connection per thread, reused across calls, so its prepared-statement
+    # cache stays warm. The app schema is brought up to date once per process;
+    # by default only on the app database, other paths need migrate=True.
+    path = path or DB_PATH
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=10, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-16000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conns[path] = conn
+    if path not in _initialized:
+        if migrate is None:
+            migrate = os.path.abspath(path) == os.path.abspath(DB_PATH)
+        if migrate:
+            run_migrations(conn, path)
+    return conn
+
+def schema_version(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, applied_at TEXT NOT NULL)")
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+def run_migrations(conn, path):
+    with _init_lock:
+        if path in _initialized:
+            return
+        # IMMEDIATE takes the write lock up front, so two processes starting
+        # together can't both apply the same migration.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = schema_version(conn)
+            for version, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for stmt in statements:
+                    conn.execute(stmt)
+                conn.execute("INSERT INTO schema_migrations (version, applied_at) VALUES (?, ?)",
+                             (version, datetime.utcnow().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        _initialized.add(path)
+
+def init_db():
+    # Kept for callers that want the schema in place up front; get_conn() does this on first use.
+    get_conn()
+
+@_timed
 def create_user(email: str, name: str, salt: str, password_hash: str):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users (email, name, salt, password_hash, created_at) VALUES (?, ?, ?, ?, ?)",
-        (email.lower().strip(), name.strip(), salt, password_hash, datetime.utcnow().isoformat())
-    )
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute(
+            "INSERT INTO users (email, name, salt, password_hash, created_at) VALUES (?, ?, ?, ?, ?)",
+            (email.lower().strip(), name.strip(), salt, password_hash, datetime.utcnow().isoformat())
+        )
 
+@_timed
 def get_user_by_email(email: str):
+    return get_conn().execute("SELECT * FROM users WHERE email = ?", (email.lower().strip(),)).fetchone()
+
+@_timed
+def rate_movie(user_id: int, movie_id: int, rating: float):
+    conn = get_conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ratings (user_id, movie_id, rating, rated_at) VALUES (?, ?, ?, ?)",
+            (user_id, movie_id, float(rating), datetime.utcnow().isoformat())
+        )
+
+@_timed
+def get_rating(user_id: int, movie_id: int):
+    conn = get_conn()
+    row = conn.execute("SELECT rating FROM ratings WHERE user_id = ? AND movie_id = ?", (user_id, movie_id)).fetchone()
+    return row["rating"] if row else None
+
+@_timed
+def get_user_ratings(user_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE email = ?", (email.lower().strip(),))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    return conn.execute("SELECT movie_id, rating, rated_at FROM ratings WHERE user_id = ? ORDER BY rated_at DESC", (user_id,)).fetchall()
+
+@_timed
+def record_watch(user_id: int, movie_id: int):
+    conn = get_conn()
+    with conn:
+        conn.execute(
+            "INSERT INTO watch_history (user_id, movie_id, watched_at) VALUES (?, ?, ?)",
+            (user_id, movie_id, datetime.utcnow().isoformat())
+        )
+
+@_timed
+def add_to_watchlist(user_id: int, movie_id: int):
+    conn = get_conn()
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO watchlist (user_id, movie_id, added_at) VALUES (?, ?, ?)",
+            (user_id, movie_id, datetime.utcnow().isoformat())
+        )
+
+@_timed
+def remove_from_watchlist(user_id: int, movie_id: int):
+    conn = get_conn()
+    with conn:
+        conn.execute("DELETE FROM watchlist WHERE user_id = ? AND movie_id = ?", (user_id, movie_id))
+
+@_timed
+def get_watchlist(user_id: int):
+    conn = get_conn()
+    rows = conn.execute("SELECT movie_id, added_at FROM watchlist WHERE user_id = ? ORDER BY added_at DESC", (user_id,)).fetchall()
+    return [r["movie_id"] for r in rows]
+
+@_timed
+def seen_movie_ids(user_id: int):
+    # Everything a user has rated or watched; recommendations skip these.
+    conn = get_conn()
+    rows = conn.execute(
+        "SELECT movie_id FROM ratings WHERE user_id = ? UNION SELECT movie_id FROM watch_history WHERE user_id = ?",
+        (user_id, user_id)
+    ).fetchall()
+    return {r["movie_id"] for r in rows}
+
+@_timed
+def iter_interactions():
+    # (user_id, movie_id, strength) per user/movie pair: a rating counts its stars,
+    # each watch counts 1 and a watchlist entry 0.5. Ratings under 2.5 stars are
+    # dislikes, not interest, so they stay out (they still count as seen).
+    # Rows stream off the cursor; the timing covers the query, which has grouped
+    # everything by the time the first row comes back.
+    conn = get_conn()
+    cur = conn.execute(
+        '''
+        SELECT user_id, movie_id, SUM(strength) FROM (
+            SELECT user_id, movie_id, rating AS strength FROM ratings WHERE rating >= 2.5
+            UNION ALL SELECT user_id, movie_id, 1.0 FROM watch_history
+            UNION ALL SELECT user_id, movie_id, 0.5 FROM watchlist
+        ) GROUP BY user_id, movie_id
+        '''
+    )
+    return ((row[0], row[1], row[2]) for row in cur)
+
+@_timed
+def user_interactions(user_id: int):
+    # [(movie_id, strength)] for one user, weighted as in iter_interactions
+    conn = get_conn()
+    rows = conn.execute(
+        '''
+        SELECT movie_id, SUM(strength) FROM (
+            SELECT movie_id, rating AS strength FROM ratings WHERE user_id = ? AND rating >= 2.5
+            UNION ALL SELECT movie_id, 1.0 FROM watch_history WHERE user_id = ?
+            UNION ALL SELECT movie_id, 0.5 FROM watchlist WHERE user_id = ?
+        ) GROUP BY movie_id
+        ''',
+        (user_id, user_id, user_id)
+    ).fetchall()
+    return [(r[0], r[1]) for r in rows]
+
+@_timed
+def get_feed(user_id: int):
+    return get_conn().execute("SELECT * FROM feeds WHERE user_id = ?", (user_id,)).fetchone()
+
+@_timed
+def save_feed(user_id: int, source: str, model_version: str, items: str, computed_at: float):
+    conn = get_conn()
+    with conn:
+        conn.execute(
+            '''
+            INSERT INTO feeds (user_id, version, source, model_version, items, computed_at, stale)
+            VALUES (?, 1, ?, ?, ?, ?, 0)
+            ON CONFLICT (user_id) DO UPDATE SET
+                version = feeds.version + 1, source = excluded.source, model_version = excluded.model_version,
+                items = excluded.items, computed_at = excluded.computed_at, stale = 0
+            ''',
+            (user_id, source, model_version, items, computed_at)
+        )
+
+@_timed
+def update_feed_items(user_id: int, version: int, items: str):
+    # Rewrites one version's items and marks the feed stale; False if it has moved on meanwhile.
+    conn = get_conn()
+    with conn:
+        cur = conn.execute(
+            "UPDATE feeds SET items = ?, version = version + 1, stale = 1 WHERE user_id = ? AND version = ?",
+            (items, user_id, version)
+        )
+    return cur.rowcount > 0
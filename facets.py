@@ -0,0 +1,268 @@
+"""Columnar facet engine: filter, count and sort the whole catalog in memory.
+
+One NumPy array per field (release date, rating, votes, popularity, runtime,
+language code) plus a packed bitmap per genre.
+A query is a handful of vectorized compares ANDed into one mask; facet counts
+come from the same masks, each counted without its own filter so the UI can
+show what choosing another value would give.
+
+    index = get_facets()
+    total, ids = index.search(genres=[27], year=(2010, None), votes=(500, None), sort="rating")
+
+Published through vecstore as models/facets/:
+
+    python facets.py build
+"""
+from array import array
+
+import numpy as np
+
+import catalog
+import vecstore
+
+FACET_STORE = "facets"  # models/facets/, see vecstore.py
+
+# sort name -> (column, descending)
+SORTS = {
+    "popularity": ("popularity", True),
+    "rating": ("vote_average", True),
+    "votes": ("vote_count", True),
+    "newest": ("released", True),
+    "oldest": ("released", False),
+}
+COLUMNS = ("ids", "released", "vote_average", "vote_count", "popularity", "runtime", "language", "decade",
+           "rating_bucket")
+SCAN_CHUNK = 1 << 16
+
+
+def _released(release_date):
+    # "2014-11-05" -> 20141105; 0 when unknown
+    try:
+        return int(release_date[:4]) * 10000 + int(release_date[5:7]) * 100 + int(release_date[8:10])
+    except (TypeError, ValueError):
+        return 0
+
+
+def _sort_keys(column, values, descending):
+    # Ascending keys for sorting `values` (a slice of the named column); undated
+    # movies go last either way
+    if column == "released":
+        values = np.where(values > 0, values, np.iinfo(np.int32).min if descending else np.iinfo(np.int32).max)
+    return -values.astype(np.float64) if descending else values
+
+
+def _between(column, bounds, scale=1, pad=0):
+    lo, hi = bounds
+    mask = np.ones(len(column), dtype=bool)
+    if lo is not None:
+        mask &= column >= lo * scale
+    if hi is not None:
+        mask &= column <= hi * scale + pad
+    return mask
+
+
+class FacetIndex:
+    def __init__(self, columns, languages, genre_ids, genre_bits, orders):
+        self.columns = columns        # name -> 1-d array, one entry per movie
+        self.languages = languages    # language code -> ISO 639-1 string
+        self.genre_ids = genre_ids    # genre row -> TMDB genre id
+        self.genre_bits = genre_bits  # (genres, ceil(movies / 8)) uint8, little bit order
+        self.orders = orders          # sort name -> every row, presorted
+        self._genre_row = {int(g): i for i, g in enumerate(genre_ids)}
+        self._language_code = {str(lang): i for i, lang in enumerate(languages)}
+
+    def __len__(self):
+        return len(self.columns["ids"])
+
+    @classmethod
+    def build(cls, ids, released, vote_average, vote_count, popularity, runtime, languages, genre_lists):
+        # One entry per movie in each argument; languages are strings, genre_lists lists of ids.
+        lang_names, lang_codes = np.unique(np.asarray([lang or "" for lang in languages], dtype="U8"),
+                                           return_inverse=True)
+        genre_rows, genre_of = array("i"), array("q")
+        for row, gids in enumerate(genre_lists):
+            for g in gids:
+                genre_rows.append(row)
+                genre_of.append(g)
+        genre_ids, cols = np.unique(np.frombuffer(genre_of, dtype=np.int64) if genre_of else [], return_inverse=True)
+        dense = np.zeros((len(genre_ids), len(genre_lists)), dtype=bool)
+        dense[cols, np.frombuffer(genre_rows, dtype=np.int32) if genre_rows else []] = True
+
+        released = np.asarray(released, dtype=np.int32)
+        vote_average = np.asarray(vote_average, dtype=np.float32)
+        columns = {
+            "ids": np.asarray(ids, dtype=np.int64),
+            "released": released,
+            "vote_average": vote_average,
+            "vote_count": np.asarray(vote_count, dtype=np.int32),
+            "popularity": np.asarray(popularity, dtype=np.float32),
+            "runtime": np.asarray(runtime, dtype=np.int16),
+            "language": lang_codes.astype(np.int16),
+            # Small-integer copies for the counts
+            "decade": (released // 100000).astype(np.int16),  # 20141105 -> 201, 0 when undated
+            "rating_bucket": np.clip(vote_average, 0, 9).astype(np.uint8),
+        }
+        orders = {name: np.argsort(_sort_keys(column, columns[column], descending), kind="stable").astype(np.int32)
+                  for name, (column, descending) in SORTS.items()}
+        return cls(columns, lang_names, genre_ids.astype(np.int64), np.packbits(dense, axis=1, bitorder="little"),
+                   orders)
+
+    # ---- queries ----
+    def _masks(self, genres=(), year=(None, None), rating=(None, None), votes=(None, None),
+               runtime=(None, None), languages=()):
+        # One boolean mask per active filter, keyed by facet name.
+        c = self.columns
+        n = len(self)
+        masks = {}
+        if genres:
+            bits = None
+            for g in genres:
+                i = self._genre_row.get(g)
+                if i is None:
+                    return {"genres": np.zeros(n, dtype=bool)}
+                bits = self.genre_bits[i] if bits is None else bits & self.genre_bits[i]
+            masks["genres"] = np.unpackbits(bits, count=n, bitorder="little").view(bool)
+        if year != (None, None):
+            masks["year"] = _between(c["released"], year, scale=10000, pad=9999) & (c["released"] > 0)
+        if rating != (None, None):
+            masks["rating"] = _between(c["vote_average"], rating)
+        if votes != (None, None):
+            masks["votes"] = _between(c["vote_count"], votes)
+        if runtime != (None, None):
+            masks["runtime"] = _between(c["runtime"], runtime) & (c["runtime"] > 0)
+        if languages:
+            mask = np.zeros(n, dtype=bool)
+            for lang in languages:
+                if lang in self._language_code:
+                    mask |= c["language"] == self._language_code[lang]
+            masks["languages"] = mask
+        return masks
+
+    @staticmethod
+    def _combine(masks, skip=None):
+        # AND of the masks; None when nothing filters
+        mask = None
+        for name, m in masks.items():
+            if name != skip:
+                mask = m.copy() if mask is None else np.logical_and(mask, m, out=mask)
+        return mask
+
+    def search(self, sort="popularity", offset=0, limit=20, **filters):
+        # (total matches, movie ids for [offset, offset + limit) in sort order).
+        # Broad filters walk the presorted order a chunk at a time and stop once
+        # the page is full; narrow ones sort just their matches.
+        n = len(self)
+        mask = self._combine(self._masks(**filters))
+        order = self.orders[sort]
+        end = offset + limit
+        if mask is None:
+            return n, self.columns["ids"][order[offset:end]].tolist()
+        total = int(np.count_nonzero(mask))
+        if total and end * n / total < n // 4:
+            found, have = [], 0
+            for start in range(0, n, SCAN_CHUNK):
+                chunk = order[start:start + SCAN_CHUNK]
+                found.append(chunk[mask[chunk]])
+                have += len(found[-1])
+                if have >= end:
+                    break
+            rows = np.concatenate(found)[offset:end]
+        else:
+            rows = np.flatnonzero(mask)
+            column, descending = SORTS[sort]
+            keys = _sort_keys(column, self.columns[column][rows], descending)
+            if end < len(rows):
+                # Everything up to the end-th key, ties included and in row order, so
+                # the stable sort below matches the presorted order page after page
+                top = keys <= np.partition(keys, end - 1)[end - 1]
+                rows, keys = rows[top], keys[top]
+            rows = rows[np.argsort(keys, kind="stable")][offset:end]
+        return total, self.columns["ids"][rows].tolist()
+
+    def counts(self, **filters):
+        # Facet counts for the current filters. Genres narrow (a movie must have
+        # every chosen genre) so they count under all filters; the other facets
+        # count under every filter but their own.
+        masks = self._masks(**filters)
+        c = self.columns
+        full = self._combine(masks)
+
+        def count(column, facet, minlength=0):
+            mask = self._combine(masks, skip=facet) if facet in masks else full
+            values = c[column] if mask is None else c[column].take(np.flatnonzero(mask))
+            return np.bincount(values, minlength=minlength)
+
+        if full is None:
+            genre_hits = np.bitwise_count(self.genre_bits).sum(axis=1, dtype=np.int64)
+        else:
+            genre_hits = np.bitwise_count(self.genre_bits & np.packbits(full, bitorder="little")).sum(axis=1, dtype=np.int64)
+        languages = count("language", "languages", len(self.languages))
+        decades = count("decade", "year")
+        ratings = count("rating_bucket", "rating", 10)
+        return {
+            "total": len(self) if full is None else int(np.count_nonzero(full)),
+            "genres": {int(g): int(k) for g, k in zip(self.genre_ids, genre_hits) if k},
+            "languages": {str(lang): int(k) for lang, k in zip(self.languages, languages) if k and lang},
+            "decades": {d * 10: int(k) for d, k in enumerate(decades) if k and d},
+            "ratings": {r: int(k) for r, k in enumerate(ratings) if k},
+        }
+
+    def year_range(self):
+        years = self.columns["released"] // 10000
+        years = years[years > 0]
+        return (int(years.min()), int(years.max())) if len(years) else None
+
+    # ---- storage ----
+    def save(self, root=None):
+        arrays = {**self.columns, **{f"order_{name}": order for name, order in self.orders.items()},
+                  "languages": self.languages, "genre_ids": self.genre_ids, "genre_bits": self.genre_bits}
+        return vecstore.publish(FACET_STORE, {}, arrays=arrays, meta={"movies": len(self)}, root=root)
+
+    @classmethod
+    def load(cls, version):
+        columns = {name: version.array(name) for name in COLUMNS}
+        orders = {name: version.array(f"order_{name}") for name in SORTS}
+        return cls(columns, version.array("languages"), version.array("genre_ids"), version.array("genre_bits"), orders)
+
+
+def build_from_catalog(conn=None):
+    # Adult titles are left out, as discover_by_genre leaves them out.
+    conn = conn or catalog.get_conn()
+    ids, released, vote_count, runtime = array("q"), array("i"), array("i"), array("h")
+    vote_average, popularity = array("f"), array("f")
+    languages, genre_lists = [], []
+    rows = conn.execute(
+        "SELECT id, release_date, vote_average, vote_count, popularity, runtime, original_language, genre_ids "
+        "FROM movies WHERE adult = 0"
+    )
+    for movie_id, release_date, avg, votes, pop, minutes, lang, gids in rows:
+        ids.append(movie_id)
+        released.append(_released(release_date))
+        vote_average.append(avg or 0.0)
+        vote_count.append(votes or 0)
+        popularity.append(pop or 0.0)
+        runtime.append(min(minutes or 0, 32767))
+        languages.append(lang)
+        genre_lists.append([int(g) for g in gids.split(",")] if gids else [])
+    return FacetIndex.build(ids, released, vote_average, vote_count, popularity, runtime, languages, genre_lists)
+
+
+_store = vecstore.Reloader(FACET_STORE, FacetIndex.load)
+
+def get_facets():
+    # None until `python facets.py build` has been run
+    return _store.get()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("usage: python facets.py build")
+    started = time.time()
+    index = build_from_catalog()
+    version = index.save()
+    print(f"Built facets for {len(index)} movies ({len(index.genre_ids)} genres, {len(index.languages)} languages) "
+          f"in {time.time() - started:.1f}s")
+    print(f"Published {version.path}")
@@ -0,0 +1,221 @@
+"""Materialized home feeds.
+
+Each user's feed is computed off the request path (after login, or when it
+goes stale) and stored as one row of app.db's feeds table: the movie payloads
+themselves, a version, the model versions it came from and when it was built.
+browse_ui reads it back with a primary-key lookup and never ranks anything.
+
+    user_id 0    shared popularity feed, also what a new user sees until
+                 their own one is ready
+    user_id > 0  ALS (folded in from current interactions), else content
+                 neighbours of what they liked, else the popular feed minus
+                 what they have seen
+
+Rating or watching something drops that movie from the stored feed at once
+and queues a rebuild in the background.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import catalog
+import collab
+import db
+import ratelimit
+import recommend
+import tmdb
+import tmdb_async
+from records import Movie
+
+FEED_SIZE = int(os.getenv("FEED_SIZE", "40"))
+FEED_TTL_SECONDS = int(os.getenv("FEED_TTL_SECONDS", str(6 * 3600)))
+FEED_WORKERS = int(os.getenv("FEED_WORKERS", "2"))
+GUEST_ID = 0
+POPULAR_MIN_VOTES = 100
+SEED_LIMIT = 20  # strongest interactions averaged into the content-model query
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = {}  # user_id -> another pass requested while building
+_pending_lock = threading.Lock()
+
+
+def model_version():
+    # The model versions this process has loaded (what a build here would use);
+    # feeds built against others are rebuilt on their next read.
+    collab.get_model()
+    recommend.get_model()
+    return f"{collab._store.version or ''}/{recommend._store.version or ''}"
+
+
+def _payloads(movie_ids, known=None):
+    # Movie dicts in the given order: from `known` (id -> movie) where given,
+    # then the catalog, then TMDB for the rest
+    found = dict(known or {})
+    found.update((m.id, m) for m in catalog.get_movies([mid for mid in movie_ids if mid not in found]))
+    missing = [mid for mid in movie_ids if mid not in found]
+    if missing:
+        for mid, details in tmdb_async.movie_details_many(missing).items():
+            if details:
+                found[mid] = Movie.from_tmdb(details)
+    return [found[mid].to_dict() for mid in movie_ids if mid in found]
+
+
+def popular(n=FEED_SIZE, exclude=()):
+    # {id: movie} for the n most popular movies not in `exclude`, most popular first;
+    # from the catalog, or this week's trending list while the catalog is empty
+    # (or not there at all: has_movies doesn't create it)
+    exclude = set(exclude)
+    rows = []
+    if catalog.has_movies():
+        rows = catalog.get_conn().execute(
+            "SELECT id FROM movies WHERE adult = 0 AND vote_count >= ? ORDER BY popularity DESC LIMIT ?",
+            (POPULAR_MIN_VOTES, n + len(exclude))
+        ).fetchall()
+    if rows:
+        movies = catalog.get_movies([r[0] for r in rows])
+    else:
+        with tmdb.priority(ratelimit.BACKGROUND):
+            movies = [Movie.from_tmdb(m) for m in tmdb.trending(period="week")]
+    return {m.id: m for m in movies if m.id not in exclude}
+
+
+def _content_ids(interactions, n, exclude):
+    model = recommend.get_model()
+    if model is None or not interactions:
+        return []
+    seeds = sorted(interactions, key=lambda x: -x[1])[:SEED_LIMIT]
+    rows = model.rows_for([mid for mid, _ in seeds])
+    weights = np.asarray([s for _, s in seeds], dtype=np.float32)[rows >= 0]
+    rows = rows[rows >= 0]
+    if not len(rows):
+        return []
+    query = (model.matrix[rows] * weights[:, None]).sum(axis=0)
+    skip = model.rows_for(list(exclude)) if exclude else []
+    return [mid for mid, _ in model.top_k(query, k=n, exclude=[list(skip)])[0]]
+
+
+def compute(user_id):
+    # (source, movie ids, {id: movie} for any already at hand) for a user's feed
+    if user_id == GUEST_ID:
+        movies = popular()
+        return "popular", list(movies)[:FEED_SIZE], movies
+    interactions = db.user_interactions(user_id)
+    seen = db.seen_movie_ids(user_id) | {mid for mid, _ in interactions}
+    ids = [mid for mid, _ in collab.recommend_for_user(user_id, n=FEED_SIZE)]
+    if ids:
+        return "als", ids, None
+    ids = _content_ids(interactions, FEED_SIZE, seen)
+    if ids:
+        return "content", ids, None
+    movies = popular(exclude=seen)
+    return "popular", list(movies)[:FEED_SIZE], movies
+
+
+def build_feed(user_id):
+    # Recompute and store a feed now; returns the number of movies in it
+    version = model_version()
+    source, ids, known = compute(user_id)
+    items = _payloads(ids, known)
+    db.save_feed(user_id, source, version, json.dumps(items, separators=(",", ":")), time.time())
+    return len(items)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=FEED_WORKERS, thread_name_prefix="feed")
+    return _pool
+
+
+def refresh_async(user_id):
+    # Queue a rebuild, one per user at a time. A request that arrives while
+    # one is running gets a second pass, since the running one may have read
+    # the user's interactions before the change that prompted the request.
+    with _pending_lock:
+        if user_id in _pending:
+            _pending[user_id] = True
+            return
+        _pending[user_id] = False
+
+    def run():
+        done = False
+        try:
+            while not done:
+                try:
+                    build_feed(user_id)
+                except (tmdb.TMDBError, ValueError, sqlite3.Error):
+                    pass  # the old feed stays; the next read asks again
+                with _pending_lock:
+                    done = not _pending[user_id]
+                    if done:
+                        del _pending[user_id]
+                    else:
+                        _pending[user_id] = False
+        finally:
+            if not done:
+                # Anything else escaped build_feed: don't leave the user marked as
+                # building, or no later request would ever queue a rebuild
+                with _pending_lock:
+                    _pending.pop(user_id, None)
+
+    _get_pool().submit(run)
+
+
+def is_pending(user_id):
+    with _pending_lock:
+        return user_id in _pending
+
+
+def get_feed(user_id):
+    # The stored feed as a dict (items, source, version, computed_at, user_id),
+    # or None while nothing has been built yet. Out-of-date feeds are returned
+    # as they are and rebuilt in the background; a user without one yet gets
+    # the guest feed meanwhile.
+    row = db.get_feed(user_id)
+    if row is None or row["stale"] or row["model_version"] != model_version() \
+            or time.time() - row["computed_at"] > FEED_TTL_SECONDS:
+        refresh_async(user_id)
+    if row is None:
+        if user_id == GUEST_ID:
+            return None
+        shared = get_feed(GUEST_ID)
+        if shared is not None:
+            shared["user_id"] = user_id
+        return shared
+    return {
+        "user_id": row["user_id"],
+        "items": json.loads(row["items"]),
+        "source": row["source"],
+        "version": row["version"],
+        "computed_at": row["computed_at"],
+    }
+
+
+def note_interaction(user_id, movie_id):
+    # After a rating, watch or watchlist change: drop the movie from the stored
+    # feed right away, then rebuild it in the background.
+    row = db.get_feed(user_id)
+    if row is not None:
+        items = [m for m in json.loads(row["items"]) if m.get("id") != movie_id]
+        db.update_feed_items(user_id, row["version"], json.dumps(items, separators=(",", ":")))
+    refresh_async(user_id)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("usage: python feed.py build [USER_ID ...]")
+    users = [int(u) for u in sys.argv[2:]] or [GUEST_ID]
+    for uid in users:
+        started = time.time()
+        n = build_feed(uid)
+        print(f"Built feed for user {uid}: {n} movies in {time.time() - started:.2f}s")
@@ -0,0 +1,214 @@
+"""Bulk-load the local catalog from TMDB.
+
+    python ingest.py export movie_ids_05_15_2024.json.gz --workers 8 --rate 35
+    python ingest.py changes --start 2024-05-14 --end 2024-05-15
+
+`export` streams one of TMDB's daily ID export files (gzip'd JSON lines) and
+fetches details + credits for every id; `changes` pulls only the ids TMDB
+reports as changed in a date window. Both commit in large batches and write a
+checkpoint after each one, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import catalog
+import ratelimit
+import tmdb
+
+BATCH_SIZE = 500
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 35.0  # requests/second for tmdb's process-wide limiter, under TMDB's ~40-50 rps ceiling
+
+
+class Checkpoint:
+    # Progress for one source file/window, written atomically after each committed batch.
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.position = 0
+        self.done = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("source") == source:
+                self.position = state.get("position", 0)
+                self.done = state.get("done", 0)
+
+    def save(self, position, done):
+        self.position = position
+        self.done = done
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"source": self.source, "position": position, "done": done, "saved_at": time.time()}, f)
+        os.replace(tmp, self.path)
+
+
+def iter_export_ids(path, skip=0, min_popularity=0.0, include_adult=False):
+    # Yields (line_number, movie_id) lazily; the file is never held in memory.
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            if n <= skip or not line.strip():
+                continue
+            rec = json.loads(line)
+            if rec.get("adult") and not include_adult:
+                continue
+            if rec.get("video"):
+                continue
+            if (rec.get("popularity") or 0.0) < min_popularity:
+                continue
+            yield n, rec["id"]
+
+
+def iter_changed_ids(start_date, end_date, skip=0):
+    # /movie/changes is paged; position counts ids already handed out.
+    page, total_pages, n = 1, 1, 0
+    while page <= total_pages:
+        with tmdb.priority(ratelimit.BACKGROUND):
+            data = tmdb._get("/movie/changes", params={"start_date": start_date, "end_date": end_date, "page": page},
+                             cache=False)
+        total_pages = data.get("total_pages") or 1
+        for rec in data.get("results", []):
+            n += 1
+            if n <= skip or rec.get("adult"):
+                continue
+            yield n, rec["id"]
+        page += 1
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Ingester:
+    def __init__(self, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, batch_size=BATCH_SIZE, only_new=False,
+                 conn=None, failed_path=None):
+        self.workers = workers
+        self.failed_path = failed_path
+        self.batch_size = batch_size
+        self.only_new = only_new
+        if rate:
+            tmdb.set_rate_limit(rate)
+        self.conn = conn or catalog.get_conn()
+        self.stats = {"seen": 0, "fetched": 0, "skipped": 0, "missing": 0, "failed": 0}
+
+    def fetch(self, movie_id):
+        # ("ok", details) / ("missing", None) for ids TMDB no longer has / ("failed", error).
+        # Background priority: if the app shares this process, its page loads go first.
+        try:
+            with tmdb.priority(ratelimit.BACKGROUND):
+                return "ok", tmdb._get(f"/movie/{movie_id}", params={"append_to_response": "credits"}, cache=False)
+        except tmdb.TMDBError as e:
+            if e.status == 404:
+                return "missing", None
+            return "failed", e
+
+    def _record_failed(self, ids):
+        # Failed ids are set aside so the checkpoint can move on; feed them back in later.
+        self.stats["failed"] += len(ids)
+        if self.failed_path:
+            with open(self.failed_path, "a") as f:
+                f.writelines(json.dumps({"id": mid}) + "\n" for mid in ids)
+
+    def run(self, items, checkpoint=None, progress=None):
+        # items: iterable of (position, movie_id). Fetching is concurrent; writing
+        # stays on this thread, one transaction per batch.
+        checkpoint = checkpoint or Checkpoint(None, None)
+        done = checkpoint.done
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+            for batch in _batches(items, self.batch_size):
+                ids = [mid for _, mid in batch]
+                self.stats["seen"] += len(ids)
+                if self.only_new:
+                    have = catalog.existing_movie_ids(ids, conn=self.conn)
+                    self.stats["skipped"] += len(have)
+                    ids = [mid for mid in ids if mid not in have]
+                missing, failed = [], []
+                with self.conn:
+                    for mid, (status, payload) in zip(ids, pool.map(self.fetch, ids)):
+                        if status == "ok":
+                            catalog.upsert_movie_details(payload, conn=self.conn, commit=False)
+                            self.stats["fetched"] += 1
+                        elif status == "missing":
+                            missing.append(mid)
+                        else:
+                            failed.append(mid)
+                    if missing:
+                        catalog.delete_movies(missing, conn=self.conn, commit=False)
+                        self.stats["missing"] += len(missing)
+                if failed:
+                    self._record_failed(failed)
+                done += len(batch)
+                checkpoint.save(batch[-1][0], done)
+                if progress:
+                    progress(self.stats)
+        return self.stats
+
+
+def _print_progress(started):
+    def report(stats):
+        elapsed = time.time() - started
+        rate = stats["fetched"] / elapsed if elapsed else 0.0
+        print(f"seen={stats['seen']} fetched={stats['fetched']} skipped={stats['skipped']} "
+              f"missing={stats['missing']} failed={stats['failed']} ({rate:.1f}/s)", flush=True)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the local movie catalog from TMDB.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="ingest a TMDB daily ID export file")
+    exp.add_argument("path")
+    exp.add_argument("--min-popularity", type=float, default=0.0)
+    exp.add_argument("--only-new", action="store_true", help="skip ids already in the catalog")
+
+    chg = sub.add_parser("changes", help="re-fetch movies TMDB reports as changed")
+    chg.add_argument("--start", required=True, help="YYYY-MM-DD")
+    chg.add_argument("--end", required=True, help="YYYY-MM-DD")
+
+    for p in (exp, chg):
+        p.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+        p.add_argument("--rate", type=float, default=DEFAULT_RATE)
+        p.add_argument("--batch", type=int, default=BATCH_SIZE)
+        p.add_argument("--checkpoint", default="ingest.checkpoint.json")
+        p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+
+    args = parser.parse_args(argv)
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    if args.command == "export":
+        source = os.path.abspath(args.path)
+        checkpoint = Checkpoint(args.checkpoint, source)
+        items = iter_export_ids(args.path, skip=checkpoint.position, min_popularity=args.min_popularity)
+        only_new = args.only_new
+    else:
+        checkpoint = Checkpoint(args.checkpoint, f"changes:{args.start}:{args.end}")
+        items = iter_changed_ids(args.start, args.end, skip=checkpoint.position)
+        only_new = False
+
+    if checkpoint.position:
+        print(f"Resuming after position {checkpoint.position}")
+    ingester = Ingester(workers=args.workers, rate=args.rate, batch_size=args.batch, only_new=only_new,
+                        failed_path=args.checkpoint + ".failed.jsonl")
+    stats = ingester.run(items, checkpoint=checkpoint, progress=_print_progress(time.time()))
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""In-process metrics: latency histograms and counters for the hot paths.
+
+    TMDB    tmdb_request_seconds{endpoint,status}   one observation per HTTP attempt
+            tmdb_retries_total{endpoint,reason}     retried attempts, by the status that caused them
+            tmdb_cache_total{endpoint,outcome}      hit / stale / stale_on_error / miss / uncached
+            tmdb_errors_total{endpoint,status}      TMDBErrors raised to the caller
+    SQLite  db_query_seconds{query}                 each db.py accessor
+    UI      render_seconds{view}                    one browse_ui rerun, start to finish
+
+Exposed in Prometheus text format on http://<host>:METRICS_PORT/metrics by a
+daemon thread (start_server(); nothing listens unless METRICS_PORT is set), and
+summarized in a sidebar panel when METRICS_PANEL=1.
+
+With METRICS=0 every observe/inc returns at its first line and timed()
+hands back the undecorated function, so the instrumented code runs as
+before.
+"""
+import bisect
+import os
+import re
+import threading
+import time
+from functools import lru_cache, wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0: no endpoint
+METRICS_PANEL = os.getenv("METRICS_PANEL", "0") == "1"
+
+# Seconds; 1 ms to 30 s covers a SQLite lookup through a TMDB call that retried
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_RE = re.compile(r"/\d+(?=/|$)")
+
+
+@lru_cache(maxsize=4096)
+def endpoint(path):
+    # "/movie/603/videos" -> "/movie/{id}/videos", so ids don't become label values
+    return _ID_RE.sub("/{id}", path)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        if not METRICS_ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += seconds
+
+    def series(self):
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.series().items()):
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (le,))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {running}")
+        return lines
+
+    def quantile(self, q, counts):
+        # Estimated from the bucket counts, interpolating inside the bucket
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        running = 0
+        for i, n in enumerate(counts):
+            if running + n >= rank and n:
+                lo = self.buckets[i - 1] if i else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - running) / n
+            running += n
+        return self.buckets[-1]
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+TMDB_REQUEST_SECONDS = Histogram("tmdb_request_seconds", "TMDB HTTP attempts by endpoint and status",
+                                 ("endpoint", "status"))
+TMDB_RETRIES = Counter("tmdb_retries_total", "TMDB attempts retried, by the status that caused the retry", ("endpoint", "reason"))
+TMDB_CACHE = Counter("tmdb_cache_total", "TMDB lookups by cache outcome", ("endpoint", "outcome"))
+TMDB_ERRORS = Counter("tmdb_errors_total", "TMDBErrors raised to callers", ("endpoint", "status"))
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "app.db accessor calls", ("query",))
+RENDER_SECONDS = Histogram("render_seconds", "browse_ui reruns by view", ("view",))
+REGISTRY = [TMDB_REQUEST_SECONDS, TMDB_RETRIES, TMDB_CACHE, TMDB_ERRORS, DB_QUERY_SECONDS, RENDER_SECONDS]
+
+
+def timed(histogram, label=None):
+    # Decorator observing each call's duration, labelled with the function name
+    def wrap(fn):
+        if not METRICS_ENABLED:
+            return fn
+        name = label or fn.__name__
+
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+
+        return inner
+
+    return wrap
+
+
+def exposition():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+def summary(histogram):
+    # [(label values, count, mean, p50, p95)] per series, busiest first, in seconds
+    rows = []
+    for labels, (counts, total) in histogram.series().items():
+        n = sum(counts)
+        rows.append((labels, n, total / n if n else 0.0, histogram.quantile(0.5, counts),
+                     histogram.quantile(0.95, counts)))
+    return sorted(rows, key=lambda r: -r[1])
+
+
+# ---------------- /metrics endpoint ----------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port=None, host=None):
+    # Safe to call on every Streamlit rerun; only the first call binds the port.
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not METRICS_ENABLED or not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host or METRICS_HOST, port), _Handler)
+            except OSError:
+                # Port taken, e.g. by another app process on this host: carry on without it
+                _server = False
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server or None
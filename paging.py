@@ -0,0 +1,102 @@
+import os
+import threading
+
+import ratelimit
+import tmdb
+from records import MovieBatch
+
+PAGE_SIZE = 20  # TMDB's fixed page size
+PAGER_MAX_PAGES = int(os.getenv("PAGER_MAX_PAGES", "25"))
+MAX_PAGERS = 8  # result lists kept per session
+
+
+def iter_pages(fetch_page, start=1, max_pages=PAGER_MAX_PAGES, page_size=PAGE_SIZE):
+    # Yields (page_number, results) lazily; stops at an empty or short page.
+    for page in range(start, max_pages + 1):
+        results = fetch_page(page)
+        if not results:
+            return
+        yield page, results
+        if len(results) < page_size:
+            return
+
+
+class Pager:
+    """Accumulates a paged result list, de-duplicated by movie id across pages.
+
+    After each page is handed out the next one is fetched on tmdb's prefetch
+    pool, so "Load more" usually finds it already waiting.
+    """
+
+    def __init__(self, fetch_page, max_pages=PAGER_MAX_PAGES, page_size=PAGE_SIZE, prefetch=True):
+        self.fetch_page = fetch_page
+        self.max_pages = max_pages
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.movies = MovieBatch()  # columnar: pagers live in session state, one per result list
+        self.pages_loaded = 0
+        self.exhausted = False
+        self.error = None
+        self._seen = set()
+        self._pages = self._iter(1)
+        self._next = None
+        self._lock = threading.Lock()
+
+    @property
+    def has_more(self):
+        # False once the end is known, including when the prefetch already hit it
+        if self.exhausted:
+            return False
+        nxt = self._next
+        return not (nxt is not None and nxt.done() and nxt.exception() is None and nxt.result() is None)
+
+    def _iter(self, start):
+        return iter_pages(self.fetch_page, start=start, max_pages=self.max_pages, page_size=self.page_size)
+
+    def _advance(self):
+        with tmdb.priority(ratelimit.PREFETCH):
+            return next(self._pages, None)
+
+    def load_more(self):
+        # Appends the next page and returns only the movies it added.
+        with self._lock:
+            if self.exhausted:
+                return []
+            try:
+                item = self._next.result() if self._next is not None else next(self._pages, None)
+            except (tmdb.TMDBError, ValueError) as e:
+                # A generator is dead once it raises; resume from the page that failed next time
+                self.error = e
+                self._next = None
+                self._pages = self._iter(self.pages_loaded + 1)
+                return []
+            self._next = None
+            self.error = None
+            if item is None:
+                self.exhausted = True
+                return []
+            self.pages_loaded, results = item
+            added = []
+            for m in results:
+                mid = m.get("id")
+                if mid not in self._seen:
+                    self._seen.add(mid)
+                    added.append(m)
+            self.movies.extend(added)
+            if self.prefetch:
+                self._next = tmdb._get_prefetch_pool().submit(self._advance)
+            return added
+
+
+def cached_pager(pagers, key, fetch_page, limit=MAX_PAGERS):
+    # The Pager for `key` in `pagers` (a dict kept in session state), created with
+    # its first page loaded on first use. Use moves a key to the end, so past
+    # `limit` the least recently used lists are dropped first.
+    pager = pagers.pop(key, None)
+    if pager is None:
+        pager = Pager(fetch_page)
+        pager.load_more()
+    pagers[key] = pager
+    while len(pagers) > limit:
+        pagers.pop(next(iter(pagers)))
+    return pager
@@ -0,0 +1,245 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from PIL import Image, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
+
+import ratelimit
+import tmdb
+
+POSTER_CACHE_DIR = os.getenv("POSTER_CACHE_DIR", os.path.join(os.path.dirname(__file__), "poster_cache"))
+POSTER_CACHE_MB = int(os.getenv("POSTER_CACHE_MB", "256"))
+POSTER_SOURCE_SIZE = os.getenv("POSTER_SOURCE_SIZE", "w500")
+POSTER_THUMB_WIDTH = int(os.getenv("POSTER_THUMB_WIDTH", "300"))  # list cards, ~2x their on-screen width
+POSTER_WORKERS = int(os.getenv("POSTER_WORKERS", "8"))
+# A poster is never worth waiting long for: the card falls back to the remote URL.
+# So no retries, a short timeout, and a failed poster is not asked for again for
+# POSTER_FAILURE_TTL seconds.
+POSTER_TIMEOUT = float(os.getenv("POSTER_TIMEOUT", "2"))
+POSTER_FAILURE_TTL = float(os.getenv("POSTER_FAILURE_TTL", "300"))
+# Longest a page render waits on thumbnails; slower ones show the remote poster
+POSTER_WAIT = float(os.getenv("POSTER_WAIT", "1.0"))
+TOUCH_INTERVAL = 60  # seconds; last_access is only rewritten this often per file
+
+
+class PosterCache:
+    """Resized poster thumbnails on local disk.
+
+    Files are content-addressed: named by the SHA-256 of the source image plus
+    the width, so posters TMDB serves under several paths are stored once. A
+    small SQLite index maps poster_path -> digest and tracks size and last
+    access per file; once the total passes max_bytes the least recently used
+    files are deleted down to 90%.
+    """
+
+    def __init__(self, root=POSTER_CACHE_DIR, max_bytes=POSTER_CACHE_MB * 1024 * 1024, image_base=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.image_base = image_base or tmdb.TMDB_IMAGE_BASE
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.skipped = 0  # lookups answered None from the failure cache
+        self.evictions = 0
+        self._failed = {}  # poster_path -> time.monotonic() until which it is not retried
+        self._adapter = HTTPAdapter(pool_maxsize=POSTER_WORKERS, max_retries=0, pool_block=True)
+        self._local = threading.local()
+        self._flights = ratelimit.SingleFlight()
+        self._pool = ThreadPoolExecutor(max_workers=POSTER_WORKERS, thread_name_prefix="posters")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sources (poster_path TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+        self._conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS files (
+                digest TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (digest, width)
+            )
+            '''
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_access ON files (last_access)")
+        self._conn.commit()
+
+    def _session(self):
+        # One Session per thread (they are not thread-safe), all on this cache's
+        # adapter: none of tmdb's API retries apply to images.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+        return session
+
+    def _file(self, digest, width):
+        return os.path.join(self.root, digest[:2], f"{digest}_{width}.jpg")
+
+    def lookup(self, poster_path, width):
+        # Local file for this poster/width if cached, else None. Never fetches.
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT f.digest, f.last_access FROM sources s JOIN files f ON f.digest = s.digest AND f.width = ? "
+                "WHERE s.poster_path = ?",
+                (width, poster_path),
+            ).fetchone()
+        if row is None:
+            return None
+        digest, last_access = row
+        path = self._file(digest, width)
+        if not os.path.exists(path):
+            # Deleted behind our back (manual cleanup, another process's eviction)
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM files WHERE digest = ? AND width = ?", (digest, width))
+            return None
+        now = time.time()
+        if now - last_access > TOUCH_INTERVAL:
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE files SET last_access = ? WHERE digest = ? AND width = ?",
+                                   (now, digest, width))
+        return path
+
+    def get(self, poster_path, width=POSTER_THUMB_WIDTH):
+        # Local thumbnail path, fetching and resizing on a miss; None if the
+        # poster can't be had (callers fall back to the remote URL).
+        if not poster_path:
+            return None
+        path = self.lookup(poster_path, width)
+        if path is not None:
+            self.hits += 1
+            return path
+        with self._lock:
+            if self._failed.get(poster_path, 0.0) > time.monotonic():
+                self.skipped += 1
+                return None
+        self.misses += 1
+        return self._flights.do((poster_path, width), lambda: self._fill(poster_path, width))
+
+    def _fill(self, poster_path, width):
+        try:
+            r = self._session().get(f"{self.image_base}/{POSTER_SOURCE_SIZE}{poster_path}", timeout=POSTER_TIMEOUT)
+            r.raise_for_status()
+            digest = hashlib.sha256(r.content).hexdigest()
+            thumb = resize(r.content, width)
+        except (requests.exceptions.RequestException, UnidentifiedImageError, OSError):
+            with self._lock:
+                self.failures += 1
+                self._failed[poster_path] = time.monotonic() + POSTER_FAILURE_TTL
+                if len(self._failed) > 4096:
+                    now = time.monotonic()
+                    self._failed = {p: t for p, t in self._failed.items() if t > now}
+            return None
+        path = self._file(digest, width)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(thumb)
+        os.replace(tmp, path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sources (poster_path, digest) VALUES (?, ?)", (poster_path, digest))
+            self._conn.execute("INSERT OR REPLACE INTO files (digest, width, bytes, last_access) VALUES (?, ?, ?, ?)",
+                               (digest, width, len(thumb), time.time()))
+        self.evict()
+        return path
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM files").fetchone()[0]
+
+    def evict(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * 0.9
+        removed = 0
+        with self._lock:
+            rows = self._conn.execute("SELECT digest, width, bytes FROM files ORDER BY last_access").fetchall()
+            with self._conn:
+                for digest, width, size in rows:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(self._file(digest, width))
+                    except FileNotFoundError:
+                        pass
+                    self._conn.execute("DELETE FROM files WHERE digest = ? AND width = ?", (digest, width))
+                    total -= size
+                    removed += 1
+        self.evictions += removed
+        return removed
+
+    def prefetch_async(self, poster_paths, width=POSTER_THUMB_WIDTH):
+        # {poster_path: Future} for a whole result page; returns without waiting.
+        paths = dict.fromkeys(p for p in poster_paths if p)
+        return {p: self._pool.submit(self.get, p, width) for p in paths}
+
+    def prefetch(self, poster_paths, width=POSTER_THUMB_WIDTH, timeout=None):
+        # {poster_path: local file or None}, fetched concurrently; None as well
+        # for any still in flight after `timeout` seconds.
+        return collect(self.prefetch_async(poster_paths, width), timeout)
+
+    def stats(self):
+        with self._lock:
+            files, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM files").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "files": files,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+        }
+
+
+def resize(data, width):
+    # JPEG no wider than `width`, aspect kept; never upscales.
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=82, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def collect(pending, timeout=POSTER_WAIT):
+    # {poster_path: local file or None} from prefetch_async's futures, waiting at
+    # most `timeout` seconds (None: for all of them). Unfinished fetches carry on
+    # in the background and are cache hits next time.
+    done, _ = wait(pending.values(), timeout=timeout)
+    return {p: f.result() if f in done else None for p, f in pending.items()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_poster_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PosterCache()
+    return _cache
+
+def prefetch_posters(poster_paths, width=POSTER_THUMB_WIDTH, timeout=POSTER_WAIT):
+    return get_poster_cache().prefetch(poster_paths, width, timeout)
+
+def poster_within(poster_path, width=POSTER_THUMB_WIDTH, timeout=POSTER_WAIT):
+    # One local poster, or None if it isn't ready within `timeout` seconds
+    return prefetch_posters([poster_path], width, timeout).get(poster_path)
+
+def prefetch_posters_async(poster_paths, width=POSTER_THUMB_WIDTH):
+    return get_poster_cache().prefetch_async(poster_paths, width)
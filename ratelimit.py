@@ -0,0 +1,189 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+
+# Lower runs first. Page loads beat the trailer/revalidation prefetch, which
+# beats the refresher and bulk ingest.
+INTERACTIVE = 0
+PREFETCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch", BACKGROUND: "background"}
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RateLimiter:
+    """Token bucket shared by every thread in the process, with a priority queue.
+
+    Waiters queue by (priority, arrival) and only the head of the queue may take
+    a token, so a burst of background work can't get ahead of a page load that
+    arrives after it. pause() empties the bucket and holds everyone back, which
+    is how a 429's Retry-After is honoured.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.acquired = 0
+        self.throttled = 0
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._waits = {p: deque(maxlen=1024) for p in PRIORITY_NAMES}
+        self._cond = threading.Condition()
+
+    def set_rate(self, rate, burst=None):
+        with self._cond:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            self.capacity = float(burst or max(rate, 1.0))
+            self.tokens = min(self.tokens, self.capacity)
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        if now <= self.updated:
+            return  # still inside a pause
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=INTERACTIVE):
+        # Blocks until a token is granted; returns the seconds spent waiting.
+        started = time.monotonic()
+        entry = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            self._cond.notify_all()  # a new head may have arrived
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiters[0] == entry:
+                        self._refill(now)
+                        wait = self.paused_until - now
+                        if wait <= 0:
+                            if self.tokens >= 1:
+                                self.tokens -= 1
+                                heapq.heappop(self._waiters)
+                                waited = now - started
+                                self.acquired += 1
+                                self._waits.setdefault(priority, deque(maxlen=1024)).append(waited)
+                                self._cond.notify_all()
+                                return waited
+                            wait = (1 - self.tokens) / self.rate
+                    self._cond.wait(wait)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def try_acquire(self, priority=INTERACTIVE):
+        # Takes a token only if one is free right now and nobody is queued;
+        # lets async callers skip the blocking path in the common case.
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiters or now < self.paused_until or self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.acquired += 1
+            self._waits.setdefault(priority, deque(maxlen=1024)).append(0.0)
+            return True
+
+    def pause(self, seconds):
+        # Nobody gets a token for `seconds`, and the bucket restarts empty so the
+        # queue drains at `rate` afterwards instead of bursting straight back into a 429.
+        with self._cond:
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            waits = {PRIORITY_NAMES.get(p, str(p)): list(w) for p, w in self._waits.items()}
+            return {
+                "rate": self.rate,
+                "tokens": round(self.tokens, 2),
+                "queue_depth": len(self._waiters),
+                "queued": queued,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "paused_for": round(max(self.paused_until - time.monotonic(), 0.0), 2),
+                "wait_ms": {
+                    name: {"p50": round(_percentile(w, 0.5) * 1000, 1), "p95": round(_percentile(w, 0.95) * 1000, 1),
+                           "max": round(max(w, default=0.0) * 1000, 1)}
+                    for name, w in waits.items()
+                },
+            }
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one.
+
+    The first caller runs fn; anyone arriving while it is in flight blocks and
+    gets the same result (or exception) instead of making their own call.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def retry_after_seconds(value, default):
+    # Retry-After is either delta-seconds or an HTTP date.
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
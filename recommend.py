@@ -0,0 +1,400 @@
+import math
+import os
+import re
+import sqlite3
+import zlib
+from array import array
+from itertools import groupby
+
+import numpy as np
+
+import ann
+import catalog
+import vecstore
+
+CONTENT_STORE = "content"  # models/content/, see vecstore.py
+
+# TMDB's fixed movie genre list, one column each
+GENRE_IDS = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37]
+GENRE_COL = {g: i for i, g in enumerate(GENRE_IDS)}
+
+# Words and people are hashed into HASH_DIM sparse columns (few enough collisions
+# to keep the overlap signal), then reduced to a dense TEXT_DIM/PEOPLE_DIM block by
+# a truncated SVD fitted on up to SVD_SAMPLE movies (LSA).
+HASH_DIM = 2048  # at most 2048: bits 20-30 of the hash
+TEXT_DIM = 72
+PEOPLE_DIM = 32
+NUMERIC_DIM = 3
+IDF_BUCKETS = 1 << 20
+SVD_SAMPLE = 50_000
+CHUNK_ROWS = 4096
+FORMAT = 2
+
+# Relative weight of each block after it has been normalized on its own
+BLOCK_WEIGHTS = {"text": 1.0, "genres": 0.8, "people": 0.7, "numeric": 0.25}
+
+# Cast beyond this billing position and most crew jobs say little about a film's feel
+TOP_CAST = 8
+KEY_CREW_JOBS = ("Director", "Screenplay", "Writer", "Original Music Composer", "Director of Photography")
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have he her his in is it its of on or that the their they this "
+    "to was were when who will with while after before into about over his hers him she them there where "
+    "which what one two new find must"
+    .split()
+)
+
+
+def _text_hashes(text):
+    counts = {}
+    for tok in _WORD_RE.findall((text or "").lower()):
+        if len(tok) < 3 or tok in STOPWORDS:
+            continue
+        h = zlib.crc32(tok.encode())
+        counts[h] = counts.get(h, 0) + 1
+    return counts
+
+def _people_hashes(person_ids):
+    return {zlib.crc32(b"p%d" % pid): 1 for pid in person_ids}
+
+def _year(release_date):
+    try:
+        return int((release_date or "")[:4])
+    except ValueError:
+        return None
+
+def _numeric(release_date, vote_average, vote_count):
+    year = _year(release_date)
+    return (
+        ((year or 1990) - 1900) / 130.0,
+        (vote_average or 0.0) / 10.0,
+        math.log1p(vote_count or 0) / math.log1p(30000),
+    )
+
+def _hashed_blocks(docs, hashes, weights, n_docs):
+    # Signed feature hashing: bits 20-30 pick the column (the low 20 index the IDF
+    # table), the top bit the sign, so collisions cancel out on average instead of
+    # piling up. Yields (start, stop, dense rows) CHUNK_ROWS documents at a time;
+    # `docs` must be ascending.
+    cols = (hashes >> 20) & (HASH_DIM - 1)
+    signed = np.where(hashes & 0x80000000, -1.0, 1.0) * weights
+    for start in range(0, n_docs, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, n_docs)
+        lo, hi = np.searchsorted(docs, [start, stop])
+        flat = (docs[lo:hi].astype(np.int64) - start) * HASH_DIM + cols[lo:hi]
+        block = np.bincount(flat, weights=signed[lo:hi], minlength=(stop - start) * HASH_DIM)
+        yield start, stop, block.reshape(stop - start, HASH_DIM)
+
+def _fit_basis(docs, hashes, weights, n_docs, dim, seed=0):
+    # (HASH_DIM, dim): top right singular vectors of the hashed matrix over a
+    # sample of its rows. Zero columns where the sample has fewer directions.
+    if n_docs > SVD_SAMPLE:
+        sample = np.sort(np.random.default_rng(seed).choice(n_docs, SVD_SAMPLE, replace=False))
+        keep = np.isin(docs, sample)
+        docs, hashes, weights = np.searchsorted(sample, docs[keep]), hashes[keep], weights[keep]
+        n_docs = SVD_SAMPLE
+    if n_docs < HASH_DIM:
+        # Fewer rows than columns: eigendecompose the small row Gram matrix instead
+        rows = np.zeros((n_docs, HASH_DIM))
+        for start, stop, block in _hashed_blocks(docs, hashes, weights, n_docs):
+            rows[start:stop] = block
+        vals, vecs = np.linalg.eigh(rows @ rows.T)
+        vals, vecs = vals[::-1][:dim], vecs[:, ::-1][:, :dim]
+        live = vals > 1e-9 * max(vals.max(initial=0.0), 1e-30)
+        vecs = rows.T @ (vecs[:, live] / np.sqrt(vals[live]))
+    else:
+        gram = np.zeros((HASH_DIM, HASH_DIM))
+        for _, _, block in _hashed_blocks(docs, hashes, weights, n_docs):
+            gram += block.T @ block
+        vals, vecs = np.linalg.eigh(gram)
+        vecs = vecs[:, ::-1][:, :dim][:, vals[::-1][:dim] > 1e-9 * max(vals.max(), 1e-30)]
+    basis = np.zeros((HASH_DIM, dim), dtype=np.float32)
+    basis[:, :vecs.shape[1]] = vecs
+    return basis
+
+def _project(docs, hashes, weights, basis, n_docs):
+    out = np.empty((n_docs, basis.shape[1]), dtype=np.float32)
+    for start, stop, block in _hashed_blocks(docs, hashes, weights, n_docs):
+        out[start:stop] = block @ basis
+    return out
+
+def _normalize_rows(m):
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    m /= norms
+    return m
+
+
+class ContentModel:
+    """Movie feature matrix (rows L2-normalized) with top-k cosine lookups."""
+
+    def __init__(self, ids, matrix, idf, bases=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if (np.diff(ids) < 0).any():
+            order = np.argsort(ids, kind="stable")
+            ids, matrix = ids[order], matrix[order]
+        # Already-sorted float32 input (e.g. a memory-mapped store) is used as is, not copied
+        self.ids = ids
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.bases = bases  # {"text", "people"}: (HASH_DIM, dim) SVD projections, for new movies
+        self.index = None  # optional ann.IVFIndex over the same rows
+        self.index_path = None
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows_for(self, movie_ids):
+        # Row index per id, -1 where the id is not in the model
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, movie_ids)
+        pos = np.minimum(pos, len(self.ids) - 1)
+        return np.where(self.ids[pos] == movie_ids, pos, -1)
+
+    def vector(self, movie_id):
+        row = self.rows_for([movie_id])[0]
+        return None if row < 0 else self.matrix[row]
+
+    def top_k(self, queries, k=10, exclude=None):
+        # queries: (b, dim). One matrix product for the whole batch, then
+        # argpartition per row so only the k winners get sorted.
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.index is not None:
+            return self._top_k_index(queries, k, exclude)
+        scores = queries @ self.matrix.T
+        if exclude is not None:
+            for i, rows in enumerate(exclude):
+                rows = [r for r in rows if r >= 0]
+                if rows:
+                    scores[i, rows] = -np.inf
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            [(int(self.ids[r]), float(s)) for r, s in zip(rows, ss) if np.isfinite(s)]
+            for rows, ss in zip(top, top_scores)
+        ]
+
+    def _top_k_index(self, queries, k, exclude):
+        # Over-fetch by the size of each exclude list so filtering still leaves k.
+        extra = max((len(rows) for rows in exclude), default=0) if exclude is not None else 0
+        ids, scores = self.index.search(queries, k=k + extra, nprobe=ann.ANN_NPROBE, vectors=(self.ids, self.matrix))
+        out = []
+        for i, (row_ids, row_scores) in enumerate(zip(ids, scores)):
+            skip = set()
+            if exclude is not None:
+                skip = {int(self.ids[r]) for r in exclude[i] if r >= 0}
+            hits = [(int(mid), float(sc)) for mid, sc in zip(row_ids, row_scores)
+                    if mid >= 0 and int(mid) not in skip]
+            out.append(hits[:k])
+        return out
+
+    def similar(self, movie_id, k=10):
+        return self.similar_batch([movie_id], k=k)[0]
+
+    def similar_batch(self, movie_ids, k=10):
+        # [(movie_id, score), ...] per input id, the movie itself excluded;
+        # unknown ids get an empty list.
+        rows = self.rows_for(movie_ids)
+        known = rows >= 0
+        out = [[] for _ in movie_ids]
+        if not known.any():
+            return out
+        hits = self.top_k(self.matrix[rows[known]], k=k, exclude=[[r] for r in rows[known]])
+        for i, res in zip(np.flatnonzero(known), hits):
+            out[i] = res
+        return out
+
+    def vector_for_details(self, details):
+        # Featurize a movie that is not in the model (e.g. a fresh TMDB details payload).
+        credits = details.get("credits") or {}
+        people = [c["id"] for c in (credits.get("cast") or [])[:TOP_CAST]]
+        people += [c["id"] for c in credits.get("crew") or [] if c.get("job") in KEY_CREW_JOBS]
+        genre_ids = details.get("genre_ids") or [g.get("id") for g in details.get("genres") or []]
+        text = f"{details.get('title') or ''} {details.get('overview') or ''}"
+        features = _Features(1)
+        features.add(0, text, genre_ids, people,
+                     _numeric(details.get("release_date"), details.get("vote_average"), details.get("vote_count")))
+        return features.build(self.idf, self.bases)[0]
+
+    def save(self, root=None, index=None):
+        # Publishes a new version of the store, with `index` (an ann.IVFIndex over
+        # these rows) if given; running processes pick it up on their next reload check.
+        files = {"ivf.npz": index.save} if index is not None else None
+        arrays = {"idf": self.idf, **{f"{name}_basis": b for name, b in (self.bases or {}).items()}}
+        return vecstore.publish(CONTENT_STORE, {"vectors": (self.ids, self.matrix)}, arrays=arrays,
+                                meta={"rows": len(self), "dim": self.dim, "format": FORMAT}, root=root, files=files)
+
+    @classmethod
+    def load(cls, version):
+        # None for a version from an older build (hashed straight into the dense
+        # block); similar_movies falls back to TMDB until the next build.
+        if version.meta.get("format") != FORMAT:
+            return None
+        ids, matrix = version.matrix("vectors")
+        bases = {name: version.array(f"{name}_basis") for name in ("text", "people")}
+        model = cls(ids, matrix, version.array("idf"), bases)
+        model.index_path = version.file("ivf.npz")
+        model.index = ann.load_index(model.index_path, len(model))
+        return model
+
+
+class _Features:
+    # Accumulates per-movie tokens in flat typed arrays (4 bytes per entry rather
+    # than a Python int), then builds the whole matrix block by block.
+
+    def __init__(self, n_docs):
+        self.n = n_docs
+        self.text = (array("i"), array("I"), array("f"))  # doc, hash, tf
+        self.people = (array("i"), array("I"))            # doc, hash
+        self.genres = (array("i"), array("i"))            # doc, column
+        self.numeric = np.zeros((n_docs, NUMERIC_DIM), dtype=np.float32)
+
+    def add(self, doc, text, genre_ids, person_ids, numeric):
+        for h, tf in _text_hashes(text).items():
+            self.text[0].append(doc)
+            self.text[1].append(h)
+            self.text[2].append(tf)
+        for h in _people_hashes(person_ids):
+            self.people[0].append(doc)
+            self.people[1].append(h)
+        for g in genre_ids:
+            col = GENRE_COL.get(g)
+            if col is not None:
+                self.genres[0].append(doc)
+                self.genres[1].append(col)
+        self.numeric[doc] = numeric
+
+    def idf(self):
+        hashes = np.frombuffer(self.text[1], dtype=np.uint32)
+        df = np.bincount(hashes & (IDF_BUCKETS - 1), minlength=IDF_BUCKETS)
+        return (np.log((1.0 + self.n) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def _sparse(self, idf):
+        # {"text"/"people": (docs, hashes, weights)}
+        docs = np.frombuffer(self.text[0], dtype=np.int32)
+        hashes = np.frombuffer(self.text[1], dtype=np.uint32)
+        tf = np.frombuffer(self.text[2], dtype=np.float32)
+        phashes = np.frombuffer(self.people[1], dtype=np.uint32)
+        return {
+            "text": (docs, hashes, (1.0 + np.log(tf)) * idf[hashes & (IDF_BUCKETS - 1)]),
+            "people": (np.frombuffer(self.people[0], dtype=np.int32), phashes, np.ones(len(phashes))),
+        }
+
+    def fit_bases(self, idf):
+        dims = {"text": TEXT_DIM, "people": PEOPLE_DIM}
+        return {name: _fit_basis(*sparse, self.n, dims[name]) for name, sparse in self._sparse(idf).items()}
+
+    def build(self, idf, bases):
+        n = self.n
+        sparse = self._sparse(idf)
+        blocks = {"text": _project(*sparse["text"], bases["text"], n)}
+
+        genres = np.zeros((n, len(GENRE_IDS)), dtype=np.float32)
+        if self.genres[0]:
+            genres[np.frombuffer(self.genres[0], dtype=np.int32), np.frombuffer(self.genres[1], dtype=np.int32)] = 1.0
+        blocks["genres"] = genres
+
+        blocks["people"] = _project(*sparse["people"], bases["people"], n)
+        blocks["numeric"] = self.numeric
+
+        parts = [_normalize_rows(blocks[name]) * BLOCK_WEIGHTS[name] for name in ("text", "genres", "people", "numeric")]
+        return _normalize_rows(np.hstack(parts).astype(np.float32))
+
+
+def _credits_by_movie(conn):
+    # (movie_id, [person_id, ...]) in movie id order, streamed off the credits index
+    jobs = ",".join("?" * len(KEY_CREW_JOBS))
+    rows = conn.execute(
+        f'''
+        SELECT movie_id, person_id FROM credits
+        WHERE (kind = 'cast' AND ord < ?) OR (kind = 'crew' AND job IN ({jobs}))
+        ORDER BY movie_id
+        ''',
+        (TOP_CAST, *KEY_CREW_JOBS),
+    )
+    for movie_id, group in groupby(rows, key=lambda r: r[0]):
+        yield movie_id, [r[1] for r in group]
+
+def build_from_catalog(conn=None):
+    # Movies and credits are both read in id order and merge-joined, so nothing
+    # per-movie is held in Python objects beyond the current row.
+    conn = conn or catalog.get_conn()
+    credit_conn = sqlite3.connect(conn.execute("PRAGMA database_list").fetchone()[2])
+    # One read transaction per connection: the count and the rows come from the same
+    # snapshot, however much an ingest commits meanwhile.
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    credit_conn.execute("BEGIN")
+    try:
+        ids, features = _read_catalog(conn, credit_conn)
+    finally:
+        conn.rollback()
+        credit_conn.close()
+
+    idf = features.idf()
+    bases = features.fit_bases(idf)
+    return ContentModel(ids, features.build(idf, bases), idf, bases)
+
+def _read_catalog(conn, credit_conn):
+    n = catalog.movie_count(conn)
+    ids = np.zeros(n, dtype=np.int64)
+    features = _Features(n)
+    credits = _credits_by_movie(credit_conn)
+    pending = next(credits, None)
+    rows = conn.execute(
+        "SELECT id, title, overview, genre_ids, release_date, vote_average, vote_count FROM movies ORDER BY id"
+    )
+    for i, (movie_id, title, overview, genre_ids, release_date, vote_average, vote_count) in enumerate(rows):
+        while pending is not None and pending[0] < movie_id:
+            pending = next(credits, None)
+        people = pending[1] if pending is not None and pending[0] == movie_id else ()
+        ids[i] = movie_id
+        gids = [int(g) for g in genre_ids.split(",") if g] if genre_ids else []
+        features.add(i, f"{title} {overview}", gids, people, _numeric(release_date, vote_average, vote_count))
+    return ids, features
+
+
+_store = vecstore.Reloader(CONTENT_STORE, ContentModel.load)
+
+def get_model():
+    # Memory-mapped from the current published version, shared with every other
+    # process on the host; None until `python recommend.py build` has been run.
+    return _store.get()
+
+def similar_movies(movie_id, details=None, k=10):
+    # Movie dicts most like movie_id, from the content model when available and
+    # otherwise from TMDB's own recommendations in the details payload.
+    model = get_model()
+    if model is not None:
+        hits = model.similar(movie_id, k=k)
+        if not hits and details:
+            hits = model.top_k(model.vector_for_details(details), k=k + 1)[0]
+            hits = [(mid, s) for mid, s in hits if mid != movie_id][:k]
+        if hits:
+            return catalog.get_movies([mid for mid, _ in hits])
+    return ((details or {}).get("recommendations") or {}).get("results", [])[:k]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if sys.argv[1:2] != ["build"]:
+        sys.exit("usage: python recommend.py build")
+    started = time.time()
+    model = build_from_catalog()
+    version = model.save()
+    print(f"Built content model for {len(model)} movies ({model.dim} dims) in {time.time() - started:.1f}s")
+    print(f"Published {version.path}")
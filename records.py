@@ -0,0 +1,240 @@
+"""Compact movie records.
+
+TMDB hands every movie back as a JSON dict: a hash table per movie plus a
+boxed object per value. Two smaller forms for what the app keeps around:
+
+    Movie       one movie in __slots__ (no per-instance dict); for catalog
+                query results and anything else held item by item
+    MovieBatch  a list of movies stored by column: numbers in typed arrays,
+                titles/overviews/paths as UTF-8 in one buffer per column,
+                dates, languages and genre lists as indexes into tables of
+                interned values; for result lists kept in session state
+
+Both answer .get(key) / [key] like the dict they replace, so code that reads
+TMDB payloads reads these unchanged. Fields outside FIELDS are dropped.
+
+    python benchmarks/bench_records.py --movies 1000000
+"""
+import sys
+from array import array
+
+FIELDS = (
+    "id", "title", "original_title", "overview", "release_date", "poster_path", "backdrop_path",
+    "vote_average", "vote_count", "popularity", "original_language", "genre_ids", "adult", "runtime",
+)
+_FIELD_SET = frozenset(FIELDS)
+
+_genre_tuples = {}
+
+
+def _genres(data):
+    ids = data.get("genre_ids")
+    if ids is None:
+        # Detail responses carry full genre objects instead of ids
+        ids = [g.get("id") for g in data.get("genres") or []]
+    key = tuple(int(g) for g in ids if g is not None)
+    # Only a few hundred distinct genre combinations exist; share one tuple per combination
+    return _genre_tuples.setdefault(key, key)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Movie:
+    __slots__ = FIELDS
+
+    def __init__(self, id, title="", original_title="", overview="", release_date=None, poster_path=None,
+                 backdrop_path=None, vote_average=0.0, vote_count=0, popularity=0.0, original_language=None,
+                 genre_ids=(), adult=False, runtime=None):
+        self.id = id
+        self.title = title
+        self.original_title = original_title
+        self.overview = overview
+        self.release_date = _intern(release_date)
+        self.poster_path = poster_path
+        self.backdrop_path = backdrop_path
+        self.vote_average = vote_average
+        self.vote_count = vote_count
+        self.popularity = popularity
+        self.original_language = _intern(original_language)
+        self.genre_ids = _genre_tuples.setdefault(tuple(genre_ids), tuple(genre_ids))
+        self.adult = adult
+        self.runtime = runtime
+
+    @classmethod
+    def from_tmdb(cls, data):
+        # From a TMDB movie dict (list result or details payload), or another Movie
+        if isinstance(data, Movie):
+            return data
+        title = data.get("title") or ""
+        original_title = data.get("original_title") or ""
+        if original_title == title:
+            original_title = title  # usually the same text; keep one copy
+        return cls(
+            data["id"], title, original_title, data.get("overview") or "",
+            data.get("release_date") or None, data.get("poster_path"), data.get("backdrop_path"),
+            float(data.get("vote_average") or 0.0), int(data.get("vote_count") or 0),
+            float(data.get("popularity") or 0.0), data.get("original_language"), _genres(data),
+            bool(data.get("adult")), data.get("runtime"),
+        )
+
+    # ---- the parts of the dict interface callers use ----
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _FIELD_SET else default
+
+    def __getitem__(self, key):
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in _FIELD_SET
+
+    def keys(self):
+        return FIELDS
+
+    def to_dict(self):
+        d = {f: getattr(self, f) for f in FIELDS}
+        d["genre_ids"] = list(self.genre_ids)
+        return d
+
+    def __eq__(self, other):
+        if not isinstance(other, Movie):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in FIELDS)
+
+    def __hash__(self):
+        # Equal movies share an id; lets them go in sets and dict keys
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"Movie(id={self.id!r}, title={self.title!r})"
+
+
+class _Table:
+    # Low-cardinality values (dates, languages, genre tuples) stored once;
+    # each row holds a small integer index.
+
+    def __init__(self, typecode):
+        self.values = [None]
+        self.index = {None: 0}
+        self.rows = array(typecode)
+
+    def append(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.rows.append(i)
+
+    def __getitem__(self, row):
+        return self.values[self.rows[row]]
+
+
+class _Text:
+    # Strings concatenated as UTF-8 into one buffer, with an end offset per
+    # row; about one byte per ASCII character instead of a str object each.
+
+    def __init__(self, empty=""):
+        self.data = bytearray()
+        self.ends = array("Q")
+        self.empty = empty  # what a missing or empty value reads back as
+
+    def append(self, value):
+        if value:
+            self.data += value.encode("utf-8")
+        self.ends.append(len(self.data))
+
+    def __getitem__(self, row):
+        start = self.ends[row - 1] if row else 0
+        end = self.ends[row]
+        return self.data[start:end].decode("utf-8") if end > start else self.empty
+
+
+class MovieBatch:
+    """Append-only list of movies kept column by column.
+
+    Indexing materializes a Movie; slicing gives a list of them, so the usual
+    `for m in batch[offset:offset + 20]` only builds what is shown.
+    """
+
+    def __init__(self, movies=()):
+        self.ids = array("q")
+        self.vote_average = array("f")  # read back rounded to TMDB's 3 decimals
+        self.vote_count = array("i")
+        self.popularity = array("f")
+        self.runtime = array("h")  # -1 when unknown
+        self.adult = array("b")
+        self.title = _Text()
+        self.original_title = _Text()
+        self.overview = _Text()
+        self.poster_path = _Text(None)
+        self.backdrop_path = _Text(None)
+        self.release_date = _Table("I")
+        self.original_language = _Table("H")
+        self.genre_ids = _Table("H")
+        self.extend(movies)
+
+    @classmethod
+    def from_tmdb(cls, results):
+        return cls(results)
+
+    def append(self, movie):
+        # A TMDB movie dict or a Movie
+        get = movie.get
+        self.ids.append(get("id"))
+        self.vote_average.append(float(get("vote_average") or 0.0))
+        self.vote_count.append(int(get("vote_count") or 0))
+        self.popularity.append(float(get("popularity") or 0.0))
+        runtime = get("runtime")
+        self.runtime.append(-1 if runtime is None else min(int(runtime), 32767))
+        self.adult.append(bool(get("adult")))
+        self.title.append(get("title"))
+        self.original_title.append(get("original_title"))
+        self.overview.append(get("overview"))
+        self.poster_path.append(get("poster_path"))
+        self.backdrop_path.append(get("backdrop_path"))
+        self.release_date.append(get("release_date") or None)
+        self.original_language.append(get("original_language"))
+        self.genre_ids.append(movie.genre_ids if isinstance(movie, Movie) else _genres(movie))
+
+    def extend(self, movies):
+        for m in movies:
+            self.append(m)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _movie(self, i):
+        runtime = self.runtime[i]
+        return Movie(
+            self.ids[i], self.title[i], self.original_title[i], self.overview[i], self.release_date[i],
+            self.poster_path[i], self.backdrop_path[i], round(self.vote_average[i], 3), self.vote_count[i],
+            round(self.popularity[i], 3), self.original_language[i], self.genre_ids[i], bool(self.adult[i]),
+            None if runtime < 0 else runtime,
+        )
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._movie(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("MovieBatch index out of range")
+        return self._movie(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._movie(i)
+
+    def to_dicts(self):
+        return [m.to_dict() for m in self]
+
+    def nbytes(self):
+        # Buffer and index bytes held by the batch; the shared interned tables are not counted
+        arrays = (self.ids, self.vote_average, self.vote_count, self.popularity, self.runtime, self.adult,
+                  self.release_date.rows, self.original_language.rows, self.genre_ids.rows)
+        texts = (self.title, self.original_title, self.overview, self.poster_path, self.backdrop_path)
+        return (sum(a.itemsize * len(a) for a in arrays)
+                + sum(len(t.data) + t.ends.itemsize * len(t.ends) for t in texts))
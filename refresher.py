@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+
+import ratelimit
+import tmdb
+
+REFRESH_INTERVAL = int(os.getenv("TMDB_REFRESH_INTERVAL", "240"))
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def hot_keys():
+    # What the landing page of every mode asks for first.
+    keys = [
+        ("/trending/movie/day", None),
+        ("/trending/movie/week", None),
+        ("/genre/movie/list", None),
+    ]
+    try:
+        gens = tmdb.genres()
+    except tmdb.TMDBError:
+        gens = []
+    for g in gens:
+        keys.append(("/discover/movie", tmdb.discover_params(g["id"], page=1)))
+    return keys
+
+class HotKeyRefresher(threading.Thread):
+    """Keeps the hot TMDB responses in the cache fresh on a fixed schedule."""
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        super().__init__(name="tmdb-refresher", daemon=True)
+        self.interval = interval
+        self.cycles = 0
+        self.failures = 0
+        self.last_run = None
+        self._halt = threading.Event()
+
+    def refresh_once(self):
+        # Anything that would go stale before the next cycle gets refetched now,
+        # so readers always find a fresh copy. Failures keep the old copy in place.
+        horizon = time.time() + self.interval * 1.5
+        for path, params in hot_keys():
+            expires_at = tmdb.cache_expiry(path, params)
+            if expires_at is not None and expires_at > horizon:
+                continue
+            try:
+                tmdb.refresh(path, params)
+            except (tmdb.TMDBError, ValueError):
+                self.failures += 1
+        self.cycles += 1
+        self.last_run = time.time()
+
+    def run(self):
+        # Queues behind every interactive and prefetch request for the rate limiter
+        with tmdb.priority(ratelimit.BACKGROUND):
+            while not self._halt.is_set():
+                self.refresh_once()
+                self._halt.wait(self.interval)
+
+    def stop(self):
+        self._halt.set()
+
+def start_refresher(interval=REFRESH_INTERVAL):
+    # Safe to call on every Streamlit rerun; only the first call starts a thread.
+    global _refresher
+    if not tmdb.TMDB_CACHE_ENABLED or interval <= 0:
+        return None
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = HotKeyRefresher(interval=interval)
+            _refresher.start()
+    return _refresher
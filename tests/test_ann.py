@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import ann
+
+
+def clustered(n=4000, dim=32, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32), np.arange(10, 10 + n, dtype=np.int64)
+
+
+@pytest.fixture(scope="module")
+def data():
+    vectors, ids = clustered()
+    queries = vectors[np.random.default_rng(1).choice(len(vectors), 100, replace=False)]
+    return vectors, ids, queries
+
+
+def test_flat_lists_match_brute_force(data):
+    vectors, ids, queries = data
+    index = ann.IVFIndex.build(vectors, ids, nlist=32)
+    assert ann.recall_at_k(index, vectors, ids, queries, nprobe=32) == 1.0
+    assert ann.recall_at_k(index, vectors, ids, queries, nprobe=8) > 0.9
+    found, scores = index.search(queries[:5], k=10, nprobe=32)
+    truth, truth_scores = ann.exact_search(vectors, ids, queries[:5], k=10)
+    assert np.array_equal(found, truth)
+    np.testing.assert_allclose(scores, truth_scores, rtol=1e-5)
+
+
+def test_pq_rerank_recovers_recall(data):
+    vectors, ids, queries = data
+    index = ann.IVFIndex.build(vectors, ids, nlist=32, pq_m=8)
+    approximate = ann.recall_at_k(index, vectors, ids, queries, nprobe=32, rerank=False)
+    reranked = ann.recall_at_k(index, vectors, ids, queries, nprobe=32)
+    assert reranked > 0.95 and reranked > approximate + 0.2, (approximate, reranked)
+    # Re-ranked scores are the exact ones
+    found, scores = index.search(queries[:3], k=5, nprobe=32, vectors=(ids, vectors))
+    np.testing.assert_allclose(scores, np.einsum("qkd,qd->qk", vectors[found - 10], queries[:3]), rtol=1e-5)
+
+
+def test_assign_chunks_stay_near_the_byte_budget(monkeypatch):
+    assert ann._chunk_rows(4096) * 4096 * 4 <= ann.ASSIGN_CHUNK_BYTES
+    assert ann._chunk_rows(1) == ann.ASSIGN_CHUNK_BYTES // 4
+
+    # Chunked assignment agrees with one big block
+    monkeypatch.setattr(ann, "ASSIGN_CHUNK_BYTES", 4 * 16 * 7)
+    vectors, _ = clustered(n=100, dim=8, clusters=4)
+    centroids = vectors[:16]
+    assert ann._chunk_rows(16) == 7
+    assert np.array_equal(ann._assign(vectors, centroids), np.argmax(vectors @ centroids.T, axis=1))
+    assert np.array_equal(ann._assign_l2(vectors, centroids),
+                          np.argmin(((vectors[:, None] - centroids[None]) ** 2).sum(-1), axis=1))
@@ -0,0 +1,64 @@
+import numpy as np
+
+import autocomplete
+import vecstore
+from autocomplete import PrefixIndex
+
+
+def ids(results):
+    return [r["id"] for r in results]
+
+
+def test_word_start_prefixes_most_popular_first():
+    index = PrefixIndex.build([1, 2, 3], ["The Matrix", "Matrix Reloaded", "Amélie"], [5.0, 9.0, 1.0],
+                              years=[1999, 2003, 2001])
+    assert ids(index.suggest("matr")) == [2, 1]
+    assert ids(index.suggest("the m")) == [1]
+    assert index.suggest("AMEL") == [{"id": 3, "label": "Amélie", "year": 2001, "popularity": 1.0}]
+    assert index.suggest("  ") == []
+
+
+def test_aliases_are_searchable_but_not_shown():
+    index = PrefixIndex.build([1], ["Amelie"], [1.0], aliases=["Le Fabuleux Destin d'Amélie Poulain"])
+    assert index.suggest("fabul") == [{"id": 1, "label": "Amelie", "year": 0, "popularity": 1.0}]
+
+
+def test_long_queries_match_aliases_past_the_key_width():
+    index = PrefixIndex.build([1], ["Amelie"], [1.0], aliases=["Le fabuleux destin d'Amélie Poulain extra long"])
+    assert ids(index.suggest("le fabuleux destin d amelie p")) == [1]
+    # Same first KEY_BYTES, different words after them
+    assert index.suggest("le fabuleux destin d amelie x") == []
+
+
+def test_entries_with_many_keys_in_one_range_do_not_crowd_out_others():
+    # Entry 1 has 2 * MAX_WORD_STARTS keys under "x", more than k * MAX_WORD_STARTS for k=2
+    index = PrefixIndex.build([1, 2, 3], ["xa xb xc xd", "xz", "xy"], [10.0, 5.0, 1.0],
+                              aliases=["xe xf xg xh", None, None])
+    assert ids(index.suggest("x", k=2)) == [1, 2]
+    assert ids(index.suggest("x", k=3)) == [1, 2, 3]
+
+
+def test_heavy_prefixes_match_a_full_scan():
+    rng = np.random.default_rng(0)
+    n = autocomplete.SCAN_LIMIT + 500
+    labels = [f"Star {i}" for i in range(n)]
+    popularity = rng.random(n).astype(np.float32)
+    index = PrefixIndex.build(range(n), labels, popularity)
+    assert len(index.heavy_keys)
+    expected = [int(i) for i in np.argsort(-popularity, kind="stable")[:autocomplete.TOP_K]]
+    assert ids(index.suggest("st", k=autocomplete.TOP_K)) == expected
+
+
+def test_save_and_load_round_trip(tmp_path):
+    root = str(tmp_path)
+    movies = PrefixIndex.build([1], ["Amelie"], [1.0], aliases=["Le fabuleux destin d'Amélie Poulain extra long"])
+    people = PrefixIndex.build([7], ["Audrey Tautou"], [3.0])
+    version = autocomplete.save({"movie": movies, "person": people}, root=root)
+    loaded = autocomplete.load(version)
+    assert ids(loaded["movie"].suggest("le fabuleux destin d amelie p")) == [1]
+    assert ids(loaded["person"].suggest("taut")) == [7]
+
+
+def test_older_versions_are_not_loaded(tmp_path):
+    version = vecstore.publish(autocomplete.SUGGEST_STORE, {}, arrays={"movie_ids": np.zeros(0)}, root=str(tmp_path))
+    assert autocomplete.load(version) is None
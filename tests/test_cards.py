@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from PIL import Image
+from streamlit.testing.v1 import AppTest
+
+import cards
+import posters
+
+MOVIE = {"id": 1, "title": "Alien", "vote_average": 8.1, "vote_count": 100, "release_date": "1979-05-25",
+         "overview": "In space.", "poster_path": "/alien.jpg"}
+
+
+def test_card_html_links_the_remote_poster_to_the_trailer():
+    linked = cards.card_html(MOVIE, trailer="abc")
+    assert "youtube.com/watch?v=abc" in linked
+    assert f'src="{cards.poster_url("/alien.jpg")}"' in linked
+    assert "youtube.com" not in cards.card_html(MOVIE)
+
+
+def _render(thumb, trailer):
+    import cards
+
+    cards.render_card({"id": 1, "title": "Alien", "poster_path": "/alien.jpg"}, trailer=trailer, thumb=thumb)
+
+
+def test_render_card_serves_thumbnails_through_st_image(tmp_path):
+    thumb = tmp_path / "a.jpg"
+    Image.new("RGB", (4, 6)).save(thumb, format="JPEG")
+    for trailer in (None, "abc"):
+        at = AppTest.from_function(_render, args=(str(thumb), trailer)).run()
+        assert len(at.get("imgs")) == 1
+        assert not any("data:image" in m.value for m in at.markdown)
+        assert any("youtube.com/watch?v=abc" in m.value for m in at.markdown) == bool(trailer)
+
+
+def test_evicted_thumb_falls_back_to_the_remote_poster(tmp_path):
+    at = AppTest.from_function(_render, args=(str(tmp_path / "gone.jpg"), "abc")).run()
+    assert len(at.get("imgs")) == 0
+    assert any(cards.poster_url("/alien.jpg") in m.value for m in at.markdown)
+
+
+def test_collect_stops_waiting_at_the_deadline():
+    done, stuck = Future(), Future()
+    done.set_result("/tmp/a.jpg")
+    started = time.monotonic()
+    assert posters.collect({"/a.jpg": done, "/b.jpg": stuck}, timeout=0.05) == {"/a.jpg": "/tmp/a.jpg", "/b.jpg": None}
+    assert time.monotonic() - started < 1.0
+
+
+def test_poster_within_gives_up_on_a_slow_fetch(tmp_path, monkeypatch):
+    cache = posters.PosterCache(root=str(tmp_path))
+    release = threading.Event()
+    monkeypatch.setattr(cache, "get", lambda path, width: release.wait(5) and None)
+    monkeypatch.setattr(posters, "_cache", cache)
+    started = time.monotonic()
+    assert posters.poster_within("/alien.jpg", width=500, timeout=0.05) is None
+    assert time.monotonic() - started < 1.0
+    release.set()
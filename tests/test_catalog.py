@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+import catalog
+
+
+def test_has_movies_does_not_create_the_catalog(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.db")
+    monkeypatch.setattr(catalog, "CATALOG_PATH", path)
+    assert not catalog.has_movies()
+    assert not os.path.exists(path)
+
+
+def test_has_movies_after_ingest(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.db")
+    monkeypatch.setattr(catalog, "CATALOG_PATH", path)
+    catalog.get_conn()
+    assert not catalog.has_movies()
+    catalog.upsert_movies([{"id": 1, "title": "Alien"}])
+    assert catalog.has_movies()
+
+
+MOVIES = [
+    {"id": 1, "title": "Star Wars", "original_title": "Star Wars", "overview": "A farm boy joins a rebellion.",
+     "popularity": 80.0},
+    {"id": 2, "title": "Star Trek", "original_title": "Star Trek", "overview": "A starship crew.", "popularity": 60.0},
+    {"id": 3, "title": "The Wars of the Roses", "original_title": "The Wars of the Roses",
+     "overview": "A divorce turns into war among the stars.", "popularity": 5.0},
+    {"id": 4, "title": "Amélie", "original_title": "Le Fabuleux Destin d'Amélie Poulain",
+     "overview": "A shy waitress.", "popularity": 30.0},
+    {"id": 5, "title": "Lost Stars", "original_title": "Lost Stars", "overview": "", "popularity": 1.0},
+]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = catalog.get_conn(str(tmp_path / "catalog.db"))
+    catalog.upsert_movies(MOVIES, conn=conn)
+    return conn
+
+
+def ids(movies):
+    return [m["id"] for m in movies]
+
+
+def test_search_requires_every_word_last_as_prefix(conn):
+    assert ids(catalog.search_movies("star wars", conn=conn)) == [1]
+    assert ids(catalog.search_movies("star wa", conn=conn)) == [1]
+    assert set(ids(catalog.search_movies("sta", conn=conn))) == {1, 2, 5}
+    assert catalog.search_movies("zzz", conn=conn) == []
+    assert catalog.search_movies("  !! ", conn=conn) == []
+
+
+def test_title_matches_rank_by_bm25_then_popularity(conn):
+    # Equal title matches: the more popular film first
+    assert ids(catalog.search_movies("star", conn=conn)) == [1, 2, 5]
+    # Overview-only matches are left out unless asked for
+    assert catalog.search_movies("rebellion", conn=conn) == []
+    assert ids(catalog.search_movies("rebellion", include_overview=True, conn=conn)) == [1]
+    # and a title match outranks more popular overview matches ("stars"* also matches "starship")
+    assert ids(catalog.search_movies("stars", include_overview=True, conn=conn)) == [5, 2, 3]
+
+
+def test_original_titles_and_accents(conn):
+    assert ids(catalog.search_movies("fabuleux dest", conn=conn)) == [4]
+    assert ids(catalog.search_movies("amelie", conn=conn)) == [4]
+
+
+def test_user_input_is_not_parsed_as_fts_syntax(conn):
+    assert catalog.fts_query('star OR "wars') == '"star" "OR" "wars"*'
+    assert catalog.search_movies("star OR trek", conn=conn) == []
+    assert ids(catalog.search_movies("star NEAR", conn=conn)) == []
+
+
+def test_updates_and_deletes_reach_the_index(conn):
+    catalog.upsert_movies([{"id": 2, "title": "Galaxy Quest", "popularity": 60.0}], conn=conn)
+    assert 2 not in ids(catalog.search_movies("star", conn=conn))
+    assert ids(catalog.search_movies("galaxy", conn=conn)) == [2]
+    catalog.delete_movies([1], conn=conn)
+    assert ids(catalog.search_movies("star", conn=conn)) == [5]
+
+
+def test_paging(conn):
+    first = ids(catalog.search_movies("star", page=1, page_size=2, conn=conn))
+    second = ids(catalog.search_movies("star", page=2, page_size=2, conn=conn))
+    assert first + second == [1, 2, 5]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import collab
+import db
+import metrics
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(db, "_initialized", set())
+    return db.get_conn()
+
+
+def test_iter_interactions_weights_and_skips_dislikes(app_db):
+    db.rate_movie(1, 10, 4.0)
+    db.record_watch(1, 10)
+    db.record_watch(1, 10)
+    db.add_to_watchlist(1, 11)
+    db.rate_movie(1, 12, 2.0)    # a dislike: no interest
+    db.rate_movie(2, 12, 2.0)
+    db.record_watch(2, 12)       # ... though the watch still counts
+    assert sorted(db.iter_interactions()) == [(1, 10, 6.0), (1, 11, 0.5), (2, 12, 1.0)]
+
+
+def test_iter_interactions_is_timed(app_db):
+    list(db.iter_interactions())
+    assert ("iter_interactions",) in metrics.DB_QUERY_SECONDS.series()
+
+
+def test_interactions_from_db(app_db):
+    db.rate_movie(7, 3, 5.0)
+    db.add_to_watchlist(8, 4)
+    data = collab.Interactions.from_db()
+    assert data.shape == (2, 2) and data.nnz == 2
+    assert list(data.user_ids) == [7, 8] and list(data.item_ids) == [3, 4]
+
+
+def hit_rate(recommend, held_out, n=10):
+    return np.mean([item in [mid for mid, _ in recommend(user, n)] for user, item in held_out.items()])
+
+
+def test_als_ranks_held_out_items_above_popularity():
+    users, items, ratings, _ = collab.synthetic_interactions(n_users=600, n_items=400, n_ratings=15_000,
+                                                             n_clusters=10, seed=3)
+    # Hold out one interaction per user with enough history
+    rng = np.random.default_rng(0)
+    held_out, keep = {}, np.ones(len(users), dtype=bool)
+    for user in np.unique(users):
+        rows = np.flatnonzero(users == user)
+        if len(rows) >= 8:
+            row = rng.choice(rows)
+            held_out[int(user)] = int(items[row])
+            keep[row] = False
+    data = collab.Interactions(users[keep], items[keep], ratings[keep])
+    model = collab.ALSModel(factors=16, iterations=8, workers=2).fit(data)
+
+    counts = np.bincount(np.searchsorted(data.item_ids, items[keep]), minlength=len(data.item_ids))
+    by_popularity = data.item_ids[np.argsort(-counts, kind="stable")]
+    seen = {int(u): set(items[keep][users[keep] == u].tolist()) for u in held_out}
+
+    def popular(user, n):
+        return [(int(mid), 0.0) for mid in by_popularity if mid not in seen[user]][:n]
+
+    als, pop = hit_rate(model.recommend, held_out), hit_rate(popular, held_out)
+    assert len(held_out) > 500
+    assert als > 1.5 * pop, (als, pop)
@@ -0,0 +1,125 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import catalog
+import credit_index
+import vecstore
+
+GENRES = [18, 27, 35, 878]
+
+
+@pytest.fixture(scope="module")
+def data():
+    # Sparse movie ids, a few prolific people, duplicate credits and credits for
+    # movies outside the catalog
+    rng = np.random.default_rng(0)
+    movie_ids = rng.choice(np.arange(1, 5000), 300, replace=False)
+    years = np.where(rng.random(300) < 0.1, 0, rng.integers(1970, 2024, 300))
+    popularity = rng.random(300).astype(np.float32) * 100
+    genres = {int(m): set(rng.choice(GENRES, rng.integers(0, 3), replace=False).tolist()) for m in movie_ids}
+    weights = 1.0 / np.arange(1, 41)
+    credit_people = rng.choice(np.arange(100, 140), 2500, p=weights / weights.sum())
+    credit_movies = np.concatenate([rng.choice(movie_ids, 2400), rng.integers(6000, 7000, 100)])
+    index = credit_index.CreditIndex.build(
+        movie_ids, years, popularity,
+        [m for m, gs in genres.items() for _ in gs], [g for gs in genres.values() for g in gs],
+        credit_people, credit_movies,
+    )
+    known = set(movie_ids.tolist())
+    movies_of = {}
+    for p, m in zip(credit_people.tolist(), credit_movies.tolist()):
+        if m in known:
+            movies_of.setdefault(p, set()).add(m)
+    info = {int(m): (int(y), float(pop)) for m, y, pop in zip(movie_ids, years, popularity)}
+    return index, movies_of, genres, info
+
+
+def brute(data, people=(), genres=(), year_min=None, year_max=None):
+    _, movies_of, movie_genres, info = data
+    found = set(info)
+    for p in people:
+        found &= movies_of.get(p, set())
+    found = {m for m in found if set(genres) <= movie_genres[m]}
+    if year_min is not None or year_max is not None:
+        found = {m for m in found if info[m][0] > 0 and (year_min is None or info[m][0] >= year_min)
+                 and (year_max is None or info[m][0] <= year_max)}
+    return found
+
+
+def ids(index, rows):
+    return set(index.movie_ids[rows].tolist())
+
+
+def test_person_rows_match_brute_force(data):
+    index, movies_of = data[0], data[1]
+    for person in range(95, 145):
+        rows = index.person_rows(person)
+        assert (np.diff(rows) > 0).all()
+        assert ids(index, rows) == movies_of.get(person, set())
+
+
+@pytest.mark.parametrize("gallop", [credit_index.GALLOP_RATIO, 1])
+def test_intersections_match_brute_force(data, monkeypatch, gallop):
+    monkeypatch.setattr(credit_index, "GALLOP_RATIO", gallop)
+    index = data[0]
+    people = [100, 101, 102, 110, 125, 139, 999]
+    for k in (2, 3):
+        for combo in itertools.combinations(people, k):
+            assert ids(index, index.rows(people=combo)) == brute(data, people=combo), combo
+
+
+def test_filters_match_brute_force(data):
+    index = data[0]
+    cases = [
+        {"genres": (27,)}, {"genres": (18, 35)}, {"genres": (12,)},
+        {"people": (100,), "genres": (878,)}, {"people": (100, 101), "genres": (18,)},
+        {"year_min": 2000}, {"year_max": 1985}, {"people": (100,), "year_min": 1990, "year_max": 2005},
+        {"people": (102,), "genres": (18, 27), "year_min": 1980}, {},
+    ]
+    for case in cases:
+        assert ids(index, index.rows(**case)) == brute(data, **case), case
+
+
+def test_query_orders_by_popularity_and_limits(data):
+    index, info = data[0], data[3]
+    expected = sorted(brute(data, people=(100,)), key=lambda m: -info[m][1])
+    assert index.query(people=(100,)) == expected
+    assert index.query(people=(100,), limit=5) == expected[:5]
+
+
+def test_genre_counts_and_year_range(data):
+    index, info = data[0], data[3]
+    counts = index.genre_counts(people=(101,), year_min=1990)
+    expected = {g: len(brute(data, people=(101,), genres=(g,), year_min=1990)) for g in GENRES}
+    assert counts == {g: c for g, c in expected.items() if c}
+    years = [info[m][0] for m in brute(data, people=(101,)) if info[m][0]]
+    assert index.year_range(people=(101,)) == (min(years), max(years))
+    assert index.year_range(people=(999,)) is None
+
+
+def test_save_and_load_round_trip(data, tmp_path):
+    index = data[0]
+    loaded = credit_index.CreditIndex.load(
+        vecstore.Version(index.save(root=str(tmp_path)).path))
+    assert loaded.query(people=(100, 101), genres=(18,)) == index.query(people=(100, 101), genres=(18,))
+
+
+def test_build_from_catalog_matches_person_movie_credits(tmp_path):
+    conn = catalog.get_conn(str(tmp_path / "catalog.db"))
+    cast = [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]
+    for movie_id, people, genres, date in [(10, cast, [18], "1999-01-01"), (11, cast[:1], [27], "2005-06-01"),
+                                           (12, cast[1:], [18, 27], None)]:
+        catalog.upsert_movie_details({"id": movie_id, "title": f"M{movie_id}", "genre_ids": genres,
+                                      "release_date": date, "popularity": float(movie_id),
+                                      "credits": {"cast": people, "crew": [{"id": 3, "job": "Director"}]}},
+                                     conn=conn)
+    index = credit_index.build_from_catalog(conn)
+    for person in (1, 2, 3):
+        expected = {m["id"] for m in catalog.person_movie_credits(person, conn=conn)}
+        assert set(index.query(people=(person,))) == expected
+    assert index.query(people=(1, 2)) == [10]
+    assert index.query(people=(3,)) == [12, 11, 10]
+    assert index.query(people=(2,), genres=(27,)) == [12]
+    assert index.query(people=(1,), year_min=2000) == [11]
@@ -0,0 +1,100 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "app.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(db, "_initialized", set())
+    return path
+
+
+def logging_migrations(versions):
+    # Each migration records itself, so the order and count of applications show up in the data
+    return [(v, ["CREATE TABLE IF NOT EXISTS applied (version INTEGER)",
+                 f"INSERT INTO applied (version) VALUES ({v})"]) for v in versions]
+
+
+def applied(path):
+    conn = sqlite3.connect(path)
+    try:
+        return ([r[0] for r in conn.execute("SELECT version FROM applied ORDER BY rowid")],
+                [r[0] for r in conn.execute("SELECT version FROM schema_migrations ORDER BY version")])
+    finally:
+        conn.close()
+
+
+def test_app_schema_is_created(app_db):
+    conn = db.get_conn()
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"users", "ratings", "watch_history", "watchlist", "feeds"} <= tables
+    assert db.schema_version(conn) == db.MIGRATIONS[-1][0]
+
+
+def test_migrations_apply_in_order_and_only_new_ones_run(app_db, monkeypatch):
+    monkeypatch.setattr(db, "MIGRATIONS", logging_migrations([1, 2]))
+    db.get_conn()
+    assert applied(app_db) == ([1, 2], [1, 2])
+
+    # A later release appends migrations; a new process applies just those
+    monkeypatch.setattr(db, "MIGRATIONS", logging_migrations([1, 2, 3, 4]))
+    monkeypatch.setattr(db, "_initialized", set())
+    db.get_conn()
+    assert applied(app_db) == ([1, 2, 3, 4], [1, 2, 3, 4])
+
+
+def test_rerun_is_a_noop(app_db, monkeypatch):
+    monkeypatch.setattr(db, "MIGRATIONS", logging_migrations([1, 2, 3]))
+    conn = db.get_conn()
+    db.run_migrations(conn, app_db)  # already done in this process
+    monkeypatch.setattr(db, "_initialized", set())
+    db.run_migrations(conn, app_db)  # as a fresh process would
+    assert applied(app_db) == ([1, 2, 3], [1, 2, 3])
+
+
+def test_failed_migration_rolls_back(app_db, monkeypatch):
+    monkeypatch.setattr(db, "MIGRATIONS", logging_migrations([1]) + [(2, ["CREATE TABLE broken (", ])])
+    with pytest.raises(sqlite3.OperationalError):
+        db.get_conn()
+    monkeypatch.setattr(db, "MIGRATIONS", logging_migrations([1, 2]))
+    db.get_conn()
+    assert applied(app_db) == ([1, 2], [1, 2])
+
+
+def test_other_databases_are_not_migrated(app_db, tmp_path):
+    other = str(tmp_path / "other.db")
+    conn = db.get_conn(other)
+    assert conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+    conn = db.get_conn(other, migrate=True)
+    assert db.schema_version(conn) == db.MIGRATIONS[-1][0]
+
+
+def _first_start(path, barrier, errors):
+    db.DB_PATH = path
+    barrier.wait()
+    try:
+        db.get_conn()
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def test_concurrent_first_start(app_db, monkeypatch):
+    # Several processes opening a fresh database at once: BEGIN IMMEDIATE makes
+    # all but one wait, and they then find the migrations already applied.
+    monkeypatch.setattr(db, "MIGRATIONS", logging_migrations([1, 2, 3]))
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(6)
+    errors = ctx.Queue()
+    procs = [ctx.Process(target=_first_start, args=(app_db, barrier, errors)) for _ in range(6)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    assert all(p.exitcode == 0 for p in procs)
+    assert errors.empty()
+    assert applied(app_db) == ([1, 2, 3], [1, 2, 3])
@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+import catalog
+import facets
+import vecstore
+
+GENRES = [18, 27, 35, 878, 99]
+LANGUAGES = ["en", "fr", "ja", None]
+
+
+@pytest.fixture(scope="module")
+def movies():
+    rng = np.random.default_rng(0)
+    out = []
+    for i in range(2000):
+        year = 0 if rng.random() < 0.05 else int(rng.integers(1950, 2024))
+        out.append({
+            "id": int(10 * i + rng.integers(0, 10)),
+            "released": year * 10000 + int(rng.integers(1, 13)) * 100 + int(rng.integers(1, 29)) if year else 0,
+            "vote_average": round(float(rng.random() * 10), 1),
+            "vote_count": int(rng.integers(0, 5000)),
+            "popularity": float(rng.random() * 100),
+            "runtime": 0 if rng.random() < 0.05 else int(rng.integers(60, 200)),
+            "language": LANGUAGES[int(rng.integers(0, len(LANGUAGES)))],
+            "genres": sorted(rng.choice(GENRES, int(rng.integers(0, 3)), replace=False).tolist()),
+        })
+    return out
+
+
+@pytest.fixture(scope="module")
+def index(movies):
+    return facets.FacetIndex.build(
+        [m["id"] for m in movies], [m["released"] for m in movies], [m["vote_average"] for m in movies],
+        [m["vote_count"] for m in movies], [m["popularity"] for m in movies], [m["runtime"] for m in movies],
+        [m["language"] for m in movies], [m["genres"] for m in movies],
+    )
+
+
+def within(value, bounds):
+    lo, hi = bounds
+    return (lo is None or value >= lo) and (hi is None or value <= hi)
+
+
+def matches(m, genres=(), year=(None, None), rating=(None, None), votes=(None, None), runtime=(None, None),
+            languages=(), skip=None):
+    checks = {
+        "genres": set(genres) <= set(m["genres"]),
+        "year": year == (None, None) or (m["released"] > 0 and within(m["released"] // 10000, year)),
+        "rating": within(m["vote_average"], rating),
+        "votes": within(m["vote_count"], votes),
+        "runtime": runtime == (None, None) or (m["runtime"] > 0 and within(m["runtime"], runtime)),
+        "languages": not languages or m["language"] in languages,
+    }
+    return all(ok for name, ok in checks.items() if name != skip)
+
+
+def brute_search(movies, sort, **filters):
+    column, descending = facets.SORTS[sort]
+    rows = [i for i, m in enumerate(movies) if matches(m, **filters)]
+
+    def key(i):
+        value = movies[i][column]
+        if column == "released" and not value:
+            return (1, i)  # undated last either way
+        return (0, -value if descending else value, i)
+
+    return [movies[i]["id"] for i in sorted(rows, key=key)]
+
+
+FILTERS = [
+    {},
+    {"genres": (27,)},
+    {"genres": (18, 35)},
+    {"genres": (12,)},
+    {"year": (2010, None)},
+    {"year": (1990, 1999), "rating": (7, None)},
+    {"votes": (4900, None)},                           # narrow: sorts just the matches
+    {"runtime": (90, 120), "languages": ("fr", "ja")},
+    {"genres": (99,), "year": (None, 1970), "votes": (100, 3000)},
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("sort", list(facets.SORTS))
+def test_search_matches_brute_force(movies, index, filters, sort):
+    expected = brute_search(movies, sort, **filters)
+    total, first = index.search(sort, offset=0, limit=20, **filters)
+    assert total == len(expected)
+    assert first == expected[:20]
+    _, later = index.search(sort, offset=40, limit=20, **filters)
+    assert later == expected[40:60]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_counts_match_brute_force(movies, index, filters):
+    counts = index.counts(**filters)
+    assert counts["total"] == sum(matches(m, **filters) for m in movies)
+    for g in GENRES:
+        assert counts["genres"].get(g, 0) == sum(matches(m, **filters) and g in m["genres"] for m in movies)
+    for lang in ("en", "fr", "ja"):
+        expected = sum(matches(m, skip="languages", **filters) and m["language"] == lang for m in movies)
+        assert counts["languages"].get(lang, 0) == expected
+    for decade in range(1950, 2030, 10):
+        expected = sum(matches(m, skip="year", **filters) and m["released"] and m["released"] // 100000 * 10 == decade
+                       for m in movies)
+        assert counts["decades"].get(decade, 0) == expected
+    for bucket in range(10):
+        expected = sum(matches(m, skip="rating", **filters) and min(int(m["vote_average"]), 9) == bucket
+                       for m in movies)
+        assert counts["ratings"].get(bucket, 0) == expected
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    loaded = facets.FacetIndex.load(vecstore.Version(index.save(root=str(tmp_path)).path))
+    assert loaded.search("newest", genres=(27,), limit=50) == index.search("newest", genres=(27,), limit=50)
+    assert loaded.counts(year=(2000, None)) == index.counts(year=(2000, None))
+
+
+def test_build_from_catalog_skips_adult_titles(tmp_path):
+    conn = catalog.get_conn(str(tmp_path / "catalog.db"))
+    catalog.upsert_movies([
+        {"id": 1, "title": "A", "release_date": "2001-02-03", "genre_ids": [27], "popularity": 5.0},
+        {"id": 2, "title": "B", "release_date": "", "genre_ids": [27, 18], "popularity": 9.0},
+        {"id": 3, "title": "C", "adult": True, "genre_ids": [27]},
+    ], conn=conn)
+    index = facets.build_from_catalog(conn)
+    assert index.search("popularity", genres=(27,)) == (2, [2, 1])
+    assert index.search("newest") == (2, [1, 2])
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+
+import pytest
+
+import catalog
+import feed
+import tmdb
+
+
+@pytest.fixture
+def no_catalog(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.db")
+    monkeypatch.setattr(catalog, "CATALOG_PATH", path)
+    return path
+
+
+def test_popular_falls_back_to_trending_without_creating_the_catalog(no_catalog, monkeypatch):
+    monkeypatch.setattr(tmdb, "trending", lambda period: [{"id": 1, "title": "A"}, {"id": 2, "title": "B"}])
+    assert list(feed.popular(exclude={1})) == [2]
+    assert not os.path.exists(no_catalog)
+
+
+def test_popular_reads_the_catalog(no_catalog, monkeypatch):
+    monkeypatch.setattr(tmdb, "trending", lambda period: pytest.fail("catalog has movies"))
+    catalog.upsert_movies([
+        {"id": 1, "title": "A", "vote_count": 500, "popularity": 10.0},
+        {"id": 2, "title": "B", "vote_count": 500, "popularity": 30.0},
+        {"id": 3, "title": "C", "vote_count": 5, "popularity": 50.0},     # too few votes
+        {"id": 4, "title": "D", "vote_count": 500, "popularity": 20.0},
+    ])
+    assert list(feed.popular(exclude={4})) == [2, 1]
+
+
+def wait_until_idle(user_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while feed.is_pending(user_id):
+        assert time.monotonic() < deadline, "feed refresh never finished"
+        time.sleep(0.01)
+
+
+def test_pending_flag_is_cleared_when_a_build_raises(monkeypatch):
+    calls = []
+
+    def broken(user_id):
+        calls.append(user_id)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(feed, "build_feed", broken)
+    feed.refresh_async(41)
+    wait_until_idle(41)
+    feed.refresh_async(41)  # not swallowed as "already building"
+    wait_until_idle(41)
+    assert calls == [41, 41]
+
+
+def test_requests_during_a_build_get_one_more_pass(monkeypatch):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow(user_id):
+        calls.append(user_id)
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(feed, "build_feed", slow)
+    feed.refresh_async(42)
+    assert started.wait(5)
+    feed.refresh_async(42)
+    feed.refresh_async(42)
+    release.set()
+    wait_until_idle(42)
+    assert calls == [42, 42]
@@ -0,0 +1,130 @@
+import gzip
+import json
+
+import pytest
+
+import catalog
+import ingest
+import tmdb
+
+
+def write_export(path, records):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+
+
+@pytest.fixture
+def conn(tmp_path):
+    return catalog.get_conn(str(tmp_path / "catalog.db"))
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    # /movie/{id} answers: a payload, or a TMDBError status to raise
+    answers = {}
+    calls = []
+
+    def get(path, params=None, cache=True, swr=False):
+        movie_id = int(path.rsplit("/", 1)[1])
+        calls.append(movie_id)
+        answer = answers.get(movie_id, {"id": movie_id, "title": f"Movie {movie_id}",
+                                        "credits": {"cast": [{"id": 900 + movie_id, "name": "Someone"}]}})
+        if isinstance(answer, int):
+            raise tmdb.TMDBError("failed", status=answer)
+        return answer
+
+    monkeypatch.setattr(tmdb, "_get", get)
+    return answers, calls
+
+
+def test_iter_export_ids_streams_gzip_json_lines(tmp_path):
+    path = str(tmp_path / "movie_ids.json.gz")
+    write_export(path, [
+        {"id": 1, "popularity": 5.0},
+        {"id": 2, "popularity": 0.1},
+        {"id": 3, "adult": True, "popularity": 9.0},
+        {"id": 4, "video": True, "popularity": 9.0},
+        {"id": 5, "popularity": 7.0},
+    ])
+    assert list(ingest.iter_export_ids(path)) == [(1, 1), (2, 2), (5, 5)]
+    assert list(ingest.iter_export_ids(path, min_popularity=1.0)) == [(1, 1), (5, 5)]
+    assert list(ingest.iter_export_ids(path, include_adult=True)) == [(1, 1), (2, 2), (3, 3), (5, 5)]
+    # Positions are line numbers, so a resume skips by line
+    assert list(ingest.iter_export_ids(path, skip=2)) == [(5, 5)]
+
+
+def test_iter_export_ids_reads_plain_files_and_skips_blank_lines(tmp_path):
+    path = tmp_path / "movie_ids.json"
+    path.write_text('{"id": 1}\n\n{"id": 2}\n')
+    assert list(ingest.iter_export_ids(str(path))) == [(1, 1), (3, 2)]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "ingest.checkpoint.json")
+    ingest.Checkpoint(path, "a.json.gz").save(120, 100)
+    resumed = ingest.Checkpoint(path, "a.json.gz")
+    assert (resumed.position, resumed.done) == (120, 100)
+    # A checkpoint for another source is ignored
+    other = ingest.Checkpoint(path, "b.json.gz")
+    assert (other.position, other.done) == (0, 0)
+
+
+def test_interrupted_run_resumes_after_last_batch(tmp_path, conn, upstream):
+    _, calls = upstream
+    export = str(tmp_path / "movie_ids.json.gz")
+    write_export(export, [{"id": i} for i in range(1, 11)])
+    ckpt_path = str(tmp_path / "ingest.checkpoint.json")
+
+    def interrupt(stats):
+        if stats["seen"] >= 4:
+            raise KeyboardInterrupt
+
+    checkpoint = ingest.Checkpoint(ckpt_path, export)
+    with pytest.raises(KeyboardInterrupt):
+        ingest.Ingester(workers=2, rate=None, batch_size=4, conn=conn).run(
+            ingest.iter_export_ids(export, skip=checkpoint.position), checkpoint=checkpoint, progress=interrupt)
+    assert sorted(calls) == [1, 2, 3, 4]
+
+    checkpoint = ingest.Checkpoint(ckpt_path, export)
+    assert (checkpoint.position, checkpoint.done) == (4, 4)
+    stats = ingest.Ingester(workers=2, rate=None, batch_size=4, conn=conn).run(
+        ingest.iter_export_ids(export, skip=checkpoint.position), checkpoint=checkpoint)
+    assert sorted(calls) == list(range(1, 11))
+    assert stats["fetched"] == 6
+    assert checkpoint.done == 10
+    assert catalog.existing_movie_ids(range(1, 11), conn=conn) == set(range(1, 11))
+
+
+def test_404_deletes_the_movie(conn, upstream):
+    answers, _ = upstream
+    catalog.upsert_movie_details({"id": 7, "title": "Gone", "credits": {"cast": [{"id": 70, "name": "Actor"}]}},
+                                 conn=conn)
+    answers[7] = 404
+    stats = ingest.Ingester(workers=2, rate=None, conn=conn).run([(1, 7), (2, 8)])
+    assert stats["missing"] == 1 and stats["fetched"] == 1
+    assert catalog.existing_movie_ids([7, 8], conn=conn) == {8}
+    assert conn.execute("SELECT COUNT(*) FROM credits WHERE movie_id = 7").fetchone()[0] == 0
+
+
+def test_failures_go_to_the_side_file(tmp_path, conn, upstream):
+    answers, _ = upstream
+    answers[2] = 500
+    answers[3] = 429
+    failed_path = tmp_path / "failed.jsonl"
+    checkpoint = ingest.Checkpoint(str(tmp_path / "ingest.checkpoint.json"), "src")
+    stats = ingest.Ingester(workers=2, rate=None, conn=conn, failed_path=str(failed_path)).run(
+        [(1, 1), (2, 2), (3, 3)], checkpoint=checkpoint)
+    assert stats["failed"] == 2 and stats["fetched"] == 1
+    assert [json.loads(line) for line in failed_path.read_text().splitlines()] == [{"id": 2}, {"id": 3}]
+    # The checkpoint still moves past them
+    assert checkpoint.position == 3
+    assert catalog.existing_movie_ids([1, 2, 3], conn=conn) == {1}
+
+
+def test_only_new_skips_known_ids(conn, upstream):
+    _, calls = upstream
+    catalog.upsert_movies([{"id": 1, "title": "Known"}], conn=conn)
+    stats = ingest.Ingester(workers=2, rate=None, only_new=True, conn=conn).run([(1, 1), (2, 2)])
+    assert calls == [2]
+    assert stats["skipped"] == 1
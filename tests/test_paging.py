@@ -0,0 +1,99 @@
+import threading
+
+import paging
+import tmdb
+
+
+class Pages:
+    # fetch_page stub over fixed result pages, recording which pages were asked for
+    def __init__(self, pages, fail=()):
+        self.pages = pages
+        self.fail = set(fail)  # pages that raise once
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, page):
+        with self.lock:
+            self.calls.append(page)
+            if page in self.fail:
+                self.fail.discard(page)
+                raise tmdb.TMDBError("throttled", status=429)
+        if page > len(self.pages):
+            return []
+        return [{"id": i, "title": f"Movie {i}"} for i in self.pages[page - 1]]
+
+
+def ids(pager):
+    return list(pager.movies.ids)
+
+
+def full(start):
+    return list(range(start, start + paging.PAGE_SIZE))
+
+
+def test_pages_append_deduplicated_and_stop_at_a_short_page():
+    fetch = Pages([full(0), full(10), [100, 101]])
+    pager = paging.Pager(fetch, prefetch=False)
+    assert [m["id"] for m in pager.load_more()] == full(0)
+    assert [m["id"] for m in pager.load_more()] == list(range(20, 30))  # 10-19 already shown
+    assert pager.has_more
+    assert len(pager.load_more()) == 2
+    assert ids(pager) == list(range(30)) + [100, 101]
+    assert pager.load_more() == [] and not pager.has_more
+    assert fetch.calls == [1, 2, 3]
+
+
+def test_stops_at_an_empty_page_and_at_max_pages():
+    pager = paging.Pager(Pages([full(0)]), prefetch=False)
+    pager.load_more()
+    assert pager.load_more() == [] and not pager.has_more
+
+    fetch = Pages([full(0), full(20), full(40)])
+    pager = paging.Pager(fetch, max_pages=2, prefetch=False)
+    while pager.load_more():
+        pass
+    assert len(pager.movies) == 40 and fetch.calls == [1, 2]
+
+
+def test_next_page_is_prefetched():
+    fetch = Pages([full(0), [20, 21]])
+    pager = paging.Pager(fetch)
+    pager.load_more()
+    pager._next.result(timeout=5)
+    assert fetch.calls == [1, 2]
+    assert [m["id"] for m in pager.load_more()] == [20, 21]
+    # The prefetch after a short page already knows it was the last one
+    pager._next.result(timeout=5)
+    assert not pager.has_more
+    assert fetch.calls == [1, 2]
+
+
+def test_failed_page_is_retried_on_the_next_load():
+    fetch = Pages([full(0), full(20), [40]], fail={2})
+    pager = paging.Pager(fetch, prefetch=False)
+    pager.load_more()
+    assert pager.load_more() == [] and isinstance(pager.error, tmdb.TMDBError)
+    assert pager.has_more
+    assert [m["id"] for m in pager.load_more()] == full(20)
+    assert pager.error is None
+    assert fetch.calls == [1, 2, 2]
+
+
+def test_cached_pager_keeps_pagers_and_evicts_the_least_recently_used():
+    pagers, fetches = {}, {}
+
+    def get(key):
+        fetches.setdefault(key, Pages([[1]]))  # one short page: nothing to prefetch
+        return paging.cached_pager(pagers, key, fetches[key], limit=3)
+
+    first = get("a")
+    assert fetches["a"].calls == [1]
+    assert get("a") is first and fetches["a"].calls == [1]  # reused, not refetched
+    get("b")
+    get("c")
+    get("a")  # a is now the most recently used
+    get("d")  # evicts b
+    assert list(pagers) == ["c", "a", "d"]
+    assert get("b") is not None and fetches["b"].calls == [1, 1]
+    assert list(pagers) == ["a", "d", "b"]
+
@@ -0,0 +1,113 @@
+import io
+import os
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import posters
+
+
+def jpeg(width, height, colour=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), colour).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class ImageServer(ThreadingHTTPServer):
+    # Serves `images` ({url path: bytes}) and counts requests per path
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.images = {}
+        self.status = {}  # url path -> status to fail with
+        self.requests = Counter()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/t/p"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        body = self.server.images.get(self.path, b"")
+        status = self.server.status.get(self.path, 200 if self.path in self.server.images else 404)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body) if status == 200 else 0))
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    srv = ImageServer()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path, server):
+    return posters.PosterCache(root=str(tmp_path / "posters"), image_base=server.base)
+
+
+def source(path):
+    return f"/t/p/{posters.POSTER_SOURCE_SIZE}{path}"
+
+
+def test_miss_fetches_and_resizes_then_hits(cache, server):
+    server.images[source("/a.jpg")] = jpeg(600, 900)
+    path = cache.get("/a.jpg", width=300)
+    assert path and os.path.exists(path)
+    with Image.open(path) as img:
+        assert img.size == (300, 450)
+    assert cache.get("/a.jpg", width=300) == path
+    assert server.requests[source("/a.jpg")] == 1
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_same_image_under_two_paths_is_stored_once(cache, server):
+    server.images[source("/a.jpg")] = server.images[source("/b.jpg")] = jpeg(400, 600)
+    assert cache.get("/a.jpg", width=200) == cache.get("/b.jpg", width=200)
+    assert cache.stats()["files"] == 1
+    # Each width is a file of its own
+    assert cache.get("/a.jpg", width=100) != cache.get("/a.jpg", width=200)
+    assert cache.stats()["files"] == 2
+
+
+def test_failures_are_remembered_for_a_while(cache, server, monkeypatch):
+    assert cache.get("/missing.jpg") is None
+    assert cache.get("/missing.jpg") is None
+    assert server.requests[source("/missing.jpg")] == 1
+    assert cache.stats()["failures"] == 1 and cache.stats()["skipped"] == 1
+
+    monkeypatch.setattr(posters, "POSTER_FAILURE_TTL", 0.0)
+    server.images[source("/late.jpg")] = b"not a jpeg"
+    assert cache.get("/late.jpg") is None
+    server.images[source("/late.jpg")] = jpeg(300, 450)
+    assert cache.get("/late.jpg") is not None
+
+
+def test_server_errors_are_not_retried(cache, server):
+    server.images[source("/a.jpg")] = jpeg(300, 450)
+    server.status[source("/a.jpg")] = 503
+    assert cache.get("/a.jpg") is None
+    assert server.requests[source("/a.jpg")] == 1
+
+
+def test_prefetch(cache, server):
+    for name, colour in (("/a.jpg", (255, 0, 0)), ("/b.jpg", (0, 255, 0)), ("/c.jpg", (0, 0, 255))):
+        server.images[source(name)] = jpeg(300, 450, colour)
+    found = cache.prefetch(["/a.jpg", "/b.jpg", "/c.jpg", "/gone.jpg", None, "/a.jpg"])
+    assert set(found) == {"/a.jpg", "/b.jpg", "/c.jpg", "/gone.jpg"}
+    assert found["/gone.jpg"] is None and all(found[p] for p in ("/a.jpg", "/b.jpg", "/c.jpg"))
+    assert len(set(found.values())) == 4
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+import ratelimit
+from ratelimit import BACKGROUND, INTERACTIVE, PREFETCH, RateLimiter, SingleFlight
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+def test_priority_ordering():
+    limiter = RateLimiter(rate=50, burst=1)
+    limiter.pause(0.2)
+    order = []
+    threads = []
+    # Lowest priority arrives first; each waiter queues before the next starts
+    for level in (BACKGROUND, PREFETCH, INTERACTIVE):
+        t = threading.Thread(target=lambda p=level: (limiter.acquire(p), order.append(p)))
+        t.start()
+        threads.append(t)
+        wait_for(lambda n=len(threads): limiter.stats()["queue_depth"] == n)
+    for t in threads:
+        t.join(5)
+    assert order == [INTERACTIVE, PREFETCH, BACKGROUND]
+
+
+def test_same_priority_is_first_come_first_served():
+    limiter = RateLimiter(rate=50, burst=1)
+    limiter.pause(0.1)
+    order = []
+    threads = []
+    for i in range(3):
+        t = threading.Thread(target=lambda i=i: (limiter.acquire(PREFETCH), order.append(i)))
+        t.start()
+        threads.append(t)
+        wait_for(lambda n=len(threads): limiter.stats()["queue_depth"] == n)
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2]
+
+
+def test_pause_holds_everyone_back():
+    limiter = RateLimiter(rate=1000, burst=10)
+    limiter.pause(0.2)
+    assert not limiter.try_acquire()
+    waited = limiter.acquire()
+    assert waited >= 0.18
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_pause_restarts_with_an_empty_bucket():
+    limiter = RateLimiter(rate=20, burst=20)
+    limiter.pause(0.05)
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    # Three tokens at 20/s after the pause, not a burst of 20
+    assert time.monotonic() - started >= 0.05 + 0.12
+
+
+def test_try_acquire_does_not_jump_the_queue():
+    limiter = RateLimiter(rate=20, burst=1)
+    limiter.pause(0.1)
+    t = threading.Thread(target=limiter.acquire)
+    t.start()
+    wait_for(lambda: limiter.stats()["queue_depth"] == 1)
+    assert not limiter.try_acquire()
+    t.join(5)
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", fn))) for _ in range(4)]
+    threads[0].start()
+    wait_for(lambda: flights.in_flight() == 1)
+    for t in threads[1:]:
+        t.start()
+    wait_for(lambda: flights.shared == 3)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert results == ["value"] * 4
+    assert calls == [1]
+
+
+def test_single_flight_propagates_errors_to_every_caller():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fn():
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("k", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    wait_for(lambda: flights.in_flight() == 1)
+    follower = threading.Thread(target=call)
+    follower.start()
+    wait_for(lambda: flights.shared == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+    # A failed call isn't remembered: the next caller runs fn again
+    assert flights.in_flight() == 0
+    assert flights.do("k", lambda: "ok") == "ok"
+    assert flights.leaders == 2
+
+
+@pytest.mark.parametrize("value, expected", [(None, 7.0), ("", 7.0), ("3", 3.0), ("-1", 0.0), ("soon", 7.0)])
+def test_retry_after_seconds(value, expected):
+    assert ratelimit.retry_after_seconds(value, 7.0) == expected
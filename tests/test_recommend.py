@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+import catalog
+import recommend
+import vecstore
+
+CLUSTERS = {
+    "space": ([878, 12], "astronaut orbit planet galaxy starship alien rocket moon station crew signal wormhole",
+              range(100, 106)),
+    "kitchen": ([35, 10749], "chef restaurant recipe kitchen dinner wine bakery critic menu market flavor sauce",
+                range(200, 206)),
+    "heist": ([80, 53], "vault robbery detective casino diamonds getaway alarm safe crooks police banker loot",
+              range(300, 306)),
+}
+
+
+def catalog_details(per_cluster=8, seed=0):
+    rng = np.random.default_rng(seed)
+    movies, movie_id = [], 1
+    for name, (genres, words, people) in CLUSTERS.items():
+        words, people = words.split(), list(people)
+        for _ in range(per_cluster):
+            cast = rng.choice(people, 3, replace=False)
+            movies.append({
+                "id": movie_id, "title": f"{name} {movie_id}", "overview": " ".join(rng.choice(words, 8)),
+                "genre_ids": genres, "release_date": "2001-01-01", "vote_average": 6.5, "vote_count": 100,
+                "credits": {"cast": [{"id": int(p), "name": f"p{p}"} for p in cast], "crew": []},
+            })
+            movie_id += 1
+    return movies
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = catalog.get_conn(str(tmp_path / "catalog.db"))
+    for details in catalog_details():
+        catalog.upsert_movie_details(details, conn=conn)
+    return conn
+
+
+def cluster(movie_id):
+    return (movie_id - 1) // 8
+
+
+def test_similar_movies_come_from_the_same_cluster(conn):
+    model = recommend.build_from_catalog(conn)
+    assert list(model.ids) == list(range(1, 25))
+    for movie_id in (1, 9, 17):
+        hits = model.similar(movie_id, k=5)
+        assert len(hits) == 5 and movie_id not in [m for m, _ in hits]
+        assert all(cluster(m) == cluster(movie_id) for m, _ in hits)
+
+
+def test_vector_for_details_matches_the_built_row(conn):
+    model = recommend.build_from_catalog(conn)
+    details = catalog_details()[10]
+    vec = model.vector_for_details(details)
+    assert float(vec @ model.matrix[model.rows_for([details["id"]])[0]]) == pytest.approx(1.0, abs=1e-4)
+
+
+def test_build_leaves_no_transaction_open(conn):
+    recommend.build_from_catalog(conn)
+    assert not conn.in_transaction
+    catalog.upsert_movies([{"id": 99, "title": "Late"}], conn=conn)
+    assert 99 in recommend.build_from_catalog(conn).ids
+
+
+def hashed_dense(docs, hashes, weights, n_docs):
+    return np.vstack([block for _, _, block in recommend._hashed_blocks(docs, hashes, weights, n_docs)])
+
+
+@pytest.mark.parametrize("n_docs", [40, 300])  # fewer rows than columns, and more
+def test_fit_basis_spans_the_top_singular_vectors(monkeypatch, n_docs):
+    monkeypatch.setattr(recommend, "HASH_DIM", 128)
+    monkeypatch.setattr(recommend, "CHUNK_ROWS", 64)
+    rng = np.random.default_rng(1)
+    docs = np.sort(rng.integers(0, n_docs, 20 * n_docs)).astype(np.int32)
+    hashes = rng.integers(0, 1 << 32, len(docs), dtype=np.uint64).astype(np.uint32)
+    weights = rng.random(len(docs))
+
+    basis = recommend._fit_basis(docs, hashes, weights, n_docs, 8)
+    top = np.linalg.svd(hashed_dense(docs, hashes, weights, n_docs), full_matrices=False)[2][:8].T
+    assert basis.shape == (128, 8)
+    np.testing.assert_allclose(np.linalg.svd(top.T @ basis, compute_uv=False), 1.0, atol=1e-3)
+
+
+def test_fit_basis_pads_when_rank_is_short(monkeypatch):
+    monkeypatch.setattr(recommend, "HASH_DIM", 64)
+    docs = np.array([0, 1, 2], dtype=np.int32)
+    hashes = np.array([1 << 20, 2 << 20, 3 << 20], dtype=np.uint32)
+    basis = recommend._fit_basis(docs, hashes, np.ones(3), 3, 8)
+    assert basis.shape == (64, 8)
+    assert np.count_nonzero(np.linalg.norm(basis, axis=0)) == 3
+
+
+def test_save_and_load_round_trip(conn, tmp_path):
+    root = str(tmp_path / "models")
+    model = recommend.build_from_catalog(conn)
+    model.save(root=root)
+    loaded = vecstore.Reloader(recommend.CONTENT_STORE, recommend.ContentModel.load, root=root).get()
+    assert np.array_equal(loaded.ids, model.ids)
+    assert loaded.similar(1, k=5) == model.similar(1, k=5)
+    details = catalog_details()[3]
+    np.testing.assert_allclose(loaded.vector_for_details(details), model.vector_for_details(details), atol=1e-6)
+
+
+def test_models_from_older_builds_are_not_loaded(tmp_path):
+    root = str(tmp_path)
+    version = vecstore.publish(recommend.CONTENT_STORE, {"vectors": ([1, 2], np.eye(2))},
+                               arrays={"idf": np.ones(4)}, meta={"rows": 2, "dim": 2}, root=root)
+    assert recommend.ContentModel.load(version) is None
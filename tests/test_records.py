@@ -0,0 +1,56 @@
+import pickle
+
+import cards
+from records import Movie, MovieBatch
+
+# What cards.py and the list views read off a movie
+CARD_FIELDS = ("id", "title", "original_title", "vote_average", "vote_count", "release_date", "overview",
+               "poster_path")
+
+RESULTS = [
+    {"id": 603, "title": "The Matrix", "original_title": "The Matrix", "overview": "A hacker learns the truth.",
+     "release_date": "1999-03-30", "poster_path": "/matrix.jpg", "backdrop_path": "/bg.jpg", "vote_average": 8.2,
+     "vote_count": 24000, "popularity": 85.125, "original_language": "en", "genre_ids": [28, 878], "adult": False,
+     "video": False},
+    {"id": 194, "title": "Amélie", "original_title": "Le Fabuleux Destin d'Amélie Poulain", "overview": "",
+     "release_date": "", "poster_path": None, "vote_average": 7.9, "vote_count": 11000, "popularity": 30.5,
+     "original_language": "fr", "genres": [{"id": 35, "name": "Comedy"}, {"id": 10749, "name": "Romance"}],
+     "runtime": 122},
+]
+
+
+def test_movie_round_trips_card_fields():
+    for data in RESULTS:
+        movie = Movie.from_tmdb(data)
+        for field in CARD_FIELDS:
+            # Missing and empty read back the same way, which is how the cards treat them
+            assert (movie.get(field) or None) == (data.get(field) or None), field
+        assert Movie.from_tmdb(movie.to_dict()) == movie
+        assert cards.card_html(movie) == cards.card_html(data)
+
+
+def test_batch_round_trips_card_fields():
+    batch = MovieBatch.from_tmdb(RESULTS)
+    assert len(batch) == 2
+    for data, movie in zip(RESULTS, batch):
+        assert movie == Movie.from_tmdb(data)
+        assert movie["vote_average"] == data["vote_average"]
+        assert cards.card_html(movie) == cards.card_html(data)
+    assert batch[1].genre_ids == (35, 10749)
+    assert batch[1].runtime == 122 and batch[0].runtime is None
+    assert batch.to_dicts() == [Movie.from_tmdb(d).to_dict() for d in RESULTS]
+    assert [m.id for m in batch[-1:]] == [194]
+
+
+def test_movies_are_hashable_by_id():
+    a = Movie.from_tmdb(RESULTS[0])
+    b = MovieBatch([RESULTS[0]])[0]
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b, Movie.from_tmdb(RESULTS[1])}) == 2
+    assert {a: "x"}[b] == "x"
+
+
+def test_unknown_fields_are_dropped():
+    movie = Movie.from_tmdb(RESULTS[0])
+    assert movie.get("video") is None and "video" not in movie.to_dict()
+    assert pickle.loads(pickle.dumps(movie)) == movie
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+import ratelimit
+import tmdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmarks"))
+from fake_tmdb import FakeTMDB, Fixtures  # noqa: E402
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    server = FakeTMDB(Fixtures.generate(n_movies=40, n_people=40)).start()
+    monkeypatch.setattr(tmdb, "TMDB_API_BASE", server.api_base)
+    monkeypatch.setattr(tmdb, "TMDB_API_KEY", "fake")
+    tmdb.reset_session()
+    yield server
+    tmdb.reset_session()
+    server.stop()
+
+
+@pytest.fixture
+def paused(monkeypatch):
+    # A fresh limiter that records pauses instead of sleeping through them
+    limiter = ratelimit.RateLimiter(1000, 1000)
+    seconds = []
+    monkeypatch.setattr(limiter, "pause", seconds.append)
+    monkeypatch.setattr(tmdb, "_limiter", limiter)
+    return seconds
+
+
+def test_fetch(fake, paused):
+    assert tmdb._fetch("/trending/movie/day", {})["results"]
+    assert fake.stats()["api_calls"] == 1
+    assert paused == []
+
+
+def test_429s_are_retried_once_each_by_fetch_not_urllib3(fake, paused):
+    fake.throttle_rate = 1.0
+    with pytest.raises(tmdb.TMDBError) as err:
+        tmdb._fetch("/trending/movie/day", {})
+    assert err.value.status == 429 and err.value.retry_after == 1.0
+    assert err.value.attempts == tmdb.TMDB_429_RETRIES + 1
+    assert fake.stats()["api_calls"] == tmdb.TMDB_429_RETRIES + 1
+    assert paused == [1.0] * tmdb.TMDB_429_RETRIES
+
+
+def test_gateway_errors_are_retried_by_urllib3(fake, paused, monkeypatch):
+    monkeypatch.setattr(tmdb, "RETRY_POLICY", tmdb.RETRY_POLICY.new(backoff_factor=0))
+    tmdb.reset_session()
+    fake.error_rate, fake.error_status = 1.0, 503
+    with pytest.raises(tmdb.TMDBError) as err:
+        tmdb._fetch("/trending/movie/day", {})
+    assert err.value.attempts == 1
+    assert fake.stats()["api_calls"] == tmdb.RETRY_POLICY.total + 1
+    assert paused == []
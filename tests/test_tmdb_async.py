@@ -0,0 +1,82 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import tmdb
+import tmdb_async
+from tmdb_cache import DiskCache, LRUCache, TieredCache
+
+
+class FakeTransport:
+    def __init__(self):
+        self.urls = []
+
+    async def get(self, url, params, headers):
+        self.urls.append(url)
+        return 200, {}, json.dumps({"id": int(url.rsplit("/", 1)[1])}).encode()
+
+    async def close(self):
+        pass
+
+
+class RecordingDisk(DiskCache):
+    # Notes which threads touch SQLite
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = []
+
+    def lookup(self, key):
+        self.threads.append(threading.get_ident())
+        return super().lookup(key)
+
+    def set(self, key, body, expires_at):
+        self.threads.append(threading.get_ident())
+        super().set(key, body, expires_at)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = TieredCache(memory=LRUCache(max_entries=2), disk=RecordingDisk(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(tmdb, "TMDB_API_KEY", "k" * 32)
+    monkeypatch.setattr(tmdb, "get_cache", lambda: store)
+    yield store
+    store.disk.close()
+
+
+def test_disk_tier_stays_off_the_event_loop(store):
+    transport = FakeTransport()
+
+    async def scenario():
+        client = tmdb_async.AsyncTMDB(transport=transport)
+        loop_thread = threading.get_ident()
+        for mid in (1, 2, 3):
+            assert await client.movie_details(mid) == {"id": mid}
+        # 1 was evicted from the LRU tier, so this one comes from disk
+        assert await client.movie_details(1) == {"id": 1}
+        # and this one from memory, without touching SQLite
+        before = len(store.disk.threads)
+        assert await client.movie_details(1) == {"id": 1}
+        assert len(store.disk.threads) == before
+        return loop_thread
+
+    loop_thread = asyncio.run(scenario())
+    assert len(transport.urls) == 3
+    assert store.stats()["disk_reads"] == 1
+    assert store.disk.threads and loop_thread not in store.disk.threads
+
+
+def test_memory_only_cache_is_used_inline(monkeypatch):
+    store = TieredCache()
+    monkeypatch.setattr(tmdb, "TMDB_API_KEY", "k" * 32)
+    monkeypatch.setattr(tmdb, "get_cache", lambda: store)
+    transport = FakeTransport()
+
+    async def scenario():
+        client = tmdb_async.AsyncTMDB(transport=transport)
+        return [await client.movie_details(5) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [{"id": 5}] * 3
+    assert len(transport.urls) == 1
+    assert store.stats()["hits"] == 2
@@ -0,0 +1,188 @@
+import threading
+import time
+
+import pytest
+
+import tmdb
+import tmdb_cache
+from tmdb_cache import DiskCache, LRUCache, TieredCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tmdb_cache.time, "time", clock)
+    return clock
+
+
+def test_lru_evicts_least_recently_used_by_count():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1, 0, 1)
+    cache.set("b", 2, 0, 1)
+    cache.lookup("a")
+    cache.set("c", 3, 0, 1)
+    assert cache.lookup("b") is None
+    assert cache.lookup("a")[0] == 1
+    assert cache.lookup("c")[0] == 3
+    assert cache.evictions == 1
+
+
+def test_lru_evicts_by_bytes_and_skips_oversized():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+    cache.set("a", 1, 0, 4)
+    cache.set("b", 2, 0, 4)
+    cache.set("c", 3, 0, 4)
+    assert cache.lookup("a") is None
+    assert cache.bytes == 8
+    cache.set("huge", 4, 0, 11)
+    assert cache.lookup("huge") is None
+    assert len(cache) == 2
+
+
+def test_lru_replacing_a_key_keeps_byte_count():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.set("a", 1, 0, 30)
+    cache.set("a", 2, 0, 10)
+    assert cache.bytes == 10
+    assert cache.lookup("a")[0] == 2
+
+
+def test_ttl_expiry(clock):
+    cache = TieredCache()
+    cache.set("/movie/1", {"id": 1}, ttl=60)
+    assert cache.get("/movie/1") == {"id": 1}
+    clock.now += 61
+    assert cache.get("/movie/1") is None
+    # Expired entries are still there for stale fallbacks
+    value, expires_at = cache.get_entry("/movie/1")
+    assert value == {"id": 1} and expires_at < clock.now
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["stale"] == 2
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.db"))
+    cache = TieredCache(memory=LRUCache(max_entries=1), disk=disk)
+    cache.set("a", {"v": 1}, ttl=60)
+    cache.set("b", {"v": 2}, ttl=60)
+    assert cache.memory.lookup("a") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["disk_reads"] == 1
+    # Promoted back into memory
+    assert cache.memory.lookup("a")[0] == {"v": 1}
+    disk.close()
+
+
+def test_invalidate_prefix_escapes_like_wildcards(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.db"))
+    cache = TieredCache(disk=disk)
+    cache.set("/movie/1_", 1, ttl=60)
+    cache.set("/movie/12", 2, ttl=60)
+    assert cache.invalidate("/movie/1_") == 2  # one per tier
+    assert cache.get("/movie/12") == 2
+    disk.close()
+
+
+def test_ttl_for_first_matching_prefix():
+    assert tmdb_cache.ttl_for("/movie/5/videos") == 24 * 3600
+    assert tmdb_cache.ttl_for("/movie/5") == 6 * 3600
+    assert tmdb_cache.ttl_for("/unknown") == tmdb_cache.DEFAULT_TTL
+
+
+def test_cache_key_ignores_api_key_and_param_order():
+    assert tmdb_cache.cache_key("/search/movie", {"query": "x", "page": 2, "api_key": "k"}) == \
+        tmdb_cache.cache_key("/search/movie", {"page": "2", "query": "x"})
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch, clock):
+    store = TieredCache()
+    calls = []
+    refreshed = threading.Event()
+
+    def fetch(path, params):
+        calls.append(path)
+        refreshed.set()
+        return {"n": len(calls)}
+
+    monkeypatch.setattr(tmdb, "get_cache", lambda: store)
+    monkeypatch.setattr(tmdb, "_fetch", fetch)
+    return store, calls, refreshed
+
+
+def test_get_fills_cache_and_serves_hits(fake_upstream):
+    store, calls, _ = fake_upstream
+    assert tmdb._get("/movie/7") == {"n": 1}
+    assert tmdb._get("/movie/7") == {"n": 1}
+    assert calls == ["/movie/7"]
+
+
+def test_stale_while_revalidate(fake_upstream, clock):
+    store, calls, refreshed = fake_upstream
+    tmdb._get("/trending/movie/day", swr=True)
+    refreshed.clear()
+    clock.now += tmdb_cache.ttl_for("/trending/movie/day") + 1
+    # The stale copy is served at once and refreshed in the background
+    assert tmdb._get("/trending/movie/day", swr=True) == {"n": 1}
+    assert refreshed.wait(5)
+    deadline = time.monotonic() + 5
+    while store.get("/trending/movie/day") != {"n": 2} and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tmdb._get("/trending/movie/day", swr=True) == {"n": 2}
+    assert store.stats()["stale_served"] == 1
+
+
+def test_without_swr_an_expired_entry_is_refetched(fake_upstream, clock):
+    store, calls, _ = fake_upstream
+    tmdb._get("/movie/7")
+    clock.now += tmdb_cache.ttl_for("/movie/7") + 1
+    assert tmdb._get("/movie/7") == {"n": 2}
+
+
+def test_stale_copy_served_when_upstream_fails(fake_upstream, clock, monkeypatch):
+    store, calls, _ = fake_upstream
+    tmdb._get("/movie/7")
+    clock.now += tmdb_cache.ttl_for("/movie/7") + 1
+
+    def down(path, params):
+        raise tmdb.TMDBError("down", status=503)
+
+    monkeypatch.setattr(tmdb, "_fetch", down)
+    assert tmdb._get("/movie/7") == {"n": 1}
+    with pytest.raises(tmdb.TMDBError):
+        tmdb._get("/movie/8")
+
+
+def test_expired_disk_rows_are_purged(tmp_path, clock):
+    disk = DiskCache(str(tmp_path / "cache.db"))
+    cache = TieredCache(disk=disk)
+    cache.set("/search/movie?query=old", 1, ttl=60)
+    cache.set("/movie/1", 2, ttl=60)
+    clock.now += tmdb_cache.STALE_KEEP + 61
+    cache.set("/movie/2", 3, ttl=60)
+    assert disk.purge_expired() == 2
+    assert disk.lookup("/movie/1") is None
+    assert disk.lookup("/movie/2") is not None
+    disk.close()
+
+
+def test_set_purges_at_most_once_per_interval(tmp_path, clock, monkeypatch):
+    monotonic = [100.0]
+    monkeypatch.setattr(tmdb_cache.time, "monotonic", lambda: monotonic[0])
+    disk = DiskCache(str(tmp_path / "cache.db"), purge_interval=3600)
+    disk.set("fresh", "1", clock.now + 60)  # the first set purges
+    disk.set("old", "0", clock.now - tmdb_cache.STALE_KEEP - 1)
+    assert disk.lookup("old") is not None and disk.purged == 0
+    monotonic[0] += 3600
+    disk.set("fresh", "2", clock.now + 60)
+    assert disk.lookup("old") is None and disk.purged == 1
+    disk.close()
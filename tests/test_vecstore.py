@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+
+import ann
+import recommend
+import vecstore
+
+
+def content_model(n=200, dim=16):
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((n, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    bases = {"text": np.zeros((recommend.HASH_DIM, recommend.TEXT_DIM), dtype=np.float32),
+             "people": np.zeros((recommend.HASH_DIM, recommend.PEOPLE_DIM), dtype=np.float32)}
+    return recommend.ContentModel(np.arange(1, n + 1), matrix, np.ones(dim, dtype=np.float32), bases)
+
+
+def test_publish_swaps_current_and_keeps_old_versions_intact(tmp_path):
+    root = str(tmp_path)
+    first = vecstore.publish("m", {"v": ([1, 2], np.eye(2))}, root=root)
+    second = vecstore.publish("m", {"v": ([1, 2], 2 * np.eye(2))}, root=root)
+    assert vecstore.current_version("m", root) == second.name
+    assert first.matrix("v")[1][0, 0] == 1.0
+    assert not [f for f in os.listdir(os.path.join(root, "m")) if f.endswith(".tmp")]
+
+
+def test_publish_prunes_to_keep(tmp_path):
+    root = str(tmp_path)
+    for _ in range(4):
+        vecstore.publish("m", {"v": ([1], np.ones((1, 2)))}, root=root, keep=2)
+    assert len([v for v in os.listdir(os.path.join(root, "m")) if v.startswith("v")]) == 2
+
+
+def test_index_is_published_in_a_new_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(vecstore, "RELOAD_CHECK_SECONDS", 0.0)
+    root = str(tmp_path)
+    model = content_model()
+    plain = model.save(root=root)
+    store = vecstore.Reloader(recommend.CONTENT_STORE, recommend.ContentModel.load, root=root)
+    assert store.get().index is None
+
+    loaded = store.get()
+    index = ann.IVFIndex.build(loaded.matrix, loaded.ids, nlist=8)
+    version = loaded.save(root=root, index=index)
+    assert version.name != plain.name
+    assert not os.path.exists(plain.file("ivf.npz"))
+
+    reloaded = store.get()
+    assert store.version == version.name
+    assert reloaded.index is not None and len(reloaded.index) == len(model)
+    assert np.array_equal(reloaded.ids, model.ids)
+
+
+def test_failed_writer_leaves_no_version(tmp_path):
+    root = str(tmp_path)
+    vecstore.publish("m", {"v": ([1], np.ones((1, 2)))}, root=root)
+    before = vecstore.current_version("m", root)
+
+    def broken(path):
+        raise OSError("disk full")
+
+    try:
+        vecstore.publish("m", {"v": ([1], np.ones((1, 2)))}, root=root, files={"ivf.npz": broken})
+    except OSError:
+        pass
+    assert vecstore.current_version("m", root) == before
+    assert sorted(os.listdir(os.path.join(root, "m"))) == sorted(["CURRENT", before])
@@ -1,17 +1,250 @@
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+import metrics
+import ratelimit
+from tmdb_cache import DiskCache, LRUCache, TieredCache, cache_key, ttl_for
 
 load_dotenv()
 
 TMDB_API_KEY = os.getenv("TMDB_API_KEY", "").strip()
-TMDB_API_BASE = "https://api.themoviedb.org/3"
-IMG_BASE = "https://image.tmdb.org/t/p/w500"
+TMDB_API_BASE = os.getenv("TMDB_API_BASE", "https://api.themoviedb.org/3").rstrip("/")
+TMDB_IMAGE_BASE = os.getenv("TMDB_IMAGE_BASE", "https://image.tmdb.org/t/p").rstrip("/")
+IMG_BASE = f"{TMDB_IMAGE_BASE}/w500"
+
+# Connection pool shared by every call in this process
+TMDB_POOL_SIZE = int(os.getenv("TMDB_POOL_SIZE", "16"))
+TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", "20"))
+TMDB_PREFETCH_WORKERS = int(os.getenv("TMDB_PREFETCH_WORKERS", "8"))
+TMDB_CACHE_ENABLED = os.getenv("TMDB_CACHE", "1") != "0"
+TMDB_CACHE_ENTRIES = int(os.getenv("TMDB_CACHE_ENTRIES", "2000"))
+TMDB_CACHE_MB = int(os.getenv("TMDB_CACHE_MB", "64"))
+TMDB_CACHE_DISK = os.getenv("TMDB_CACHE_DISK", "1") != "0"
+# Gateway errors are retried inside urllib3. Throttling is left to _fetch, which
+# pauses the whole process's limiter; urllib3 would retry a 429 or a 503 with
+# Retry-After on its own thread only, sleeping as long as asked each time.
+RETRY_POLICY = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504], respect_retry_after_header=False)
+# Process-wide request budget, kept under TMDB's ~40-50 rps per-IP ceiling
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+TMDB_RATE_BURST = float(os.getenv("TMDB_RATE_BURST", "20"))
+TMDB_429_RETRIES = int(os.getenv("TMDB_429_RETRIES", "3"))
 
 class TMDBError(Exception):
-    pass
+    def __init__(self, message, status=None, endpoint=None, attempts=None, retry_after=None, elapsed=None):
+        super().__init__(message)
+        self.status = status  # HTTP status when TMDB answered, None for network/config errors
+        self.endpoint = endpoint  # e.g. "/movie/{id}/videos"
+        self.attempts = attempts  # requests sent, counting 429 retries
+        self.retry_after = retry_after  # seconds TMDB asked us to wait, on a final 429
+        self.elapsed = elapsed  # seconds from the first attempt to giving up
+
+    @property
+    def retryable(self):
+        # Worth trying again later: network trouble, throttling or a server-side error
+        return self.status is None or self.status == 429 or self.status >= 500
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+_calls = 0
+_calls_lock = threading.Lock()
+
+def _get_adapter():
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                # pool_block keeps us at TMDB_POOL_SIZE sockets per host instead of
+                # opening throwaway connections when every slot is busy.
+                _adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=TMDB_POOL_SIZE,
+                    max_retries=RETRY_POLICY,
+                    pool_block=True,
+                )
+    return _adapter
+
+def get_session():
+    # Sessions are not thread-safe (cookies, mounted adapters), so each thread gets
+    # its own thin Session, but they all share the one adapter and its keep-alive pool.
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = _get_adapter()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+def reset_session():
+    # Drop pooled connections, e.g. after a fork or when TMDB_API_BASE changes.
+    global _adapter
+    with _adapter_lock:
+        if _adapter is not None:
+            _adapter.close()
+        _adapter = None
+    _local.__dict__.pop("session", None)
+
+def client_stats():
+    # urllib3 counts every request sent and every socket opened per host pool;
+    # the difference is how many requests rode on an already-open connection.
+    stats = {"calls": _calls, "requests": 0, "connections": 0, "reused": 0, "pool_size": TMDB_POOL_SIZE}
+    adapter = _adapter
+    if adapter is None:
+        return stats
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["requests"] += pool.num_requests
+        stats["connections"] += pool.num_connections
+    stats["reused"] = max(stats["requests"] - stats["connections"], 0)
+    return stats
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if not TMDB_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                disk = None
+                if TMDB_CACHE_DISK:
+                    try:
+                        disk = DiskCache()
+                    except sqlite3.Error:
+                        # Read-only checkout or locked file: keep the in-memory tier only.
+                        disk = None
+                memory = LRUCache(max_entries=TMDB_CACHE_ENTRIES, max_bytes=TMDB_CACHE_MB * 1024 * 1024)
+                _cache = TieredCache(memory=memory, disk=disk)
+    return _cache
+
+def cache_stats():
+    cache = get_cache()
+    return cache.stats() if cache else {}
+
+def invalidate_cache(prefix=""):
+    # e.g. invalidate_cache("/trending/") or invalidate_cache(f"/movie/{movie_id}")
+    cache = get_cache()
+    return cache.invalidate(prefix) if cache else 0
+
+_limiter = ratelimit.RateLimiter(TMDB_RATE_LIMIT, TMDB_RATE_BURST)
+_flights = ratelimit.SingleFlight()
+
+def current_priority():
+    return getattr(_local, "priority", ratelimit.INTERACTIVE)
+
+@contextmanager
+def priority(level):
+    # Requests made by this thread inside the block queue at `level` for the rate limiter.
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+def set_rate_limit(rate, burst=None):
+    _limiter.set_rate(rate, burst)
+
+def limiter_stats():
+    stats = _limiter.stats()
+    stats.update(upstream=_flights.leaders, coalesced=_flights.shared, in_flight=_flights.in_flight())
+    return stats
 
-def _get(path, params=None):
+_revalidating = set()
+_revalidate_lock = threading.Lock()
+
+def _cache_outcome(path, outcome):
+    if metrics.METRICS_ENABLED:
+        metrics.TMDB_CACHE.inc(metrics.endpoint(path), outcome)
+
+def _get(path, params=None, cache=True, swr=False):
+    # Cached responses are handed out as is, to every caller: read them, don't modify them.
+    store = get_cache() if cache else None
+    key = cache_key(path, params)
+    found = None
+    if store is not None:
+        found = store.get_entry(key)
+        if found is not None:
+            value, expires_at = found
+            if expires_at > time.time():
+                _cache_outcome(path, "hit")
+                return value
+            if swr:
+                # Stale-while-revalidate: answer from the last good copy now and
+                # refresh it in the background.
+                store.record_stale_served()
+                _cache_outcome(path, "stale")
+                _revalidate(path, params)
+                return value
+    try:
+        data = _fetch_shared(path, params, store)
+    except TMDBError:
+        if found is not None:
+            # TMDB is down or refusing us; an old answer beats an error page.
+            store.record_stale_served()
+            _cache_outcome(path, "stale_on_error")
+            return found[0]
+        raise
+    _cache_outcome(path, "miss" if store is not None else "uncached")
+    return data
+
+def _fetch_shared(path, params, store):
+    # Single-flight: sessions asking for the same thing at the same moment share
+    # one upstream call, and the leader fills the cache for all of them.
+    key = cache_key(path, params)
+
+    def fetch():
+        data = _fetch(path, dict(params or {}))
+        if store is not None:
+            store.set(key, data, ttl_for(path))
+        return data
+
+    return _flights.do(key, fetch)
+
+def refresh(path, params=None):
+    # Fetch from TMDB unconditionally and overwrite the cached copy.
+    return _fetch_shared(path, params, get_cache())
+
+def _revalidate(path, params):
+    key = cache_key(path, params)
+    with _revalidate_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            with priority(ratelimit.PREFETCH):
+                refresh(path, params)
+        except (TMDBError, ValueError):
+            pass
+        finally:
+            with _revalidate_lock:
+                _revalidating.discard(key)
+
+    _get_prefetch_pool().submit(run)
+
+def cache_expiry(path, params=None):
+    # When the cached copy of this request goes stale (epoch seconds), or None if absent.
+    store = get_cache()
+    found = store.lookup(cache_key(path, params)) if store else None
+    return found[1] if found else None
+
+def request_args(path, params):
+    # (url, params, headers) for a TMDB GET; shared with tmdb_async.
     if not TMDB_API_KEY:
         raise TMDBError("TMDB_API_KEY is not set. Put it in your .env file.")
 
@@ -21,30 +254,58 @@ def _get(path, params=None):
     if is_v4:
         headers["Authorization"] = f"Bearer {TMDB_API_KEY}"
 
-    # Always prepare params
-    params = params or {}
     if not is_v4:
         params["api_key"] = TMDB_API_KEY  # v3 key always in query
 
-    url = f"{TMDB_API_BASE}{path}"
+    return f"{TMDB_API_BASE}{path}", params, headers
 
-    # Retry session
-    from requests.adapters import HTTPAdapter
-    from urllib3.util.retry import Retry
-    session = requests.Session()
-    retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
-    session.mount("https://", HTTPAdapter(max_retries=retries))
+def _fetch(path, params):
+    url, params, headers = request_args(path, params)
 
-    try:
-        r = session.get(url, params=params, headers=headers, timeout=20)
-        r.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        raise TMDBError(f"TMDB request failed: {e}")
+    global _calls
+    level = current_priority()
+    name = metrics.endpoint(path)
+    started = time.perf_counter()
+    for attempt in range(TMDB_429_RETRIES + 1):
+        _limiter.acquire(level)
+        with _calls_lock:
+            _calls += 1
+        sent = time.perf_counter()
+        status = "error"
+        try:
+            r = get_session().get(url, params=params, headers=headers, timeout=TMDB_TIMEOUT)
+            status = r.status_code
+            _count_adapter_retries(name, r)
+            if r.status_code == 429 and attempt < TMDB_429_RETRIES:
+                # Over TMDB's limit: hold back every caller in the process, not
+                # just this one, for as long as TMDB asks.
+                metrics.TMDB_RETRIES.inc(name, "429")
+                _limiter.pause(ratelimit.retry_after_seconds(r.headers.get("Retry-After"), 2.0 ** attempt))
+                continue
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            response = e.response
+            code = response.status_code if response is not None else None
+            metrics.TMDB_ERRORS.inc(name, str(code or "error"))
+            retry_after = None
+            if code == 429:
+                retry_after = ratelimit.retry_after_seconds(response.headers.get("Retry-After"), None)
+            raise TMDBError(f"TMDB request failed: {e}", status=code, endpoint=name, attempts=attempt + 1,
+                            retry_after=retry_after, elapsed=time.perf_counter() - started)
+        finally:
+            metrics.TMDB_REQUEST_SECONDS.observe(time.perf_counter() - sent, name, str(status))
+        return r.json()
 
-    return r.json()
+def _count_adapter_retries(name, response):
+    # Attempts RETRY_POLICY already retried inside urllib3 (502/503/504)
+    retries = getattr(response.raw, "retries", None)
+    for attempt in (retries.history if retries is not None else ()):
+        metrics.TMDB_RETRIES.inc(name, str(attempt.status or "error"))
 
-def trending(period='day'):
-    data = _get(f"/trending/movie/{period}")
+def trending(period='day', page=1):
+    # Page 1 keeps the param-less cache key the refresher warms
+    params = {"page": page} if page > 1 else None
+    data = _get(f"/trending/movie/{period}", params=params, swr=page == 1)
     return data.get("results", [])
 
 def search_movies(query, page=1):
@@ -56,7 +317,9 @@ def search_person(query):
     return data.get("results", [])
 
 def person_movie_credits(person_id):
-    data = _get(f"/person/{person_id}/movie_credits")
+    return merge_credits(_get(f"/person/{person_id}/movie_credits"))
+
+def merge_credits(data):
     # Combine cast and crew, but prioritize cast
     movies = data.get("cast", []) + data.get("crew", [])
     # unique by id
@@ -70,20 +333,40 @@ def person_movie_credits(person_id):
     return uniq
 
 def genres():
-    data = _get("/genre/movie/list")
+    data = _get("/genre/movie/list", swr=True)
     return data.get("genres", [])
 
+def discover_params(genre_id, page=1):
+    return {"with_genres": genre_id, "sort_by": "popularity.desc", "page": page}
+
 def discover_by_genre(genre_id, page=1):
-    data = _get("/discover/movie", params={"with_genres": genre_id, "sort_by": "popularity.desc", "page": page})
+    # Page 1 of each genre is kept warm by the refresher, so it may be served stale.
+    data = _get("/discover/movie", params=discover_params(genre_id, page), swr=page == 1)
     return data.get("results", [])
 
-def movie_details(movie_id):
-    return _get(f"/movie/{movie_id}")
+def movie_details(movie_id, append=None):
+    # append_to_response folds sub-resources (videos, credits, ...) into the same round-trip
+    params = {"append_to_response": ",".join(append)} if append else None
+    return _get(f"/movie/{movie_id}", params=params)
 
 def movie_videos(movie_id):
     data = _get(f"/movie/{movie_id}/videos", params={"language": "en-US"})
     return data.get("results", [])
 
+def pick_trailer(videos):
+    return next((v for v in videos or [] if v.get("site") == "YouTube" and v.get("type") in ("Trailer", "Teaser")), None)
+
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
+
+def _get_prefetch_pool():
+    global _prefetch_pool
+    if _prefetch_pool is None:
+        with _prefetch_lock:
+            if _prefetch_pool is None:
+                _prefetch_pool = ThreadPoolExecutor(max_workers=TMDB_PREFETCH_WORKERS, thread_name_prefix="tmdb-prefetch")
+    return _prefetch_pool
+
 def poster_url(poster_path):
     if not poster_path:
         return None
@@ -0,0 +1,335 @@
+"""asyncio TMDB client for fan-out (a page of trailers, several people's credits,
+multi-page search) without a thread per request.
+
+    client = AsyncTMDB()
+    details = await client.movie_details_many(ids, append=["videos"])
+
+It shares tmdb.py's cache, rate limiter and request signing, so a response
+fetched here is a cache hit for the blocking client and vice versa. The HTTP
+layer is a transport object with one coroutine, get(url, params, headers) ->
+(status, headers, body): AiohttpTransport when aiohttp is installed, otherwise
+ThreadedTransport over tmdb's pooled requests session. Tests and benchmarks
+can hand in their own.
+
+Streamlit scripts are synchronous, so the module-level functions at the bottom
+run the client on one background event loop and block for the result.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+import ratelimit
+import tmdb
+from tmdb import TMDBError
+from tmdb_cache import cache_key, ttl_for
+
+try:
+    import aiohttp
+except ImportError:  # optional; ThreadedTransport is used instead
+    aiohttp = None
+
+TMDB_ASYNC_CONCURRENCY = int(os.getenv("TMDB_ASYNC_CONCURRENCY", "16"))
+RETRY_STATUSES = (502, 503, 504)
+
+
+class AiohttpTransport:
+    def __init__(self, limit=tmdb.TMDB_POOL_SIZE, timeout=tmdb.TMDB_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+        self._session = None
+
+    async def get(self, url, params, headers):
+        if self._session is None:
+            # Created lazily so it binds to the loop that actually uses it
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items()}
+        try:
+            async with self._session.get(url, params=params, headers=headers) as r:
+                return r.status, r.headers, await r.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TMDBError(f"TMDB request failed: {e!r}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class ThreadedTransport:
+    # Blocking requests on worker threads, one per pooled connection; still
+    # concurrent, just not thread-free.
+
+    def __init__(self, workers=tmdb.TMDB_POOL_SIZE):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tmdb-async-http")
+
+    async def get(self, url, params, headers):
+        def call():
+            return tmdb.get_session().get(url, params=params, headers=headers, timeout=tmdb.TMDB_TIMEOUT)
+        try:
+            r = await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        except requests.exceptions.RequestException as e:
+            raise TMDBError(f"TMDB request failed: {e}")
+        return r.status_code, r.headers, r.content
+
+    async def close(self):
+        pass
+
+
+def default_transport():
+    return AiohttpTransport() if aiohttp is not None else ThreadedTransport()
+
+
+async def _cache_entry(store, key):
+    # The LRU tier is a dict lookup and fine on the loop; the SQLite tier is
+    # blocking I/O, so a memory miss goes to it on a worker thread.
+    if store.disk is None or store.memory.lookup(key) is not None:
+        return store.get_entry(key)
+    return await asyncio.to_thread(store.get_entry, key)
+
+
+class AsyncTMDB:
+    def __init__(self, transport=None, concurrency=TMDB_ASYNC_CONCURRENCY):
+        self.transport = transport or default_transport()
+        self.concurrency = concurrency
+        self.calls = 0
+        self._inflight = {}  # cache key -> Task, so identical requests share one call
+
+    async def _acquire(self, level):
+        if not tmdb._limiter.try_acquire(level):
+            await asyncio.to_thread(tmdb._limiter.acquire, level)
+
+    async def _fetch(self, path, params, level):
+        url, params, headers = tmdb.request_args(path, dict(params or {}))
+        name = metrics.endpoint(path)
+        started = time.perf_counter()
+
+        def error(message, status=None, attempt=0, retry_after=None):
+            metrics.TMDB_ERRORS.inc(name, str(status or "error"))
+            return TMDBError(message, status=status, endpoint=name, attempts=attempt + 1,
+                             retry_after=retry_after, elapsed=time.perf_counter() - started)
+
+        for attempt in range(tmdb.TMDB_429_RETRIES + 1):
+            await self._acquire(level)
+            self.calls += 1
+            sent = time.perf_counter()
+            try:
+                status, resp_headers, body = await self.transport.get(url, params, headers)
+            except TMDBError as e:
+                metrics.TMDB_REQUEST_SECONDS.observe(time.perf_counter() - sent, name, "error")
+                raise error(str(e), attempt=attempt) from e
+            metrics.TMDB_REQUEST_SECONDS.observe(time.perf_counter() - sent, name, str(status))
+            if attempt < tmdb.TMDB_429_RETRIES:
+                if status == 429:
+                    metrics.TMDB_RETRIES.inc(name, "429")
+                    tmdb._limiter.pause(ratelimit.retry_after_seconds(resp_headers.get("Retry-After"), 2.0 ** attempt))
+                    continue
+                if status in RETRY_STATUSES:
+                    metrics.TMDB_RETRIES.inc(name, str(status))
+                    await asyncio.sleep(2.0 ** attempt)
+                    continue
+            if status >= 400:
+                retry_after = None
+                if status == 429:
+                    retry_after = ratelimit.retry_after_seconds(resp_headers.get("Retry-After"), None)
+                raise error(f"TMDB request failed: {status} for {path}", status, attempt, retry_after)
+            try:
+                return json.loads(body)
+            except ValueError as e:
+                raise error(f"TMDB returned invalid JSON for {path}: {e}", status, attempt)
+
+    async def get(self, path, params=None, cache=True, swr=False, priority=ratelimit.INTERACTIVE):
+        # Same contract as tmdb._get: fresh cache hit, else stale-while-revalidate
+        # when allowed, else fetch (falling back to a stale copy on error).
+        store = tmdb.get_cache() if cache else None
+        key = cache_key(path, params)
+        found = await _cache_entry(store, key) if store is not None else None
+        if found is not None:
+            value, expires_at = found
+            if expires_at > time.time():
+                tmdb._cache_outcome(path, "hit")
+                return value
+            if swr:
+                store.record_stale_served()
+                tmdb._cache_outcome(path, "stale")
+                self._shared(key, path, params, store, ratelimit.PREFETCH)
+                return value
+        try:
+            # shield: one caller being cancelled must not cancel the call others are waiting on
+            data = await asyncio.shield(self._shared(key, path, params, store, priority))
+        except TMDBError:
+            if found is not None:
+                store.record_stale_served()
+                tmdb._cache_outcome(path, "stale_on_error")
+                return found[0]
+            raise
+        tmdb._cache_outcome(path, "miss" if store is not None else "uncached")
+        return data
+
+    def _shared(self, key, path, params, store, level):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key, path, params, store, level))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved; a background revalidation may have nobody awaiting it
+
+    async def _fetch_and_store(self, key, path, params, store, level):
+        data = await self._fetch(path, params, level)
+        if store is not None:
+            if store.disk is None:
+                store.set(key, data, ttl_for(path))
+            else:
+                await asyncio.to_thread(store.set, key, data, ttl_for(path))
+        return data
+
+    async def gather(self, calls, limit=None, return_exceptions=True):
+        # Awaits coroutines with at most `limit` running at once; results in input order.
+        sem = asyncio.Semaphore(limit or self.concurrency)
+
+        async def run(coro):
+            async with sem:
+                return await coro
+
+        return await asyncio.gather(*(run(c) for c in calls), return_exceptions=return_exceptions)
+
+    async def close(self):
+        await self.transport.close()
+
+    # ---- the tmdb.py functions ----
+    async def trending(self, period="day", page=1):
+        params = {"page": page} if page > 1 else None
+        return (await self.get(f"/trending/movie/{period}", params=params, swr=page == 1)).get("results", [])
+
+    async def search_movies(self, query, page=1):
+        data = await self.get("/search/movie", params={"query": query, "page": page, "include_adult": False})
+        return data.get("results", [])
+
+    async def search_person(self, query):
+        return (await self.get("/search/person", params={"query": query, "include_adult": False})).get("results", [])
+
+    async def person_movie_credits(self, person_id):
+        return tmdb.merge_credits(await self.get(f"/person/{person_id}/movie_credits"))
+
+    async def genres(self):
+        return (await self.get("/genre/movie/list", swr=True)).get("genres", [])
+
+    async def discover_by_genre(self, genre_id, page=1):
+        data = await self.get("/discover/movie", params=tmdb.discover_params(genre_id, page), swr=page == 1)
+        return data.get("results", [])
+
+    async def movie_details(self, movie_id, append=None):
+        params = {"append_to_response": ",".join(append)} if append else None
+        return await self.get(f"/movie/{movie_id}", params=params)
+
+    async def movie_videos(self, movie_id, priority=ratelimit.INTERACTIVE):
+        data = await self.get(f"/movie/{movie_id}/videos", params={"language": "en-US"}, priority=priority)
+        return data.get("results", [])
+
+    # ---- batch helpers; failures map to None (or are skipped) rather than raising ----
+    async def movie_details_many(self, movie_ids, append=None, limit=None):
+        ids = list(dict.fromkeys(movie_ids))
+        results = await self.gather((self.movie_details(mid, append=append) for mid in ids), limit=limit)
+        return {mid: None if isinstance(r, Exception) else r for mid, r in zip(ids, results)}
+
+    async def trailers_for(self, movie_ids, limit=None):
+        ids = list(dict.fromkeys(mid for mid in movie_ids if mid is not None))
+        results = await self.gather((self.movie_videos(mid, priority=ratelimit.PREFETCH) for mid in ids),
+                                    limit=limit)
+        keys = {}
+        for mid, videos in zip(ids, results):
+            yt = None if isinstance(videos, Exception) else tmdb.pick_trailer(videos)
+            keys[mid] = yt.get("key") if yt else None
+        return keys
+
+    async def person_credits_many(self, person_ids, limit=None):
+        ids = list(dict.fromkeys(person_ids))
+        results = await self.gather((self.person_movie_credits(pid) for pid in ids), limit=limit)
+        return {pid: [] if isinstance(r, Exception) else r for pid, r in zip(ids, results)}
+
+    async def search_movies_pages(self, query, pages=3):
+        # First `pages` result pages fetched together, merged in page order without repeats.
+        results = await self.gather(self.search_movies(query, page=p) for p in range(1, pages + 1))
+        seen, movies = set(), []
+        for page in results:
+            if isinstance(page, Exception):
+                continue
+            for m in page:
+                if m.get("id") not in seen:
+                    seen.add(m.get("id"))
+                    movies.append(m)
+        return movies
+
+
+# ---------------- Sync facade ----------------
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop, _client
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="tmdb-async", daemon=True).start()
+                _client = AsyncTMDB()
+                _loop = loop
+    return _loop
+
+def get_client():
+    _get_loop()
+    return _client
+
+def run(coro, timeout=None):
+    # Run a coroutine on the shared loop from any thread and wait for its result.
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+def trending(period="day", page=1):
+    return run(get_client().trending(period, page))
+
+def search_movies(query, page=1):
+    return run(get_client().search_movies(query, page))
+
+def search_person(query):
+    return run(get_client().search_person(query))
+
+def person_movie_credits(person_id):
+    return run(get_client().person_movie_credits(person_id))
+
+def genres():
+    return run(get_client().genres())
+
+def discover_by_genre(genre_id, page=1):
+    return run(get_client().discover_by_genre(genre_id, page))
+
+def movie_details(movie_id, append=None):
+    return run(get_client().movie_details(movie_id, append))
+
+def movie_videos(movie_id):
+    return run(get_client().movie_videos(movie_id))
+
+def movie_details_many(movie_ids, append=None):
+    return run(get_client().movie_details_many(movie_ids, append=append))
+
+def trailers_for(movie_ids):
+    return run(get_client().trailers_for(movie_ids))
+
+def person_credits_many(person_ids):
+    return run(get_client().person_credits_many(person_ids))
+
+def search_movies_pages(query, pages=3):
+    return run(get_client().search_movies_pages(query, pages))
@@ -0,0 +1,226 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB_PATH = os.path.join(os.path.dirname(__file__), "tmdb_cache.db")
+
+# Seconds each endpoint stays fresh; first matching prefix wins.
+ENDPOINT_TTLS = [
+    (re.compile(r"^/genre/"), 3 * 24 * 3600),
+    (re.compile(r"^/trending/"), 10 * 60),
+    (re.compile(r"^/search/"), 30 * 60),
+    (re.compile(r"^/discover/"), 30 * 60),
+    (re.compile(r"^/movie/\d+/videos"), 24 * 3600),
+    (re.compile(r"^/movie/\d+"), 6 * 3600),
+    (re.compile(r"^/person/\d+"), 12 * 3600),
+]
+DEFAULT_TTL = 15 * 60
+# Expired disk rows are kept this long for stale fallbacks, then purged; the
+# purge runs from set() at most once per PURGE_INTERVAL.
+STALE_KEEP = 7 * 24 * 3600
+PURGE_INTERVAL = 3600
+
+def ttl_for(path):
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.match(path):
+            return ttl
+    return DEFAULT_TTL
+
+def cache_key(path, params=None):
+    # Credentials never go into the key, so v3/v4 keys share entries.
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k != "api_key")
+    if not items:
+        return path
+    return path + "?" + "&".join(f"{k}={v}" for k, v in items)
+
+
+class LRUCache:
+    # Entries are (value, expires_at, size). Expired entries stay until evicted
+    # so callers can still fall back to them. Values are shared, not copied:
+    # every hit returns the same object, so callers must treat it as read-only.
+
+    def __init__(self, max_entries=2000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted[2]
+                self.evictions += 1
+
+    def invalidate(self, prefix=""):
+        with self._lock:
+            doomed = [k for k in self._data if k.startswith(prefix)]
+            for k in doomed:
+                self._bytes -= self._data.pop(k)[2]
+            return len(doomed)
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+
+class DiskCache:
+    def __init__(self, path=CACHE_DB_PATH, purge_interval=PURGE_INTERVAL):
+        self.path = path
+        self.purge_interval = purge_interval
+        self.purged = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            '''
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses (expires_at)")
+        self._conn.commit()
+        self._next_purge = time.monotonic()  # first set() of the process purges
+
+    def lookup(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def set(self, key, body, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, body, expires_at, time.time()),
+            )
+            self._conn.commit()
+        if self.purge_interval and time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            self.purge_expired()
+
+    def invalidate(self, prefix=""):
+        # Escape LIKE wildcards so "/movie/1_" doesn't match "/movie/12".
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE key LIKE ? ESCAPE '\\'", (pattern,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def purge_expired(self, older_than=STALE_KEEP):
+        # Search and detail keys are open-ended, so without this the file only grows.
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time() - older_than,))
+            self._conn.commit()
+            self.purged += cur.rowcount
+            return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "disk_reads": 0, "stale_served": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, key):
+        # Returns (value, expires_at) for any stored entry, expired or not, or None.
+        # The value is shared with other callers; don't mutate it.
+        entry = self.memory.lookup(key)
+        if entry is not None:
+            return entry[0], entry[1]
+        if self.disk is not None:
+            row = self.disk.lookup(key)
+            if row is not None:
+                self._count("disk_reads")
+                body, expires_at = row
+                value = json.loads(body)
+                self.memory.set(key, value, expires_at, len(body))
+                return value, expires_at
+        return None
+
+    def get_entry(self, key):
+        # Like lookup, but counts toward the hit/miss stats: a fresh entry is a
+        # hit, an expired one is a miss that the caller may still serve.
+        found = self.lookup(key)
+        if found is None:
+            self._count("misses")
+        elif found[1] > time.time():
+            self._count("hits")
+        else:
+            self._count("stale")
+            self._count("misses")
+        return found
+
+    def get(self, key):
+        # Fresh value or None.
+        found = self.get_entry(key)
+        if found is None or found[1] <= time.time():
+            return None
+        return found[0]
+
+    def record_stale_served(self):
+        self._count("stale_served")
+
+    def set(self, key, value, ttl):
+        body = json.dumps(value, separators=(",", ":"))
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at, len(body))
+        if self.disk is not None:
+            self.disk.set(key, body, expires_at)
+        self._count("stores")
+
+    def invalidate(self, prefix=""):
+        removed = self.memory.invalidate(prefix)
+        if self.disk is not None:
+            removed += self.disk.invalidate(prefix)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["evictions"] = self.memory.evictions
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.bytes
+        if self.disk is not None:
+            stats["disk_purged"] = self.disk.purged
+        return stats
@@ -0,0 +1,190 @@
+"""Memory-mapped model storage shared by every app process on a host.
+
+A store is a directory of immutable versions plus a CURRENT pointer:
+
+    models/content/
+        CURRENT                 -> "v1718000000000000000"
+        v1718000000000000000/
+            meta.json
+            vectors.vec         header + int64 ids + float32 matrix
+            idf.npy
+            ivf.npz             optional ANN index over the same vectors
+
+Readers open the .vec/.npy files with numpy.memmap, so N processes share one
+copy in the page cache and opening a model costs a few syscalls regardless of
+its size. Publishing writes a new version directory under a temporary name,
+renames it into place and then swaps CURRENT with os.replace, so a reader only
+ever sees a complete version. Old versions are pruned but never rewritten.
+"""
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+KEEP_VERSIONS = 3
+RELOAD_CHECK_SECONDS = float(os.getenv("MODEL_RELOAD_CHECK", "5"))
+
+# magic, format version, rows, dim, ids offset, matrix offset; padded to 64 bytes
+_HEADER = struct.Struct("<4sIQIQQ")
+_MAGIC = b"MVEC"
+_FORMAT = 1
+_ALIGN = 64
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_matrix(path, ids, matrix):
+    # Row i of `matrix` belongs to ids[i]. The matrix starts on a 64-byte
+    # boundary so the mapped float32 rows are aligned.
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    ids = np.ascontiguousarray(ids, dtype="<i8")
+    if matrix.ndim != 2 or len(ids) != len(matrix):
+        raise ValueError(f"need a 2-d matrix with one id per row, got {matrix.shape} and {len(ids)} ids")
+    ids_offset = _ALIGN
+    matrix_offset = _aligned(ids_offset + ids.nbytes)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT, matrix.shape[0], matrix.shape[1], ids_offset, matrix_offset)
+                .ljust(_ALIGN, b"\0"))
+        f.write(ids.tobytes())
+        f.write(b"\0" * (matrix_offset - ids_offset - ids.nbytes))
+        f.write(matrix.tobytes())
+
+
+def open_matrix(path):
+    # (ids, matrix) as read-only views over the file; nothing is copied.
+    with open(path, "rb") as f:
+        magic, fmt, rows, dim, ids_offset, matrix_offset = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC or fmt != _FORMAT:
+        raise ValueError(f"{path} is not a format-{_FORMAT} vector file")
+    if rows == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32)
+    ids = np.memmap(path, dtype="<i8", mode="r", offset=ids_offset, shape=(rows,))
+    matrix = np.memmap(path, dtype="<f4", mode="r", offset=matrix_offset, shape=(rows, dim))
+    # Plain ndarray views, so slices and products don't carry the memmap subclass around
+    return ids.view(np.ndarray), matrix.view(np.ndarray)
+
+
+class Version:
+    """One published, read-only version of a store."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+    def matrix(self, name):
+        return open_matrix(os.path.join(self.path, name + ".vec"))
+
+    def array(self, name):
+        return np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r").view(np.ndarray)
+
+    def file(self, name):
+        # Path for a derived artifact (e.g. an ANN index) that belongs to this version
+        return os.path.join(self.path, name)
+
+
+def _store_dir(name, root):
+    return os.path.join(root or MODEL_DIR, name)
+
+
+def current_version(name, root=None):
+    try:
+        with open(os.path.join(_store_dir(name, root), "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_current(name, root=None):
+    version = current_version(name, root)
+    if version is None:
+        return None
+    return Version(os.path.join(_store_dir(name, root), version))
+
+
+def publish(name, matrices, arrays=None, meta=None, root=None, keep=KEEP_VERSIONS, files=None):
+    # matrices: {file name: (ids, matrix)}; arrays: {file name: 1-d/2-d array};
+    # files: {file name: fn(path)} for derived artifacts such as an ANN index.
+    # Returns the new Version once CURRENT points at it.
+    store = _store_dir(name, root)
+    os.makedirs(store, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    staging = os.path.join(store, f".{version}.tmp")
+    os.makedirs(staging)
+    try:
+        for fname, (ids, matrix) in matrices.items():
+            write_matrix(os.path.join(staging, fname + ".vec"), ids, matrix)
+        for fname, arr in (arrays or {}).items():
+            np.save(os.path.join(staging, fname + ".npy"), np.ascontiguousarray(arr))
+        for fname, write in (files or {}).items():
+            write(os.path.join(staging, fname))
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({**(meta or {}), "version": version, "published_at": time.time()}, f)
+        os.rename(staging, os.path.join(store, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    tmp = os.path.join(store, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(store, "CURRENT"))
+    prune(name, keep=keep, root=root)
+    return Version(os.path.join(store, version))
+
+
+def prune(name, keep=KEEP_VERSIONS, root=None):
+    # Drop all but the newest `keep` versions. Processes still mapping a removed
+    # version keep their pages until they reload; the files just lose their names.
+    store = _store_dir(name, root)
+    current = current_version(name, root)
+    versions = sorted(v for v in os.listdir(store) if v.startswith("v") and os.path.isdir(os.path.join(store, v)))
+    for v in versions[:-keep] if keep else versions:
+        if v != current:
+            shutil.rmtree(os.path.join(store, v), ignore_errors=True)
+
+
+class Reloader:
+    """Process-wide handle on the current version of a store.
+
+    get() returns the loaded model, re-reading CURRENT at most every
+    RELOAD_CHECK_SECONDS and loading the new version when it has moved, so a
+    publish reaches every running process without a restart.
+    """
+
+    def __init__(self, name, load, root=None):
+        self.name = name
+        self.load = load  # Version -> model
+        self.root = root
+        self.model = None
+        self.version = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked < RELOAD_CHECK_SECONDS:
+            return self.model
+        with self._lock:
+            if now - self._checked >= RELOAD_CHECK_SECONDS:
+                version = current_version(self.name, self.root)
+                if version != self.version:
+                    self.model = None
+                    if version:
+                        self.model = self.load(Version(os.path.join(_store_dir(self.name, self.root), version)))
+                    self.version = version
+                self._checked = now
+        return self.model
+
+    def reset(self):
+        with self._lock:
+            self.model = None
+            self.version = None
+            self._checked = float("-inf")